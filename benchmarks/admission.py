@@ -0,0 +1,138 @@
+"""
+Tail latency of well-behaved clients while one client floods /pull.
+
+Seeds a temporary database and runs three phases, each against a fresh
+threaded Flask server process: the polite clients alone, the polite
+clients next to a greedy client that pulls as fast as it can with
+admission control off, and the same spike with rate limiting and the
+write cap on. Each polite client sends about --polite-rate requests a
+second (searches and pulls) under its own X-Client-ID, which the
+limited phase trusts as RATE_LIMIT_CLIENT_HEADER; the greedy threads
+share one. Latency of the polite clients and what happened to
+the greedy ones are reported per phase as JSON.
+
+The clients run in this process, so on small machines they compete
+with the server for CPU.
+
+Usage:
+    python benchmarks/admission.py --polite 8 --greedy 32 --duration 10
+    python benchmarks/admission.py --rate-limit 20 --max-inflight-writes 2
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import random
+import sys
+import time
+
+import requests
+
+from async_vs_flask import start_server
+from common import service, temporary_database
+from load_test import seed, summarize
+from worker_scaling import free_port
+
+
+def polite_client(base_url, client_id, model_types, rows, rate, deadline, seed_value):
+    session = requests.Session()
+    session.headers["X-Client-ID"] = client_id
+    chooser = random.Random(seed_value)
+    latencies, errors = [], 0
+    while time.perf_counter() < deadline:
+        model_type = chooser.choice(model_types)
+        if chooser.random() < 0.2:
+            path = f"/pull/{model_type}"
+        else:
+            path = f"/search/{model_type}/{chooser.randint(1, rows)}"
+        started = time.perf_counter()
+        status = session.get(base_url + path).status_code
+        latencies.append(time.perf_counter() - started)
+        if status >= 500 or status == 429:
+            errors += 1
+        time.sleep(chooser.expovariate(rate))
+    return latencies, errors
+
+
+def greedy_client(base_url, model_type, deadline):
+    """A runaway job: pulls in a tight loop and ignores Retry-After."""
+    session = requests.Session()
+    session.headers["X-Client-ID"] = "greedy"
+    statuses = {}
+    while time.perf_counter() < deadline:
+        status = session.get(f"{base_url}/pull/{model_type}").status_code
+        statuses[status] = statuses.get(status, 0) + 1
+    return statuses
+
+
+def run_phase(base_url, model_types, args, greedy):
+    deadline = time.perf_counter() + args.duration
+    with ThreadPoolExecutor(max_workers=args.polite + greedy) as pool:
+        polite = [pool.submit(polite_client, base_url, f"polite-{index}", model_types, args.rows,
+                              args.polite_rate, deadline, args.seed + index) for index in range(args.polite)]
+        flood = [pool.submit(greedy_client, base_url, model_types[0], deadline) for _ in range(greedy)]
+        started = time.perf_counter()
+        polite = [future.result() for future in polite]
+        flood = [future.result() for future in flood]
+        elapsed = time.perf_counter() - started
+
+    greedy_statuses = {}
+    for statuses in flood:
+        for status, count in statuses.items():
+            greedy_statuses[str(status)] = greedy_statuses.get(str(status), 0) + count
+    return {
+        "polite": summarize([value for latencies, _ in polite for value in latencies],
+                            sum(errors for _, errors in polite), elapsed),
+        "greedy_statuses": greedy_statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Polite-client latency under a /pull flood")
+    parser.add_argument("--polite", type=int, default=8, help="Well-behaved clients")
+    parser.add_argument("--polite-rate", type=float, default=10.0, help="Requests per second per polite client")
+    parser.add_argument("--greedy", type=int, default=32, help="Threads of the flooding client")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per phase")
+    parser.add_argument("--rate-limit", type=float, default=50.0, help="RATE_LIMIT for the limited phase")
+    parser.add_argument("--burst", type=float, default=20.0, help="RATE_LIMIT_BURST for the limited phase")
+    parser.add_argument("--max-inflight-writes", type=int, default=4, help="MAX_INFLIGHT_WRITES for the limited phase")
+    parser.add_argument("--types", type=int, default=5, help="Model types to seed")
+    parser.add_argument("--rows", type=int, default=10000, help="Detail rows to seed per model type")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {"config": {key: value for key, value in vars(args).items() if key != "output"}, "phases": {}}
+    # Every client connects from 127.0.0.1, so they are told apart by header
+    limits = (f"RATE_LIMIT = {args.rate_limit}\nRATE_LIMIT_BURST = {args.burst}\nRATE_LIMIT_CLIENT_HEADER = X-Client-ID\n"
+              f"MAX_INFLIGHT_WRITES = {args.max_inflight_writes}\n")
+    phases = [("baseline", 0, ""), ("spike", args.greedy, ""), ("spike_limited", args.greedy, limits)]
+    with temporary_database() as database:
+        model_types = seed(database, args.types, args.rows)
+        service.close_db()
+        workdir = os.path.dirname(database)
+
+        for name, greedy, settings in phases:
+            # config.ini is read from the server's working directory
+            with open(os.path.join(workdir, "config.ini"), "w") as config_file:
+                config_file.write("[DEFAULT]\n" + settings)
+            port = free_port()
+            process = start_server("flask", workdir, port)
+            try:
+                results["phases"][name] = run_phase(f"http://127.0.0.1:{port}", model_types, args, greedy)
+            finally:
+                process.terminate()
+                process.wait()
+
+    for name, phase in results["phases"].items():
+        print(f"{name}: polite p50 {phase['polite']['p50_ms']} ms, p99 {phase['polite']['p99_ms']} ms, "
+              f"errors {phase['polite']['errors']}, greedy {phase['greedy_statuses']}", file=sys.stderr)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
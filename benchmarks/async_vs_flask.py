@@ -0,0 +1,201 @@
+"""
+Flask (threaded WSGI) vs. ASGI under many mostly-idle connections.
+
+Seeds a temporary database, then for each server and connection count
+opens that many keep-alive connections. Each one sends a request (mostly
+searches, some pulls) every --interval seconds with random jitter.
+Latency, errors and the server's thread count and memory are reported
+per run as JSON.
+
+Usage:
+    python benchmarks/async_vs_flask.py --connections 100 1000 2000 --interval 1 --duration 10
+
+Requires uvicorn for the ASGI server. Raise the open-files limit
+(`ulimit -n`) above the largest connection count.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+from common import service, temporary_database
+from load_test import seed, summarize
+from worker_scaling import REPO_ROOT, free_port
+
+SERVERS = {
+    "flask": lambda port: [sys.executable, "-c",
+                           "import logging, sys; sys.path.insert(0, sys.argv[1]); "
+                           "logging.getLogger('werkzeug').setLevel(logging.ERROR); "
+                           "import model_numbering_service as s; "
+                           "s.create_app().run(host='127.0.0.1', port=int(sys.argv[2]), threaded=True)",
+                           REPO_ROOT, str(port)],
+    "asgi": lambda port: [sys.executable, "-m", "uvicorn", "model_numbering_asgi:app", "--app-dir", REPO_ROOT,
+                          "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+                          "--backlog", "4096"],
+}
+
+
+async def http_get(reader, writer, path):
+    """One HTTP/1.1 request on an open connection. Returns (status, keep_alive)."""
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Server closed the connection.")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    else:
+        await reader.read()
+    keep_alive = status_line.startswith(b"HTTP/1.1") and headers.get("connection", "").lower() != "close"
+    return int(status_line.split()[1]), keep_alive
+
+
+class IdleConnection:
+    """A client that keeps one connection open and sends a request every `interval` seconds."""
+
+    def __init__(self, port, model_types, rows, interval, seed_value):
+        self.port = port
+        self.model_types = model_types
+        self.rows = rows
+        self.interval = interval
+        self.random = random.Random(seed_value)
+        self.latencies = []
+        self.errors = 0
+        self.reconnects = 0
+        self.connection = None
+
+    async def connect(self, limit):
+        async with limit:
+            self.connection = await asyncio.open_connection("127.0.0.1", self.port)
+
+    def next_path(self):
+        model_type = self.random.choice(self.model_types)
+        if self.random.random() < 0.1:
+            return f"/pull/{model_type}"
+        return f"/search/{model_type}/{self.random.randint(1, self.rows)}"
+
+    async def run(self, deadline):
+        await asyncio.sleep(self.random.uniform(0, self.interval))
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                if self.connection is None:
+                    self.reconnects += 1
+                    self.connection = await asyncio.open_connection("127.0.0.1", self.port)
+                status, keep_alive = await http_get(*self.connection, self.next_path())
+                self.latencies.append(time.perf_counter() - started)
+                if status >= 500:
+                    self.errors += 1
+            except (OSError, asyncio.IncompleteReadError, ConnectionError):
+                self.errors += 1
+                keep_alive = False
+            if not keep_alive:
+                self.close()
+            await asyncio.sleep(self.interval * self.random.uniform(0.5, 1.5))
+        self.close()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection[1].close()
+            self.connection = None
+
+
+def server_resources(pid):
+    """Thread count and resident memory of the server process (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/status") as status_file:
+            fields = dict(line.split(":", 1) for line in status_file)
+    except OSError:
+        return {}
+    return {"threads": int(fields["Threads"]), "rss_mb": round(int(fields["VmRSS"].split()[0]) / 1024, 1)}
+
+
+async def run_connections(port, pid, model_types, args, count):
+    clients = [IdleConnection(port, model_types, args.rows, args.interval, args.seed + index) for index in range(count)]
+    limit = asyncio.Semaphore(100)
+    connected = await asyncio.gather(*(client.connect(limit) for client in clients), return_exceptions=True)
+    failed = sum(isinstance(result, Exception) for result in connected)
+
+    started = time.perf_counter()
+    runs = asyncio.gather(*(client.run(started + args.duration) for client in clients))
+    await asyncio.sleep(args.duration / 2)
+    resources = server_resources(pid)
+    await runs
+    elapsed = time.perf_counter() - started
+
+    latencies = [value for client in clients for value in client.latencies]
+    return {
+        "connections": count,
+        "failed_connects": failed,
+        "reconnects": sum(client.reconnects for client in clients),
+        "server": resources,
+        "overall": summarize(latencies, sum(client.errors for client in clients), elapsed),
+    }
+
+
+def start_server(name, workdir, port):
+    process = subprocess.Popen(SERVERS[name](port), cwd=workdir)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            asyncio.run(asyncio.wait_for(asyncio.open_connection("127.0.0.1", port), 1))
+            return process
+        except (OSError, asyncio.TimeoutError):
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{name} server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flask vs. ASGI with many mostly-idle connections")
+    parser.add_argument("--servers", nargs="+", choices=sorted(SERVERS), default=["flask", "asgi"])
+    parser.add_argument("--connections", type=int, nargs="+", default=[100, 1000, 2000], help="Open connections per run")
+    parser.add_argument("--interval", type=float, default=1.0, help="Mean seconds between requests on a connection")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per run")
+    parser.add_argument("--types", type=int, default=5, help="Model types to seed")
+    parser.add_argument("--rows", type=int, default=10000, help="Detail rows to seed per model type")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {"config": {key: value for key, value in vars(args).items() if key != "output"}, "runs": []}
+    with temporary_database() as database:
+        model_types = seed(database, args.types, args.rows)
+        service.close_db()
+        workdir = os.path.dirname(database)
+
+        for name in args.servers:
+            for count in args.connections:
+                port = free_port()
+                process = start_server(name, workdir, port)
+                try:
+                    run = asyncio.run(run_connections(port, process.pid, model_types, args, count))
+                finally:
+                    process.terminate()
+                    process.wait()
+                run["server_name"] = name
+                results["runs"].append(run)
+                print(f"{name} connections={count}: {run['overall']['throughput']} req/s, "
+                      f"p99 {run['overall']['p99_ms']} ms, errors {run['overall']['errors']}, "
+                      f"threads {run['server'].get('threads')}", file=sys.stderr)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Shared helpers for the benchmark scripts: run the service on a local
+port against a throwaway database.
+"""
+
+from contextlib import contextmanager
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+# Benchmarks are run as scripts from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model_numbering_service as service
+from werkzeug.serving import make_server
+
+
+@contextmanager
+def temporary_database():
+    """Point the service at a fresh database for the duration of the block."""
+    workdir = tempfile.mkdtemp(prefix="modelnum-bench-")
+    saved = service.DATABASE
+    # Same file name as the service default, so servers started with
+    # --chdir into this directory use the same database
+    service.DATABASE = os.path.join(workdir, "model_numbers.db")
+    try:
+        service.init_db()
+        yield service.DATABASE
+    finally:
+        service.close_db()
+        service.DATABASE = saved
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+@contextmanager
+def local_server(host="127.0.0.1", port=0):
+    """Serve `service.app` on a threaded WSGI server and yield its base URL."""
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server(host, port, service.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://{host}:{server.server_port}"
+    finally:
+        server.shutdown()
+        thread.join()
@@ -0,0 +1,290 @@
+"""
+Load test for every service endpoint.
+
+Starts the service against a temporary database, seeds it with the
+requested number of model types and detail rows, then drives a mixed
+pull/confirm/release/search/edit workload at one or more concurrency
+levels. Throughput and p50/p95/p99 latency are reported per operation and
+written as JSON, so runs can be compared to catch regressions.
+
+Usage:
+    python benchmarks/load_test.py --types 10 --rows 100000 --concurrency 1 8 32
+    python benchmarks/load_test.py --output run.json --compare baseline.json
+    python benchmarks/load_test.py --group-commit-window 2 --synchronous FULL
+    python benchmarks/load_test.py --storage memory --mode inprocess
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import platform
+import random
+import sqlite3
+import threading
+import time
+
+import requests
+
+from common import local_server, service, temporary_database
+
+OPERATIONS = ("pull", "confirm", "release", "search", "edit")
+SEED_CHUNK = 50000
+
+
+def seeded_status(number):
+    """Deterministic status for seeded rows: 3/5 confirmed, 1/5 pulled, 1/5 released."""
+    return ("confirmed", "confirmed", "confirmed", "pulled", "released")[number % 5]
+
+
+def seed(database, types, rows):
+    """Bulk-load `types` model types with `rows` detail rows each."""
+    model_types = [f"T{index:03}" for index in range(types)]
+    expires_at = time.time() + service.RELEASE_TIME
+    with sqlite3.connect(database) as conn:
+        conn.executemany("INSERT INTO model_numbers (model_type, description, latest_number) VALUES (?, ?, ?)",
+                         [(model_type, "Load test", rows) for model_type in model_types])
+        for model_type in model_types:
+            for start in range(1, rows + 1, SEED_CHUNK):
+                conn.executemany(
+                    "INSERT INTO model_details (model_type, model_number, model_name, status, expires_at) VALUES (?, ?, ?, ?, ?)",
+                    ((model_type, number, f"Model {number}", seeded_status(number),
+                      expires_at if seeded_status(number) == "pulled" else None)
+                     for number in range(start, min(start + SEED_CHUNK, rows + 1))))
+                conn.commit()
+    with service.get_db() as conn:
+        service.free_numbers.rebuild(conn.cursor())
+    return model_types
+
+
+def seed_memory(storage, types, rows):
+    """The same data as `seed`, loaded into a memory storage backend."""
+    model_types = [f"T{index:03}" for index in range(types)]
+    for model_type in model_types:
+        storage.add_model_type(model_type, "Load test")
+        storage.allocate(model_type, rows)
+        for number in range(1, rows + 1):
+            if seeded_status(number) != "pulled":
+                storage.transition(model_type, number, "pulled", "confirmed")
+            if seeded_status(number) == "released":
+                storage.transition(model_type, number, "confirmed", "released")
+    return model_types
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.session = requests.Session()
+
+    def get(self, path):
+        response = self.session.get(self.base_url + path)
+        return response.status_code, response.json()
+
+    def post(self, path, payload=None):
+        response = self.session.post(self.base_url + path, json=payload)
+        return response.status_code, response.json()
+
+
+class InProcessClient:
+    def __init__(self):
+        self.client = service.app.test_client()
+
+    def get(self, path):
+        response = self.client.get(path)
+        return response.status_code, response.json
+
+    def post(self, path, payload=None):
+        response = self.client.post(path, json=payload)
+        return response.status_code, response.json
+
+
+class Worker:
+    """One simulated client. Confirms and releases numbers it pulled itself."""
+
+    def __init__(self, client, model_types, rows, weights, seed_value):
+        self.client = client
+        self.model_types = model_types
+        self.rows = rows
+        self.weights = weights
+        self.random = random.Random(seed_value)
+        self.pulled = []
+        self.confirmed = []
+        self.latencies = {operation: [] for operation in OPERATIONS}
+        self.errors = {operation: 0 for operation in OPERATIONS}
+
+    def pick(self):
+        operation = self.random.choices(OPERATIONS, weights=self.weights)[0]
+        if operation == "confirm" and not self.pulled:
+            return "pull"
+        if operation == "release" and not self.confirmed:
+            return "confirm" if self.pulled else "pull"
+        return operation
+
+    def step(self):
+        operation = self.pick()
+        model_type = self.random.choice(self.model_types)
+        number = self.random.randint(1, max(self.rows, 1))
+        started = time.perf_counter()
+        if operation == "pull":
+            status, body = self.client.get(f"/pull/{model_type}")
+            if status == 200:
+                self.pulled.append((model_type, body["number"]))
+        elif operation == "confirm":
+            model_type, number = self.pulled.pop()
+            status, _ = self.client.post(f"/confirm/{model_type}/{number}")
+            if status == 200:
+                self.confirmed.append((model_type, number))
+        elif operation == "release":
+            model_type, number = self.confirmed.pop()
+            status, _ = self.client.post(f"/release/{model_type}/{number}")
+        elif operation == "search":
+            status, _ = self.client.get(f"/search/{model_type}/{number}")
+        else:
+            status, _ = self.client.post(f"/edit_model_details/{model_type}-{number}",
+                                         {"model_name": f"Model {number}", "model_notes": "load test"})
+        self.latencies[operation].append(time.perf_counter() - started)
+        # Searches for numbers that were never seeded are expected misses
+        if status >= 500 or (status >= 400 and operation != "search"):
+            self.errors[operation] += 1
+
+    def run(self, deadline, start_barrier):
+        start_barrier.wait()
+        while time.perf_counter() < deadline:
+            self.step()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    as_ms = lambda value: None if value is None else round(value * 1000, 3)
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "throughput": round(len(latencies) / elapsed, 1),
+        "mean_ms": as_ms(sum(latencies) / len(latencies)) if latencies else None,
+        "p50_ms": as_ms(percentile(latencies, 0.50)),
+        "p95_ms": as_ms(percentile(latencies, 0.95)),
+        "p99_ms": as_ms(percentile(latencies, 0.99)),
+    }
+
+
+def run_level(make_client, model_types, args, concurrency):
+    barrier = threading.Barrier(concurrency + 1)
+    workers = [Worker(make_client(), model_types, args.rows, args.weights, args.seed + index)
+               for index in range(concurrency)]
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        deadline = time.perf_counter() + args.duration
+        futures = [pool.submit(worker.run, deadline, barrier) for worker in workers]
+        barrier.wait()
+        started = time.perf_counter()
+        for future in futures:
+            future.result()
+        elapsed = time.perf_counter() - started
+
+    operations = {}
+    for operation in OPERATIONS:
+        latencies = [value for worker in workers for value in worker.latencies[operation]]
+        errors = sum(worker.errors[operation] for worker in workers)
+        operations[operation] = summarize(latencies, errors, elapsed)
+    all_latencies = [value for worker in workers for values in worker.latencies.values() for value in values]
+    total_errors = sum(sum(worker.errors.values()) for worker in workers)
+    return {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "overall": summarize(all_latencies, total_errors, elapsed),
+        "operations": operations,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Return human-readable regressions of `results` against `baseline`."""
+    regressions = []
+    baseline_levels = {level["concurrency"]: level for level in baseline["levels"]}
+    for level in results["levels"]:
+        previous = baseline_levels.get(level["concurrency"])
+        if not previous:
+            continue
+        for operation, current in [("overall", level["overall"])] + list(level["operations"].items()):
+            before = previous["overall"] if operation == "overall" else previous["operations"].get(operation)
+            if not before or not before["count"] or not current["count"]:
+                continue
+            if current["throughput"] < before["throughput"] * (1 - threshold):
+                regressions.append(f"c={level['concurrency']} {operation}: throughput "
+                                   f"{before['throughput']} -> {current['throughput']} ops/s")
+            if before["p99_ms"] and current["p99_ms"] > before["p99_ms"] * (1 + threshold):
+                regressions.append(f"c={level['concurrency']} {operation}: p99 "
+                                   f"{before['p99_ms']} -> {current['p99_ms']} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mixed-workload load test for the model numbering service")
+    parser.add_argument("--types", type=int, default=5, help="Model types to seed")
+    parser.add_argument("--rows", type=int, default=10000, help="Detail rows to seed per model type")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="Concurrency levels to run")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per concurrency level")
+    parser.add_argument("--weights", type=float, nargs=5, default=[30, 15, 5, 40, 10],
+                        metavar=("PULL", "CONFIRM", "RELEASE", "SEARCH", "EDIT"), help="Relative operation weights")
+    parser.add_argument("--mode", choices=("http", "inprocess"), default="http",
+                        help="Drive a local HTTP server or call the Flask app in-process")
+    parser.add_argument("--group-commit-window", type=float, metavar="MS",
+                        help="Enable group commit with this window in milliseconds")
+    parser.add_argument("--synchronous", choices=("OFF", "NORMAL", "FULL"), help="Override DB_SYNCHRONOUS")
+    parser.add_argument("--storage", choices=sorted(service.STORAGE_BACKENDS), default="sqlite",
+                        help="Storage backend to run against")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Baseline JSON file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed regression as a fraction")
+    args = parser.parse_args()
+    if args.group_commit_window is not None:
+        service.GROUP_COMMIT = True
+        service.GROUP_COMMIT_WINDOW = args.group_commit_window / 1000
+    if args.synchronous:
+        service.DB_SYNCHRONOUS = args.synchronous
+
+    with temporary_database() as database:
+        seed_started = time.perf_counter()
+        if args.storage == "memory":
+            service.storage = service.MemoryStorage()
+            model_types = seed_memory(service.storage, args.types, args.rows)
+        else:
+            model_types = seed(database, args.types, args.rows)
+        seed_seconds = time.perf_counter() - seed_started
+
+        results = {
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+            "environment": {"python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                            "platform": platform.platform()},
+            "seed_seconds": round(seed_seconds, 3),
+            "levels": [],
+        }
+        if args.mode == "http":
+            with local_server() as base_url:
+                for concurrency in args.concurrency:
+                    results["levels"].append(run_level(lambda: HttpClient(base_url), model_types, args, concurrency))
+        else:
+            for concurrency in args.concurrency:
+                results["levels"].append(run_level(InProcessClient, model_types, args, concurrency))
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+        for regression in regressions:
+            print("REGRESSION:", regression)
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
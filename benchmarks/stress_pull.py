@@ -0,0 +1,99 @@
+"""
+Concurrency stress test for number allocation.
+
+Starts the service on a local port against a temporary database, seeds a
+pool of released numbers, then runs many concurrent pullers. Every number
+handed out must be unique; the script exits non-zero on any duplicate.
+
+Usage:
+    python benchmarks/stress_pull.py --clients 200 --pulls 20 --released 500
+"""
+
+import argparse
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import json
+import sqlite3
+import threading
+import time
+
+import requests
+
+from common import local_server, service, temporary_database
+
+MODEL_TYPE = "STRESS"
+
+
+def seed_released(database, count):
+    """Create `count` numbers in the released state so pullers race on reuse."""
+    with sqlite3.connect(database) as conn:
+        conn.execute("UPDATE model_numbers SET latest_number=? WHERE model_type=?", (count, MODEL_TYPE))
+        conn.executemany("INSERT INTO model_details (model_type, model_number, status) VALUES (?, ?, 'released')",
+                         [(MODEL_TYPE, number) for number in range(1, count + 1)])
+        conn.commit()
+    with service.get_db() as conn:
+        service.free_numbers.rebuild(conn.cursor())
+
+
+def run_client(base_url, pulls, batch, start_barrier):
+    session = requests.Session()
+    numbers = []
+    errors = 0
+    start_barrier.wait()
+    for _ in range(pulls):
+        if batch > 1:
+            response = session.get(f"{base_url}/pull/{MODEL_TYPE}", params={"count": batch})
+            if response.status_code == 200:
+                numbers.extend(response.json()["numbers"])
+                continue
+        else:
+            response = session.get(f"{base_url}/pull/{MODEL_TYPE}")
+            if response.status_code == 200:
+                numbers.append(response.json()["number"])
+                continue
+        errors += 1
+    return numbers, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent pull stress test")
+    parser.add_argument("--clients", type=int, default=200, help="Number of concurrent pullers")
+    parser.add_argument("--pulls", type=int, default=20, help="Requests per client")
+    parser.add_argument("--batch", type=int, default=1, help="Numbers per request (uses ?count=N when > 1)")
+    parser.add_argument("--released", type=int, default=500, help="Released numbers to seed before the run")
+    args = parser.parse_args()
+
+    with temporary_database() as database:
+        service.app.test_client().post(f"/add_model_type/{MODEL_TYPE}/Stress")
+        seed_released(database, args.released)
+
+        with local_server() as base_url:
+            barrier = threading.Barrier(args.clients)
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.clients) as pool:
+                futures = [pool.submit(run_client, base_url, args.pulls, args.batch, barrier)
+                           for _ in range(args.clients)]
+                results = [future.result() for future in futures]
+            elapsed = time.perf_counter() - started
+
+    numbers = [number for client_numbers, _ in results for number in client_numbers]
+    errors = sum(client_errors for _, client_errors in results)
+    duplicates = {number: seen for number, seen in Counter(numbers).items() if seen > 1}
+
+    report = {
+        "clients": args.clients,
+        "requests": args.clients * args.pulls,
+        "numbers": len(numbers),
+        "errors": errors,
+        "duplicates": len(duplicates),
+        "seconds": round(elapsed, 3),
+        "pulls_per_sec": round(len(numbers) / elapsed, 1),
+    }
+    print(json.dumps(report, indent=2))
+    if duplicates:
+        print("Duplicate numbers handed out:", sorted(duplicates)[:20])
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Throughput scaling with the number of server worker processes.
+
+Seeds a temporary database, then for each worker count starts gunicorn
+with `model_numbering_service:create_app()` against it and drives the
+load_test workload over HTTP. Reports overall throughput and latency per
+worker count, and which process held the reaper lease.
+
+Usage:
+    python benchmarks/worker_scaling.py --workers 1 2 4 8 --concurrency 32 --duration 10
+    python benchmarks/worker_scaling.py --workers 1 2 4 8 --block-size 100
+
+Requires gunicorn (Linux/macOS). The client runs in this process, so on
+small machines it competes with the server for CPU; scaling is bounded
+by the cores available to both.
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import requests
+
+from common import service, temporary_database
+from load_test import HttpClient, run_level, seed
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def start_gunicorn(workdir, workers, port, block_size=0):
+    # config.ini is read from the working directory, so each run gets its own
+    with open(os.path.join(workdir, "config.ini"), "w") as config_file:
+        config_file.write(f"[DEFAULT]\nWORKERS = {workers}\nLEASE_TTL = 3\nBLOCK_SIZE = {block_size}\n")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--workers", str(workers), "--bind", f"127.0.0.1:{port}",
+         "--chdir", workdir, "--pythonpath", REPO_ROOT, "--log-level", "warning",
+         "model_numbering_service:create_app()"])
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            requests.get(f"{base_url}/list_model_types", timeout=5)
+            return process, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start")
+
+
+def reaper_lease_holder():
+    with service.get_db() as conn:
+        row = conn.execute("SELECT holder FROM service_leases WHERE name='reaper'").fetchone()
+    return row[0] if row else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput vs. worker count")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts to compare")
+    parser.add_argument("--types", type=int, default=5, help="Model types to seed")
+    parser.add_argument("--rows", type=int, default=10000, help="Detail rows to seed per model type")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per worker count")
+    parser.add_argument("--weights", type=float, nargs=5, default=[10, 5, 2, 70, 13],
+                        metavar=("PULL", "CONFIRM", "RELEASE", "SEARCH", "EDIT"), help="Relative operation weights")
+    parser.add_argument("--block-size", type=int, default=0, help="BLOCK_SIZE for the workers (0 = no block leasing)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {"config": {key: value for key, value in vars(args).items() if key != "output"}, "runs": []}
+    with temporary_database() as database:
+        model_types = seed(database, args.types, args.rows)
+        service.close_db()
+        workdir = os.path.dirname(database)
+
+        for workers in args.workers:
+            process, base_url = start_gunicorn(workdir, workers, free_port(), args.block_size)
+            try:
+                level = run_level(lambda: HttpClient(base_url), model_types, args, args.concurrency)
+                holder = reaper_lease_holder()
+            finally:
+                process.terminate()
+                process.wait()
+            results["runs"].append({
+                "workers": workers,
+                "reaper_lease_holder": holder,
+                "overall": level["overall"],
+                "operations": level["operations"],
+            })
+            print(f"workers={workers}: {level['overall']['throughput']} req/s, "
+                  f"p99 {level['overall']['p99_ms']} ms", file=sys.stderr)
+
+    baseline = results["runs"][0]["overall"]["throughput"]
+    for run in results["runs"]:
+        run["speedup"] = round(run["overall"]["throughput"] / baseline, 2) if baseline else None
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+---------------------------------------------------------------
+Model Numbering Service (ASGI) - model_numbering_asgi.py
+---------------------------------------------------------------
+
+Description:
+    An asyncio front end for the Model Numbering Service, for
+    clients that hold many mostly-idle connections open. The
+    event loop owns the connections; each request runs the
+    same Flask view on a bounded database executor, so routes
+    and JSON are identical to `model_numbering_service.py`.
+    The reaper and lease renewal run as asyncio tasks in place
+    of APScheduler.
+
+    Run with:
+
+        uvicorn model_numbering_asgi:app --host 0.0.0.0 --port 5001
+
+License:
+    MIT License
+
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import io
+import logging
+import sys
+import time
+
+import model_numbering_service as service
+
+# Threads that run views; each holds at most one pooled connection at a time
+DB_EXECUTOR_SIZE = int(service.config.get("DEFAULT", "DB_EXECUTOR_SIZE", fallback=str(service.DB_POOL_SIZE)))
+# Long-lived requests wait on their own threads so they cannot starve the database executor
+STREAM_EXECUTOR_SIZE = int(service.config.get("DEFAULT", "STREAM_EXECUTOR_SIZE", fallback="256"))
+STREAM_PATHS = {"/events", "/export"}
+# Request bodies up to this size arrive on the event loop before the view starts
+MAX_BUFFERED_BODY = int(service.config.get("DEFAULT", "MAX_BUFFERED_BODY", fallback="1048576"))
+
+# ---------------------------------------------------------------
+# Background tasks
+#
+# AsyncScheduler stands in for the APScheduler instance in
+# `service.scheduler`: `wake_reaper_at` calls `modify_job` and
+# `stop_scheduler` calls `shutdown`, from any thread. The jobs themselves
+# are the service's own functions, run on the database executor.
+# ---------------------------------------------------------------
+
+class AsyncScheduler:
+    def __init__(self, loop, executor):
+        self.loop = loop
+        self.executor = executor
+        self._reaper_due = time.time() + service.CHECK_INTERVAL
+        self._reaper_wake = asyncio.Event()
+        self._tasks = []
+
+    def start(self):
+        self._tasks.append(self.loop.create_task(self._every(service.LEASE_TTL / 3, service.reaper_lease_job)))
+        self._tasks.append(self.loop.create_task(self._reaper()))
+        if service.BLOCK_SIZE:
+            self._tasks.append(self.loop.create_task(
+                self._every(service.BLOCK_LEASE_TTL / 3, service.block_allocator.renew, delay=True)))
+        if service.BACKUP_INTERVAL:
+            self._tasks.append(self.loop.create_task(
+                self._every(service.BACKUP_INTERVAL, service.backup_job, delay=True)))
+        if service.ARCHIVE_AFTER:
+            self._tasks.append(self.loop.create_task(
+                self._every(service.ARCHIVE_INTERVAL, service.archive_job, delay=True)))
+
+    async def _run(self, job):
+        try:
+            await self.loop.run_in_executor(self.executor, job)
+        except Exception:
+            service.app.logger.exception("Background job %s failed", job.__name__)
+
+    async def _every(self, seconds, job, delay=False):
+        if delay:
+            await asyncio.sleep(seconds)
+        while True:
+            await self._run(job)
+            await asyncio.sleep(seconds)
+
+    async def _reaper(self):
+        while True:
+            self._reaper_wake.clear()
+            timeout = self._reaper_due - time.time()
+            if timeout > 0:
+                try:
+                    await asyncio.wait_for(self._reaper_wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            # Like the interval trigger: the next run is queued before this one starts
+            self._reaper_due = time.time() + service.CHECK_INTERVAL
+            await self._run(service.reaper_job)
+
+    def _set_reaper_due(self, deadline):
+        self._reaper_due = deadline
+        self._reaper_wake.set()
+
+    def modify_job(self, job_id, next_run_time):
+        self.loop.call_soon_threadsafe(self._set_reaper_due, next_run_time.timestamp())
+
+    async def _cancel(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def shutdown(self, wait=True):
+        future = asyncio.run_coroutine_threadsafe(self._cancel(), self.loop)
+        if wait:
+            future.result()
+
+# ---------------------------------------------------------------
+# ASGI application
+# ---------------------------------------------------------------
+
+class _RequestBody(io.RawIOBase):
+    """
+    `wsgi.input` for a view running on an executor: the part of the body
+    already received, then (for large bodies) the ASGI receive channel,
+    read as needed.
+    """
+
+    def __init__(self, receive, loop, buffered=b"", more=False):
+        self._receive = receive
+        self._loop = loop
+        self._buffer = buffered
+        self._more = more
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._buffer and self._more:
+            message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+            if message["type"] == "http.disconnect":
+                raise OSError("Client disconnected.")
+            self._buffer = message.get("body", b"")
+            self._more = message.get("more_body", False)
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+def _environ(scope, body):
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope["query_string"].decode("latin1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BufferedReader(body),
+        "wsgi.input_terminated": True,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": service.WORKERS > 1,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"], environ["REMOTE_PORT"] = scope["client"][0], str(scope["client"][1])
+    for name, value in scope["headers"]:
+        name = name.decode("latin1").upper().replace("-", "_")
+        value = value.decode("latin1")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = "HTTP_" + name
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+def _start(environ):
+    """Call the Flask app. Whole bodies of sized responses are read here, in the same executor hop."""
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response["status"] = int(status.split(" ", 1)[0])
+        response["headers"] = [(name.lower().encode("latin1"), value.encode("latin1")) for name, value in headers]
+
+    iterable = service.app.wsgi_app(environ, start_response)
+    sized = any(name == b"content-length" for name, _ in response["headers"])
+    if sized:
+        chunks = list(iterable)
+        if hasattr(iterable, "close"):
+            iterable.close()
+        return response, chunks, None
+    return response, [], iter(iterable)
+
+def _next_chunk(iterator):
+    return next(iterator, None)
+
+async def _buffer_body(receive):
+    """
+    Receive the request body, stopping once more than MAX_BUFFERED_BODY
+    bytes have arrived. Returns (body so far, whether more follows), or
+    None if the client went away.
+    """
+    chunks, size, more = [], 0, True
+    while more and size <= MAX_BUFFERED_BODY:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunks.append(message.get("body", b""))
+        size += len(chunks[-1])
+        more = message.get("more_body", False)
+    return b"".join(chunks), more
+
+async def _wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+class ModelNumberingASGI:
+    def __init__(self):
+        self.executor = None
+        self.stream_executor = None
+        self.scheduler = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.startup()
+                except Exception as error:
+                    await send({"type": "lifespan.startup.failed", "message": str(error)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def startup(self):
+        loop = asyncio.get_running_loop()
+        self.executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_SIZE, thread_name_prefix="db")
+        self.stream_executor = ThreadPoolExecutor(max_workers=STREAM_EXECUTOR_SIZE, thread_name_prefix="stream")
+        await loop.run_in_executor(self.executor, service.initialize)
+        self.scheduler = service.scheduler = AsyncScheduler(loop, self.executor)
+        self.scheduler.start()
+
+    async def shutdown(self):
+        loop = asyncio.get_running_loop()
+        # Cancels the tasks, returns unused block numbers and gives up the reaper lease
+        await loop.run_in_executor(self.executor, service.stop_scheduler)
+        await loop.run_in_executor(self.executor, service.group_writer.stop)
+        self.executor.shutdown(wait=True)
+        self.stream_executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _http(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        received = await _buffer_body(receive)
+        if received is None:
+            return
+        body, more = received
+        # A view reading the rest of a large upload blocks its thread on the
+        # client, so those requests stay off the database executor
+        executor = self.stream_executor if more or scope["path"] in STREAM_PATHS else self.executor
+        environ = _environ(scope, _RequestBody(receive, loop, body, more))
+        # run_in_executor does not carry context variables, and each hop may land
+        # on another thread. Every step runs in one context of its own, so the
+        # request context a streamed view pushes is still there when it is popped.
+        context = contextvars.copy_context()
+        response, chunks, iterator = await loop.run_in_executor(executor, context.run, _start, environ)
+        await send({"type": "http.response.start", "status": response["status"], "headers": response["headers"]})
+        if iterator is None:
+            await send({"type": "http.response.body", "body": b"".join(chunks)})
+            return
+        # Streamed responses (e.g. /export, /events) are produced chunk by chunk
+        # on the executor until they end or the client goes away
+        disconnected = loop.create_task(_wait_for_disconnect(receive))
+        try:
+            while not disconnected.done():
+                chunk = await loop.run_in_executor(executor, context.run, _next_chunk, iterator)
+                if chunk is None:
+                    await send({"type": "http.response.body", "body": b""})
+                    break
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        finally:
+            disconnected.cancel()
+            if hasattr(iterator, "close"):
+                await loop.run_in_executor(executor, context.run, iterator.close)
+
+app = ModelNumberingASGI()
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    service.app.logger.setLevel(logging.INFO)
+    uvicorn.run(app, host=service.HOST, port=service.PORT, log_level="info")
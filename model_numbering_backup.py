@@ -0,0 +1,62 @@
+"""
+---------------------------------------------------------------
+Model Numbering Service (backups) - model_numbering_backup.py
+---------------------------------------------------------------
+
+Description:
+    Command-line access to the service's online backups, run on
+    the server host from the directory holding config.ini:
+
+        python model_numbering_backup.py backup
+        python model_numbering_backup.py list
+        python model_numbering_backup.py verify backups/model_numbers-....db.gz
+        python model_numbering_backup.py restore backups/model_numbers-....db.gz
+
+    `backup` may run while the service is up. `restore` replaces
+    the database file, so stop the service first; the replaced
+    file is kept next to it as `<database>.pre-restore`.
+
+License:
+    MIT License
+
+"""
+
+import argparse
+import json
+import sys
+
+import model_numbering_service as service
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Back up, verify and restore the model numbering database")
+    parser.add_argument("--database", default=service.DATABASE, help="Database file (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("backup", help="Take a compressed snapshot now")
+    commands.add_parser("list", help="List snapshots, newest first")
+    verify = commands.add_parser("verify", help="Check that a snapshot is intact")
+    verify.add_argument("file")
+    restore = commands.add_parser("restore", help="Replace the database with a snapshot (stop the service first)")
+    restore.add_argument("file")
+    args = parser.parse_args(argv)
+    service.DATABASE = args.database
+
+    if args.command == "backup":
+        result = service.run_backup()
+    elif args.command == "list":
+        result = {"backups": list(reversed(service.backup_files()))}
+    elif args.command == "verify":
+        result = service.verify_backup(args.file)
+    else:
+        try:
+            result = service.restore_backup(args.file)
+        except ValueError as error:
+            print(error, file=sys.stderr)
+            return 1
+        result["restored"] = service.DATABASE
+    print(json.dumps(result, indent=2))
+    return 0 if result.get("ok", True) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
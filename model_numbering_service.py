@@ -20,12 +20,41 @@ License:
 
 """
 
-from datetime import datetime, timedelta
+import atexit
+import bisect
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+import cProfile
+import csv
+from datetime import datetime, timezone
+from functools import wraps
+import glob
+import gzip
+import hashlib
+import heapq
+import io
+import itertools
+import json
+import logging
+import math
+import multiprocessing
+import os
+import pstats
+import queue
+import random
+import re
+import shutil
+import socket
 import sqlite3
-from flask import Flask, jsonify, request
+import tempfile
+import threading
+import time
+import zlib
+from flask import Flask, Response, g, jsonify, request, send_file, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from apscheduler.schedulers.background import BackgroundScheduler
 import configparser
-from datetime import datetime, timedelta
 
 config = configparser.ConfigParser()
 config.read('config.ini')
@@ -34,13 +63,360 @@ HOST = config.get("DEFAULT", "HOST", fallback="127.0.0.1")
 PORT = int(config.get("DEFAULT", "PORT", fallback="5001"))
 RELEASE_TIME = int(config.get("DEFAULT", "RELEASE_TIME", fallback="172800"))
 CHECK_INTERVAL = int(config.get("DEFAULT", "CHECK_INTERVAL", fallback="3600"))
+REAPER_BATCH_SIZE = int(config.get("DEFAULT", "REAPER_BATCH_SIZE", fallback="500"))
+LEASE_TTL = float(config.get("DEFAULT", "LEASE_TTL", fallback="30"))
+WORKERS = int(config.get("DEFAULT", "WORKERS", fallback="1"))
+MAX_PULL_COUNT = int(config.get("DEFAULT", "MAX_PULL_COUNT", fallback="10000"))
+MAX_BULK_ITEMS = int(config.get("DEFAULT", "MAX_BULK_ITEMS", fallback="10000"))
+DEFAULT_PAGE_SIZE = int(config.get("DEFAULT", "DEFAULT_PAGE_SIZE", fallback="100"))
+MAX_PAGE_SIZE = int(config.get("DEFAULT", "MAX_PAGE_SIZE", fallback="1000"))
+EXPORT_FETCH_SIZE = int(config.get("DEFAULT", "EXPORT_FETCH_SIZE", fallback="1000"))
+IMPORT_BATCH_SIZE = int(config.get("DEFAULT", "IMPORT_BATCH_SIZE", fallback="5000"))
+DB_TIMEOUT = float(config.get("DEFAULT", "DB_TIMEOUT", fallback="30"))
+DB_POOL_SIZE = int(config.get("DEFAULT", "DB_POOL_SIZE", fallback="16"))
+DB_SYNCHRONOUS = config.get("DEFAULT", "DB_SYNCHRONOUS", fallback="NORMAL")
+DB_CACHE_SIZE = int(config.get("DEFAULT", "DB_CACHE_SIZE", fallback="-16000"))  # negative = KiB
+DB_MMAP_SIZE = int(config.get("DEFAULT", "DB_MMAP_SIZE", fallback="268435456"))
+DB_STATEMENT_CACHE = int(config.get("DEFAULT", "DB_STATEMENT_CACHE", fallback="256"))
+FREE_NUMBER_INDEX = config.getboolean("DEFAULT", "FREE_NUMBER_INDEX", fallback=True)
+BLOCK_SIZE = int(config.get("DEFAULT", "BLOCK_SIZE", fallback="0"))  # 0 = allocate from latest_number on every pull
+BLOCK_LEASE_TTL = float(config.get("DEFAULT", "BLOCK_LEASE_TTL", fallback="300"))
+GROUP_COMMIT = config.getboolean("DEFAULT", "GROUP_COMMIT", fallback=False)
+GROUP_COMMIT_WINDOW = float(config.get("DEFAULT", "GROUP_COMMIT_WINDOW", fallback="2")) / 1000  # configured in ms
+GROUP_COMMIT_MAX_BATCH = int(config.get("DEFAULT", "GROUP_COMMIT_MAX_BATCH", fallback="64"))
+EVENTS_POLL_INTERVAL = float(config.get("DEFAULT", "EVENTS_POLL_INTERVAL", fallback="1"))
+EVENTS_MAX_WAIT = float(config.get("DEFAULT", "EVENTS_MAX_WAIT", fallback="60"))
+EVENTS_HEARTBEAT = float(config.get("DEFAULT", "EVENTS_HEARTBEAT", fallback="15"))
+READ_CACHE_SIZE = int(config.get("DEFAULT", "READ_CACHE_SIZE", fallback="10000"))  # 0 = off
+NUMBER_SPACE = int(config.get("DEFAULT", "NUMBER_SPACE", fallback="9999"))  # highest number per type, for /stats
+STORAGE_BACKEND = config.get("DEFAULT", "STORAGE_BACKEND", fallback="sqlite")  # sqlite or memory
+RATE_LIMIT = float(config.get("DEFAULT", "RATE_LIMIT", fallback="0"))  # requests/s per client, 0 = off
+RATE_LIMIT_BURST = float(config.get("DEFAULT", "RATE_LIMIT_BURST", fallback="20"))
+RATE_LIMIT_CLIENT_HEADER = config.get("DEFAULT", "RATE_LIMIT_CLIENT_HEADER", fallback="")  # only a header a trusted proxy sets
+MAX_INFLIGHT_WRITES = int(config.get("DEFAULT", "MAX_INFLIGHT_WRITES", fallback="0"))  # 0 = no cap
+WRITE_QUEUE_SIZE = int(config.get("DEFAULT", "WRITE_QUEUE_SIZE", fallback="64"))
+WRITE_QUEUE_TIMEOUT = float(config.get("DEFAULT", "WRITE_QUEUE_TIMEOUT", fallback="2"))
+BACKUP_DIR = config.get("DEFAULT", "BACKUP_DIR", fallback="backups")
+BACKUP_INTERVAL = float(config.get("DEFAULT", "BACKUP_INTERVAL", fallback="0"))  # seconds, 0 = on demand only
+BACKUP_KEEP = int(config.get("DEFAULT", "BACKUP_KEEP", fallback="7"))
+BACKUP_STEP_PAGES = int(config.get("DEFAULT", "BACKUP_STEP_PAGES", fallback="256"))
+BACKUP_STEP_PAUSE = float(config.get("DEFAULT", "BACKUP_STEP_PAUSE", fallback="0.005"))  # seconds between steps
+BACKUP_MAX_RESTARTS = int(config.get("DEFAULT", "BACKUP_MAX_RESTARTS", fallback="3"))
+ARCHIVE_AFTER = float(config.get("DEFAULT", "ARCHIVE_AFTER", fallback="0"))  # seconds since pulled, 0 = never archive
+ARCHIVE_INTERVAL = float(config.get("DEFAULT", "ARCHIVE_INTERVAL", fallback="86400"))
+ARCHIVE_BATCH_SIZE = int(config.get("DEFAULT", "ARCHIVE_BATCH_SIZE", fallback="1000"))
+PROFILE_SAMPLE_RATE = float(config.get("DEFAULT", "PROFILE_SAMPLE_RATE", fallback="0"))  # fraction of requests, 0 = on request only
+PROFILE_HEADER = config.get("DEFAULT", "PROFILE_HEADER", fallback="X-Profile")
+PROFILE_ALLOW_CLIENT = config.getboolean("DEFAULT", "PROFILE_ALLOW_CLIENT", fallback=False)  # honour PROFILE_HEADER, serve /profiles
+PROFILE_DIR = config.get("DEFAULT", "PROFILE_DIR", fallback="profiles")
+PROFILE_KEEP = int(config.get("DEFAULT", "PROFILE_KEEP", fallback="100"))
+SLOW_REQUEST_THRESHOLD = float(config.get("DEFAULT", "SLOW_REQUEST_THRESHOLD", fallback="0")) / 1000  # configured in ms, 0 = off
+
+def _route_rate_limits():
+    """Per-route overrides from the [rate_limits] section, as `<route rule> = <requests/s>/<burst>`."""
+    limits = {}
+    if config.has_section("rate_limits"):
+        for rule, value in config.items("rate_limits"):
+            if rule in config.defaults():
+                continue
+            rate, _, burst = value.partition("/")
+            limits[rule] = (float(rate), float(burst) if burst else RATE_LIMIT_BURST)
+    return limits
+
+ROUTE_RATE_LIMITS = _route_rate_limits()
 
 app = Flask(__name__)
 
 DATABASE = "model_numbers.db"
 
+# ---------------------------------------------------------------
+# Metrics
+#
+# A minimal Prometheus registry: counters, gauges and histograms with
+# labels, each guarded by a single lock. Served as text from /metrics.
+# ---------------------------------------------------------------
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def set(self, *label_values, value):
+        with self._lock:
+            self._values[label_values] = value
+
+    def replace(self, values):
+        """Swap in a complete {label_values: value} mapping, dropping series that no longer exist."""
+        with self._lock:
+            self._values = dict(values)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+
+class Gauge(Counter):
+    kind = "gauge"
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            series = {labels: (list(buckets), total, count) for labels, (buckets, total, count) in self._series.items()}
+        names = self.labels + ("le",)
+        for label_values, (buckets, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, buckets):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{_format_labels(names, label_values + (bound,))} {cumulative}"
+            yield f"{self.name}_bucket{_format_labels(names, label_values + ('+Inf',))} {count}"
+            yield f"{self.name}_sum{_format_labels(self.labels, label_values)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labels, label_values)} {count}"
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+        # Called before each scrape to refresh gauges that are read on demand
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def expose(self):
+        for collect in self.collectors:
+            collect()
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+DB_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1)
+
+metrics = MetricsRegistry()
+REQUEST_COUNT = metrics.register(Counter(
+    "modelnum_http_requests_total", "HTTP requests by route, method and status.", ("route", "method", "status")))
+REQUEST_LATENCY = metrics.register(Histogram(
+    "modelnum_http_request_duration_seconds", "HTTP request latency by route.", ("route",)))
+QUERY_LATENCY = metrics.register(Histogram(
+    "modelnum_db_query_duration_seconds", "Time spent executing each SQL statement.", ("query",), DB_BUCKETS))
+CONNECTION_OPEN_LATENCY = metrics.register(Histogram(
+    "modelnum_db_connection_open_seconds", "Time to open and configure a pooled SQLite connection.", (), DB_BUCKETS))
+REAPER_DURATION = metrics.register(Histogram(
+    "modelnum_reaper_run_duration_seconds", "Duration of each reaper run.", (), DB_BUCKETS))
+REAPER_RELEASED = metrics.register(Counter(
+    "modelnum_reaper_released_total", "Pulled numbers released by the reaper after their deadline."))
+MODEL_NUMBERS = metrics.register(Gauge(
+    "modelnum_model_numbers", "Numbers per model type and status.", ("model_type", "status")))
+GROUP_COMMIT_BATCH_SIZE = metrics.register(Histogram(
+    "modelnum_group_commit_batch_size", "Writes applied per group-commit transaction.", (),
+    (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)))
+READ_CACHE_REQUESTS = metrics.register(Counter(
+    "modelnum_read_cache_requests_total", "Read-cache lookups by namespace and result.", ("namespace", "result")))
+GROUP_COMMIT_DURATION = metrics.register(Histogram(
+    "modelnum_group_commit_duration_seconds", "Time to apply and commit each group-commit batch.", (), DB_BUCKETS))
+BACKUP_DURATION = metrics.register(Histogram(
+    "modelnum_backup_duration_seconds", "Duration of each online backup, including compression.", (),
+    (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)))
+BACKUP_PAGES = metrics.register(Counter(
+    "modelnum_backup_pages_total", "Database pages copied by online backups."))
+BACKUP_RUNS = metrics.register(Counter(
+    "modelnum_backup_runs_total", "Online backups by result.", ("result",)))
+BACKUP_LAST_SUCCESS = metrics.register(Gauge(
+    "modelnum_backup_last_success_timestamp_seconds", "When the last successful backup finished."))
+ARCHIVED_NUMBERS = metrics.register(Counter(
+    "modelnum_archived_numbers_total", "Confirmed numbers moved to the archive table."))
+REJECTED_REQUESTS = metrics.register(Counter(
+    "modelnum_rejected_requests_total", "Requests answered 429 by route and reason.", ("route", "reason")))
+WRITE_GATE = metrics.register(Gauge(
+    "modelnum_write_gate_requests", "Writes in flight and waiting for a slot.", ("state",)))
+
+_query_labels = {}
+
+def _query_label(sql):
+    """Collapse whitespace so each statement gets one stable label."""
+    label = _query_labels.get(sql)
+    if label is None:
+        label = _query_labels[sql] = " ".join(sql.split())
+    return label
+
+def _record_query(sql, started):
+    elapsed = time.perf_counter() - started
+    label = _query_label(sql)
+    QUERY_LATENCY.observe(elapsed, label)
+    trace = current_trace()
+    if trace is not None:
+        trace.add_statement(label, elapsed)
+
+class InstrumentedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record_query(sql, started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record_query(sql, started)
+
+class InstrumentedConnection(sqlite3.Connection):
+    """A connection whose cursors record per-statement timings."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+class ConnectionPool:
+    """
+    A bounded pool of long-lived SQLite connections. Each connection runs
+    in WAL mode with the tuned pragmas from config.ini and keeps its own
+    prepared-statement cache, so requests skip the connect/prepare cost and
+    readers no longer block behind writers.
+    """
+
+    def __init__(self, database, size):
+        self.database = database
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _open(self):
+        started = time.perf_counter()
+        conn = sqlite3.connect(self.database, timeout=DB_TIMEOUT, check_same_thread=False,
+                               cached_statements=DB_STATEMENT_CACHE, factory=InstrumentedConnection)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size={DB_CACHE_SIZE}")
+        conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        CONNECTION_OPEN_LATENCY.observe(time.perf_counter() - started)
+        return conn
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+        if can_open:
+            try:
+                return self._open()
+            except BaseException:
+                with self._lock:
+                    self._opened -= 1
+                raise
+        try:
+            return self._idle.get(timeout=DB_TIMEOUT)
+        except queue.Empty:
+            raise sqlite3.OperationalError("Timed out waiting for a database connection.")
+
+    def release(self, conn):
+        # Never hand a connection with a half-finished transaction to the next request
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._opened = 0
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Return the pool for the current DATABASE, replacing it if the path has changed."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.database != DATABASE:
+            if _pool is not None:
+                _pool.close()
+            _pool = ConnectionPool(DATABASE, DB_POOL_SIZE)
+        return _pool
+
+@contextmanager
+def get_db():
+    """
+    Borrow a pooled connection. Like `sqlite3.connect` used as a context
+    manager, the block commits on success and rolls back on error.
+    """
+    pool = get_pool()
+    started = time.perf_counter()
+    conn = pool.acquire()
+    trace = current_trace()
+    if trace is not None:
+        trace.add("connection", time.perf_counter() - started)
+    try:
+        with conn:
+            yield conn
+    finally:
+        pool.release(conn)
+
+def close_db():
+    """Close every idle pooled connection."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
 def init_db():
-    with sqlite3.connect(DATABASE) as conn:
+    with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS model_numbers (
@@ -63,172 +439,1023 @@ def init_db():
         )
         ''')
         conn.commit()
+        run_migrations(conn)
+        free_numbers.rebuild(conn.cursor())
+
+# ---------------------------------------------------------------
+# Schema migrations
+#
+# The tables created by init_db are schema version 0. Each migration
+# below runs once, in its own transaction, and is recorded in the
+# `schema_version` table so existing databases upgrade in place.
+# Append new migrations to MIGRATIONS; never edit an applied one.
+# ---------------------------------------------------------------
+
+def _migrate_unique_number_indexes(cursor):
+    # Databases written before allocation was serialized can hold the same
+    # number twice. Keep one row per (type, number), preferring the row
+    # that is in use, so the unique index can be built. The others are set
+    # aside in model_details_duplicates for an operator to review.
+    cursor.execute("""
+        SELECT id FROM (
+            SELECT id, ROW_NUMBER() OVER (
+                PARTITION BY model_type, model_number
+                ORDER BY CASE status WHEN 'confirmed' THEN 0 WHEN 'pulled' THEN 1 ELSE 2 END, id DESC
+            ) AS duplicate_rank
+            FROM model_details
+        ) WHERE duplicate_rank > 1
+    """)
+    duplicates = cursor.fetchall()
+    if duplicates:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS model_details_duplicates (
+                id INTEGER PRIMARY KEY,
+                model_type TEXT NOT NULL,
+                model_number INTEGER NOT NULL,
+                model_name TEXT,
+                model_notes TEXT,
+                status TEXT NOT NULL,
+                timestamp DATETIME,
+                set_aside_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.executemany("""
+            INSERT INTO model_details_duplicates (id, model_type, model_number, model_name, model_notes, status, timestamp)
+            SELECT id, model_type, model_number, model_name, model_notes, status, timestamp FROM model_details WHERE id = ?
+        """, duplicates)
+        cursor.executemany("DELETE FROM model_details WHERE id = ?", duplicates)
+        app.logger.warning("Moved %d duplicate model_details rows to model_details_duplicates; "
+                           "review them and merge any names or notes worth keeping", len(duplicates))
+    # Point lookups for search/confirm/release/edit
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_model_details_type_number ON model_details (model_type, model_number)")
+    # Covers the lowest-released-number lookup in allocate_numbers
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_model_details_type_status_number ON model_details (model_type, status, model_number)")
+
+def _migrate_pull_deadlines(cursor):
+    # Pulled rows carry their release deadline as epoch seconds, so the
+    # reaper no longer compares timestamps stored in mixed text formats.
+    cursor.execute("ALTER TABLE model_details ADD COLUMN expires_at REAL")
+    cursor.execute("""
+        UPDATE model_details
+        SET expires_at = (julianday(timestamp) - 2440587.5) * 86400.0 + ?
+        WHERE status='pulled'
+    """, (RELEASE_TIME,))
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_model_details_pulled_expiry ON model_details (expires_at) WHERE status='pulled'")
+
+def _migrate_full_text_search(cursor):
+    # External-content FTS5 index over model names and notes, kept in step
+    # with model_details by triggers on every write path
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS model_details_fts USING fts5(
+            model_name, model_notes, content='model_details', content_rowid='id'
+        )
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS model_details_fts_insert AFTER INSERT ON model_details BEGIN
+            INSERT INTO model_details_fts (rowid, model_name, model_notes) VALUES (new.id, new.model_name, new.model_notes);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS model_details_fts_delete AFTER DELETE ON model_details BEGIN
+            INSERT INTO model_details_fts (model_details_fts, rowid, model_name, model_notes) VALUES ('delete', old.id, old.model_name, old.model_notes);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS model_details_fts_update AFTER UPDATE OF model_name, model_notes ON model_details BEGIN
+            INSERT INTO model_details_fts (model_details_fts, rowid, model_name, model_notes) VALUES ('delete', old.id, old.model_name, old.model_notes);
+            INSERT INTO model_details_fts (rowid, model_name, model_notes) VALUES (new.id, new.model_name, new.model_notes);
+        END
+    """)
+    cursor.execute("INSERT INTO model_details_fts (model_details_fts) VALUES ('rebuild')")
+
+def _migrate_service_leases(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS service_leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+
+def _migrate_number_blocks(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS number_blocks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            model_type TEXT NOT NULL,
+            holder TEXT NOT NULL,
+            start_number INTEGER NOT NULL,
+            end_number INTEGER NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_number_blocks_expiry ON number_blocks (expires_at)")
+
+def _migrate_events(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            model_type TEXT NOT NULL,
+            model_number INTEGER NOT NULL,
+            event TEXT NOT NULL,
+            previous_status TEXT,
+            created_at REAL NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_events_type_id ON events (model_type, id)")
+    # Written by triggers so every writer, including bulk endpoints and the
+    # reaper, records its changes in the same transaction
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS model_details_events_insert AFTER INSERT ON model_details
+        WHEN new.status = 'pulled' BEGIN
+            INSERT INTO events (model_type, model_number, event, created_at)
+            VALUES (new.model_type, new.model_number, 'pulled', (julianday('now') - 2440587.5) * 86400.0);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS model_details_events_update AFTER UPDATE OF status, model_name, model_notes ON model_details
+        WHEN old.status IS NOT new.status OR old.model_name IS NOT new.model_name OR old.model_notes IS NOT new.model_notes BEGIN
+            INSERT INTO events (model_type, model_number, event, previous_status, created_at)
+            VALUES (new.model_type, new.model_number,
+                    CASE WHEN old.status IS NOT new.status THEN new.status ELSE 'edited' END,
+                    old.status, (julianday('now') - 2440587.5) * 86400.0);
+        END
+    """)
+
+def _migrate_status_counts(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS status_counts (
+            model_type TEXT NOT NULL,
+            status TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (model_type, status)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS model_details_counts_insert AFTER INSERT ON model_details BEGIN
+            INSERT INTO status_counts (model_type, status, count) VALUES (new.model_type, new.status, 1)
+            ON CONFLICT (model_type, status) DO UPDATE SET count = count + 1;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS model_details_counts_delete AFTER DELETE ON model_details BEGIN
+            UPDATE status_counts SET count = count - 1 WHERE model_type = old.model_type AND status = old.status;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS model_details_counts_update AFTER UPDATE OF model_type, status ON model_details
+        WHEN old.model_type IS NOT new.model_type OR old.status IS NOT new.status BEGIN
+            UPDATE status_counts SET count = count - 1 WHERE model_type = old.model_type AND status = old.status;
+            INSERT INTO status_counts (model_type, status, count) VALUES (new.model_type, new.status, 1)
+            ON CONFLICT (model_type, status) DO UPDATE SET count = count + 1;
+        END
+    """)
+    cursor.execute("""
+        INSERT INTO status_counts (model_type, status, count)
+        SELECT model_type, status, COUNT(*) FROM model_details GROUP BY model_type, status
+    """)
+
+def _migrate_archive(cursor):
+    # Same columns as model_details; rows keep their key but get a new id.
+    # Archived rows are only ever inserted and deleted: edits move them back
+    # to model_details first, so the FTS index needs no update trigger.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS model_details_archive (
+            id INTEGER PRIMARY KEY,
+            model_type TEXT NOT NULL,
+            model_number INTEGER NOT NULL,
+            model_name TEXT,
+            model_notes TEXT,
+            status TEXT NOT NULL,
+            timestamp DATETIME,
+            expires_at REAL,
+            archived_at REAL NOT NULL
+        )
+    """)
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_model_details_archive_type_number ON model_details_archive (model_type, model_number)")
+    # Lets the archive job find its candidates without scanning every confirmed row
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_model_details_confirmed_timestamp ON model_details (timestamp) WHERE status='confirmed'")
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS model_details_archive_fts USING fts5(
+            model_name, model_notes, content='model_details_archive', content_rowid='id'
+        )
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS model_details_archive_insert AFTER INSERT ON model_details_archive BEGIN
+            INSERT INTO model_details_archive_fts (rowid, model_name, model_notes) VALUES (new.id, new.model_name, new.model_notes);
+            INSERT INTO status_counts (model_type, status, count) VALUES (new.model_type, new.status, 1)
+            ON CONFLICT (model_type, status) DO UPDATE SET count = count + 1;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS model_details_archive_delete AFTER DELETE ON model_details_archive BEGIN
+            INSERT INTO model_details_archive_fts (model_details_archive_fts, rowid, model_name, model_notes) VALUES ('delete', old.id, old.model_name, old.model_notes);
+            UPDATE status_counts SET count = count - 1 WHERE model_type = old.model_type AND status = old.status;
+        END
+    """)
+
+MIGRATIONS = [
+    (1, "Unique (model_type, model_number) and status lookup indexes", _migrate_unique_number_indexes),
+    (2, "Epoch release deadline on pulled numbers", _migrate_pull_deadlines),
+    (3, "Full-text index over model names and notes", _migrate_full_text_search),
+    (4, "Leases for electing one process to run background jobs", _migrate_service_leases),
+    (5, "Blocks of numbers leased to service processes", _migrate_number_blocks),
+    (6, "Append-only log of number state changes", _migrate_events),
+    (7, "Per-type status counters maintained by triggers", _migrate_status_counts),
+    (8, "Archive table for long-confirmed numbers", _migrate_archive),
+]
+
+def schema_version(cursor):
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return cursor.fetchone()[0]
+
+def run_migrations(conn):
+    """Apply every migration newer than the database's recorded schema version."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.commit()
+    for version, description, migrate in MIGRATIONS:
+        with write_transaction(conn) as cursor:
+            # Re-read under the write lock in case another process got here first
+            if schema_version(cursor) >= version:
+                continue
+            migrate(cursor)
+            cursor.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)", (version, description))
 
 @app.route('/add_model_type/<model_type>/<description>', methods=['POST'])
 def add_model_type(model_type, description):
-    with sqlite3.connect(DATABASE) as conn:
-        cursor = conn.cursor()
-        try:
-            cursor.execute("INSERT INTO model_numbers (model_type, description) VALUES (?, ?)", (model_type, description))
-            conn.commit()
-            return jsonify({"status": f"Model type {model_type} added with description: {description}"}), 200
-        except sqlite3.IntegrityError:
-            return jsonify({"error": "Model type already exists."}), 400
+    if not storage.add_model_type(model_type, description):
+        return jsonify({"error": "Model type already exists."}), 400
+    read_cache.invalidate("model_types")
+    return jsonify({"status": f"Model type {model_type} added with description: {description}"}), 200
 
 @app.route('/list_model_types', methods=['GET'])
 def list_model_types():
-    with sqlite3.connect(DATABASE) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT model_type, description FROM model_numbers")
-        rows = cursor.fetchall()
-        if rows:
-            return jsonify({"model_types": [{ "type": row[0], "description": row[1] } for row in rows]}), 200
-        else:
-            return jsonify({"error": "No model types found."}), 404
+    return cached_json("model_types", (), _list_model_types)
 
-@app.route('/pull/<model_type>', methods=['GET'])
-def pull_number(model_type):
-    with sqlite3.connect(DATABASE) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT model_number FROM model_details WHERE model_type=? AND status='released' ORDER BY model_number ASC LIMIT 1", (model_type,))
-        row = cursor.fetchone()
-        if row:
-            model_number = row[0]
-            cursor.execute("UPDATE model_details SET status='pulled', timestamp=? WHERE model_type=? AND model_number=?", (datetime.utcnow(), model_type, model_number))
-            conn.commit()
-            return jsonify({"number": model_number}), 200
-        else:
-            cursor.execute("SELECT latest_number FROM model_numbers WHERE model_type=?", (model_type,))
-            row = cursor.fetchone()
-            if row:
-                latest_number = row[0] + 1
-                cursor.execute("UPDATE model_numbers SET latest_number=? WHERE model_type=?", (latest_number, model_type))
-                cursor.execute("INSERT INTO model_details (model_type, model_number, status) VALUES (?, ?, 'pulled')", (model_type, latest_number))
-                conn.commit()
-                return jsonify({"number": latest_number}), 200
+def _list_model_types():
+    rows = storage.list_model_types()
+    if rows:
+        return {"model_types": [{ "type": row[0], "description": row[1] } for row in rows]}, 200
+    else:
+        return {"error": "No model types found."}, 404
+
+_transaction_hooks = threading.local()
+
+@contextmanager
+def write_transaction(conn):
+    """
+    Run a block inside an IMMEDIATE transaction so the write lock is held
+    from the first read to the commit. Two clients can therefore never
+    read the same released number or the same `latest_number`.
+
+    Callbacks registered with `after_commit` / `after_rollback` inside the
+    block run once the outcome is known.
+    """
+    _transaction_hooks.commit = []
+    _transaction_hooks.rollback = []
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn.cursor()
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        callbacks = _transaction_hooks.rollback
+        _transaction_hooks.commit = _transaction_hooks.rollback = None
+        # Undo in reverse, so state restored by an earlier step is not overwritten by a later one
+        for callback in reversed(callbacks):
+            callback()
+        raise
+    callbacks = _transaction_hooks.commit
+    _transaction_hooks.commit = _transaction_hooks.rollback = None
+    for callback in callbacks:
+        callback()
+    notify_write()
+
+def after_commit(callback):
+    """Run `callback` once the current write_transaction commits."""
+    if getattr(_transaction_hooks, "commit", None) is None:
+        raise RuntimeError("after_commit must be called inside write_transaction.")
+    _transaction_hooks.commit.append(callback)
+
+def after_rollback(callback):
+    """Run `callback` if the current write_transaction rolls back."""
+    if getattr(_transaction_hooks, "rollback", None) is None:
+        raise RuntimeError("after_rollback must be called inside write_transaction.")
+    _transaction_hooks.rollback.append(callback)
+
+# ---------------------------------------------------------------
+# Group commit
+#
+# With GROUP_COMMIT enabled, pull/confirm/release hand their writes to a
+# single writer thread. It collects the writes that arrive within
+# GROUP_COMMIT_WINDOW (up to GROUP_COMMIT_MAX_BATCH), applies each in its
+# own savepoint inside one transaction, and answers every caller only
+# after that shared commit. One fsync then covers the whole batch; pair
+# it with DB_SYNCHRONOUS = FULL when commits must survive power loss.
+# ---------------------------------------------------------------
+
+def _run_in_savepoint(cursor, fn):
+    """
+    Apply one job of a batch. If it raises, only its own changes and
+    transaction hooks are undone. Returns (succeeded, result or error).
+    """
+    commit_hooks, rollback_hooks = len(_transaction_hooks.commit), len(_transaction_hooks.rollback)
+    cursor.execute("SAVEPOINT group_commit_job")
+    try:
+        result = fn(cursor)
+    except Exception as error:
+        cursor.execute("ROLLBACK TO group_commit_job")
+        cursor.execute("RELEASE group_commit_job")
+        callbacks = _transaction_hooks.rollback[rollback_hooks:]
+        del _transaction_hooks.commit[commit_hooks:]
+        del _transaction_hooks.rollback[rollback_hooks:]
+        for callback in reversed(callbacks):
+            callback()
+        return False, error
+    cursor.execute("RELEASE group_commit_job")
+    return True, result
+
+class GroupCommitWriter:
+    """The writer thread behind group commit. Started on first use."""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn):
+        """Queue `fn(cursor)` for the next batch. Returns a Future for its result."""
+        future = Future()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+                self._thread.start()
+            self._queue.put((fn, future))
+        return future
+
+    def stop(self):
+        """Apply whatever is queued, then stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._queue.put(None)
+        if thread is not None:
+            thread.join()
+
+    def _collect(self):
+        job = self._queue.get()
+        if job is None:
+            return None
+        batch = [job]
+        deadline = time.perf_counter() + GROUP_COMMIT_WINDOW
+        while len(batch) < GROUP_COMMIT_MAX_BATCH:
+            try:
+                job = self._queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+            except queue.Empty:
+                break
+            if job is None:
+                self._queue.put(None)  # Stop once this batch is committed
+                break
+            batch.append(job)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            self._apply(batch)
+
+    def _apply(self, batch):
+        started = time.perf_counter()
+        outcomes = []
+        try:
+            with get_db() as conn, write_transaction(conn) as cursor:
+                for fn, _ in batch:
+                    outcomes.append(_run_in_savepoint(cursor, fn))
+        except Exception as error:
+            app.logger.exception("Group commit of %d writes failed", len(batch))
+            outcomes = [(False, error)] * len(batch)
+        GROUP_COMMIT_BATCH_SIZE.observe(len(batch))
+        GROUP_COMMIT_DURATION.observe(time.perf_counter() - started)
+        for (_, future), (succeeded, result) in zip(batch, outcomes):
+            if succeeded:
+                future.set_result(result)
             else:
-                return jsonify({"error": "Model type not available. Please add a model type using add_model_type."}), 400
+                future.set_exception(result)
 
-@app.route('/confirm/<model_type>/<number>', methods=['POST'])
-def confirm(model_type, number):
-    with sqlite3.connect(DATABASE) as conn:
-        cursor = conn.cursor()
+group_writer = GroupCommitWriter()
 
-        # Check if the model number exists
-        cursor.execute("SELECT status FROM model_details WHERE model_type=? AND model_number=?", (model_type, int(number)))
-        result = cursor.fetchone()
+def run_write(fn):
+    """
+    Run `fn(cursor)` in a write transaction and return its result. In
+    group-commit mode `fn` runs on the writer thread, sharing the
+    transaction with other requests, so it must not touch the Flask
+    request context.
+    """
+    if GROUP_COMMIT:
+        with traced("group_commit"):
+            return group_writer.submit(fn).result()
+    with get_db() as conn, write_transaction(conn) as cursor:
+        return fn(cursor)
+
+# ---------------------------------------------------------------
+# Read cache
+#
+# Rendered responses of hot read endpoints are kept in a process-local
+# LRU of READ_CACHE_SIZE entries. Each namespace has a version that is
+# bumped when its data changes: `numbers` after every committed write,
+# `model_types` when types are added or imported. Entries filled under
+# an older version are never served. Responses carry a strong ETag, so
+# clients can revalidate with If-None-Match and get 304 Not Modified.
+# ---------------------------------------------------------------
 
-        if not result:
-            return jsonify({"error": f"Model {model_type}-{number} does not exist."}), 404  # 404 Not Found
+class ReadCache:
+    def __init__(self, size):
+        self.size = size
+        self.source = None
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
 
-        # If the model number exists, but has a different status
-        if result[0] != 'pulled':
-            if result[0] == 'confirmed':
-                return jsonify({"error": f"Model {model_type}-{number} is already confirmed."}), 400  # 400 Bad Request
+    def version(self, namespace):
+        with self._lock:
+            return self._versions.get(namespace, 0)
+
+    def get(self, namespace, key):
+        with self._lock:
+            if self.source != _data_source():
+                self._entries.clear()
+                self.source = _data_source()
+                return None
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                return None
+            if entry[0] != self._versions.get(namespace, 0):
+                del self._entries[(namespace, key)]
+                return None
+            self._entries.move_to_end((namespace, key))
+            return entry[1]
+
+    def put(self, namespace, key, version, value):
+        with self._lock:
+            # A write committed while the value was read; it may already be stale
+            if not self.size or self.source != _data_source() or version != self._versions.get(namespace, 0):
+                return
+            self._entries[(namespace, key)] = (version, value)
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, namespace):
+        with self._lock:
+            self._versions[namespace] = self._versions.get(namespace, 0) + 1
+
+    def disable(self):
+        with self._lock:
+            self.size = 0
+            self._entries.clear()
+
+read_cache = ReadCache(READ_CACHE_SIZE)
+
+def _data_source():
+    """What cached reads were read from: the storage backend and, for SQLite, the database file."""
+    return (storage, DATABASE)
+
+def notify_write():
+    """Called after every committed write: expire cached number reads and wake event readers."""
+    read_cache.invalidate("numbers")
+    signal_events()
+
+def cached_json(namespace, key, build):
+    """
+    Serve a JSON response from the read cache, calling `build()` for a
+    (payload, status) pair on a miss. 200 responses get a strong ETag
+    and answer a matching If-None-Match with 304.
+    """
+    entry = read_cache.get(namespace, key)
+    READ_CACHE_REQUESTS.inc(namespace, "miss" if entry is None else "hit")
+    if entry is None:
+        version = read_cache.version(namespace)
+        payload, status = build()
+        body = jsonify(payload).get_data()
+        entry = (status, body, hashlib.sha1(body).hexdigest() if status == 200 else None)
+        read_cache.put(namespace, key, version, entry)
+
+    status, body, etag = entry
+    response = Response(body, status=status, mimetype="application/json")
+    if etag:
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        response.make_conditional(request)
+    return response
+
+class FreeNumberIndex:
+    """
+    Per-model-type min-heaps of released numbers, so the next reusable
+    number is found without touching disk.
+
+    The index is loaded from `model_details` the first time it is used for
+    a database and is only changed alongside a write transaction: numbers
+    taken by a pull are put back if the pull rolls back, and numbers
+    released by /release or the reaper are added after the commit. Use
+    `verify` / `rebuild` to check or recover it.
+    """
+
+    def __init__(self):
+        self.database = None
+        self._heaps = {}
+        self._lock = threading.Lock()
+
+    def _load(self, cursor):
+        heaps = {}
+        cursor.execute("SELECT model_type, model_number FROM model_details WHERE status='released'")
+        for model_type, model_number in cursor.fetchall():
+            heaps.setdefault(model_type, []).append(model_number)
+        for heap in heaps.values():
+            heapq.heapify(heap)
+        self._heaps = heaps
+        self.database = DATABASE
+
+    def rebuild(self, cursor):
+        with self._lock:
+            self._load(cursor)
+
+    def take(self, cursor, model_type, count):
+        """Remove and return up to `count` of the lowest released numbers."""
+        with self._lock:
+            if self.database != DATABASE:
+                self._load(cursor)
+            heap = self._heaps.get(model_type)
+            if not heap:
+                return []
+            return [heapq.heappop(heap) for _ in range(min(count, len(heap)))]
+
+    def add(self, model_type, numbers):
+        with self._lock:
+            if self.database != DATABASE:
+                return  # Loaded from disk, including these numbers, on next use
+            heap = self._heaps.setdefault(model_type, [])
+            for number in numbers:
+                heapq.heappush(heap, number)
+
+    def verify(self, cursor):
+        """Compare the index with the database. Returns the numbers missing from, and stale in, the index."""
+        cursor.execute("SELECT model_type, model_number FROM model_details WHERE status='released'")
+        on_disk = set(cursor.fetchall())
+        with self._lock:
+            if self.database != DATABASE:
+                in_memory = on_disk
             else:
-                return jsonify({"error": f"Model {model_type}-{number} cannot be confirmed in its current state."}), 400  # 400 Bad Request
+                in_memory = {(model_type, number) for model_type, heap in self._heaps.items() for number in heap}
+        return {
+            "missing": sorted(on_disk - in_memory),
+            "stale": sorted(in_memory - on_disk),
+        }
 
-        # Confirm the model number
-        cursor.execute("UPDATE model_details SET status='confirmed' WHERE model_type=? AND model_number=? AND status='pulled'", (model_type, int(number)))
-        conn.commit()
+free_numbers = FreeNumberIndex()
 
-        if cursor.rowcount:
-            return jsonify({"status": "confirmed"}), 200  # 200 OK
-        else:
-            return jsonify({"error": "Unexpected error while confirming."}), 500  # 500 Internal Server Error
+def _reuse_released_numbers(cursor, model_type, count, expires_at):
+    """Flip up to `count` of the lowest released numbers back to pulled."""
+    now = datetime.utcnow()
+    if not FREE_NUMBER_INDEX:
+        cursor.execute("SELECT model_number FROM model_details WHERE model_type=? AND status='released' ORDER BY model_number ASC LIMIT ?", (model_type, count))
+        reused = [r[0] for r in cursor.fetchall()]
+        cursor.executemany("UPDATE model_details SET status='pulled', timestamp=?, expires_at=? WHERE model_type=? AND model_number=?",
+                           [(now, expires_at, model_type, number) for number in reused])
+        return reused
 
-@app.route('/release/<model_type>/<number>', methods=['POST'])
-def release(model_type, number):
-    with sqlite3.connect(DATABASE) as conn:
-        cursor = conn.cursor()
+    reused = []
+    while len(reused) < count:
+        candidates = free_numbers.take(cursor, model_type, count - len(reused))
+        if not candidates:
+            break
+        for number in candidates:
+            # Guarded on status so a stale index entry is simply skipped
+            cursor.execute("UPDATE model_details SET status='pulled', timestamp=?, expires_at=? WHERE model_type=? AND model_number=? AND status='released'",
+                           (now, expires_at, model_type, number))
+            if cursor.rowcount:
+                reused.append(number)
+    after_rollback(lambda: free_numbers.add(model_type, reused))
+    return sorted(reused)
 
-        # Check if the model number exists
-        cursor.execute("SELECT status FROM model_details WHERE model_type=? AND model_number=?", (model_type, int(number)))
-        result = cursor.fetchone()
+def _release_block_range(cursor, block_id, model_type, start_number, end_number):
+    """
+    Give the unused numbers of a leased block back to the released pool and
+    drop the lease. Numbers already handed out have a detail row and are
+    left alone.
+    """
+    if start_number <= end_number:
+        cursor.execute("""
+            WITH RECURSIVE block(number) AS (
+                SELECT ? UNION ALL SELECT number + 1 FROM block WHERE number < ?
+            )
+            INSERT OR IGNORE INTO model_details (model_type, model_number, status)
+            SELECT ?, number, 'released' FROM block
+            WHERE NOT EXISTS (SELECT 1 FROM model_details_archive a WHERE a.model_type = ? AND a.model_number = number)
+        """, (start_number, end_number, model_type, model_type))
+        cursor.execute("SELECT model_number FROM model_details WHERE model_type=? AND model_number BETWEEN ? AND ? AND status='released'",
+                       (model_type, start_number, end_number))
+        returned = [r[0] for r in cursor.fetchall()]
+        after_commit(lambda: free_numbers.add(model_type, returned))
+    cursor.execute("DELETE FROM number_blocks WHERE id=?", (block_id,))
+
+class BlockAllocator:
+    """
+    Hi/lo allocation: each process leases a contiguous block of BLOCK_SIZE
+    numbers by moving `latest_number` once, then hands the block out from
+    memory, so pulls no longer read and rewrite the `model_numbers` row.
+
+    Leases live in `number_blocks` and are renewed by a scheduler job. A
+    process returns its unused numbers to the released pool on shutdown;
+    blocks left behind by a process that died are reclaimed by the reaper
+    once their lease expires. Each pull checks that its block is still
+    leased to this process, so a reclaimed block is never handed out.
+    """
 
-        if not result:
-            return jsonify({"error": f"Model {model_type}-{number} does not exist."}), 404  # 404 Not Found
+    def __init__(self):
+        self._blocks = {}  # model_type -> [block id, next number, end number]
+        self._lock = threading.Lock()
 
-        # If the model number exists, but has a different status
-        if result[0] != 'confirmed':
-            if result[0] == 'released':
-                return jsonify({"error": f"Model {model_type}-{number} is already released."}), 400  # 400 Bad Request
+    def _lease(self, cursor, model_type, size):
+        cursor.execute("SELECT latest_number FROM model_numbers WHERE model_type=?", (model_type,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        start_number, end_number = row[0] + 1, row[0] + size
+        cursor.execute("UPDATE model_numbers SET latest_number=? WHERE model_type=?", (end_number, model_type))
+        cursor.execute("INSERT INTO number_blocks (model_type, holder, start_number, end_number, expires_at) VALUES (?, ?, ?, ?, ?)",
+                       (model_type, node_id(), start_number, end_number, time.time() + BLOCK_LEASE_TTL))
+        return [cursor.lastrowid, start_number, end_number]
+
+    def take(self, cursor, model_type, count):
+        """
+        Hand out `count` consecutive-where-possible numbers, leasing new
+        blocks as needed. Returns None if the model type does not exist.
+        Must run inside `write_transaction`.
+        """
+        with self._lock:
+            saved = self._blocks.get(model_type)
+            after_rollback(lambda saved=list(saved) if saved else None: self._restore(model_type, saved))
+            numbers = []
+            while len(numbers) < count:
+                block = self._blocks.get(model_type)
+                if block is not None:
+                    cursor.execute("SELECT 1 FROM number_blocks WHERE id=? AND holder=?", (block[0], node_id()))
+                    if cursor.fetchone() is None:
+                        app.logger.warning("Block %d of %s was reclaimed; leasing a new one", block[0], model_type)
+                        block = None
+                if block is None:
+                    block = self._lease(cursor, model_type, max(BLOCK_SIZE, count - len(numbers)))
+                    if block is None:
+                        return None
+                    self._blocks[model_type] = block
+                taken = min(count - len(numbers), block[2] - block[1] + 1)
+                numbers.extend(range(block[1], block[1] + taken))
+                block[1] += taken
+                if block[1] > block[2]:
+                    cursor.execute("DELETE FROM number_blocks WHERE id=?", (block[0],))
+                    del self._blocks[model_type]
+            return numbers
+
+    def _restore(self, model_type, block):
+        with self._lock:
+            if block is None:
+                self._blocks.pop(model_type, None)
             else:
-                return jsonify({"error": f"Model {model_type}-{number} cannot be released in its current state."}), 400  # 400 Bad Request
+                self._blocks[model_type] = block
 
-        # Release the model number
-        cursor.execute("UPDATE model_details SET status='released' WHERE model_type=? AND model_number=? AND status='confirmed'", (model_type, int(number)))
-        conn.commit()
+    def renew(self):
+        """Extend the leases on every block this process holds."""
+        with get_db() as conn, write_transaction(conn) as cursor:
+            cursor.execute("UPDATE number_blocks SET expires_at=? WHERE holder=?", (time.time() + BLOCK_LEASE_TTL, node_id()))
+
+    def return_unused(self):
+        """Put the unused numbers of every held block back in the released pool."""
+        with self._lock:
+            blocks = [(model_type, block) for model_type, block in self._blocks.items()]
+            self._blocks = {}
+        if not blocks:
+            return
+        with get_db() as conn, write_transaction(conn) as cursor:
+            for model_type, (block_id, next_number, end_number) in blocks:
+                cursor.execute("SELECT 1 FROM number_blocks WHERE id=? AND holder=?", (block_id, node_id()))
+                if cursor.fetchone():
+                    _release_block_range(cursor, block_id, model_type, next_number, end_number)
+
+block_allocator = BlockAllocator()
+
+def allocate_numbers(cursor, model_type, count=1):
+    """
+    Reserve `count` numbers for a model type, reusing the lowest released
+    numbers first and extending `latest_number` by the remainder.
+
+    Returns the allocated numbers in ascending order, or None if the model
+    type does not exist. Must run inside `write_transaction`, which
+    serializes concurrent pulls and keeps the free-number index in step.
+
+    With BLOCK_SIZE set, new numbers come from this process's leased block
+    instead of `latest_number`.
+    """
+    if BLOCK_SIZE:
+        return _allocate_from_block(cursor, model_type, count)
+
+    cursor.execute("SELECT latest_number FROM model_numbers WHERE model_type=?", (model_type,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    latest_number = row[0]
+
+    expires_at = time.time() + RELEASE_TIME
+    reused = _reuse_released_numbers(cursor, model_type, count, expires_at)
+
+    # Extend the sequence for whatever is left
+    remaining = count - len(reused)
+    fresh = list(range(latest_number + 1, latest_number + 1 + remaining))
+    if fresh:
+        cursor.execute("UPDATE model_numbers SET latest_number=? WHERE model_type=?", (fresh[-1], model_type))
+        cursor.executemany("INSERT INTO model_details (model_type, model_number, status, expires_at) VALUES (?, ?, 'pulled', ?)",
+                           [(model_type, number, expires_at) for number in fresh])
+
+    after_commit(lambda: wake_reaper_at(expires_at))
+    return reused + fresh
+
+def _allocate_from_block(cursor, model_type, count):
+    expires_at = time.time() + RELEASE_TIME
+    reused = _reuse_released_numbers(cursor, model_type, count, expires_at)
+    fresh = block_allocator.take(cursor, model_type, count - len(reused)) if count > len(reused) else []
+    if fresh is None:
+        return None
+    if fresh:
+        cursor.executemany("INSERT INTO model_details (model_type, model_number, status, expires_at) VALUES (?, ?, 'pulled', ?)",
+                           [(model_type, number, expires_at) for number in fresh])
+    after_commit(lambda: wake_reaper_at(expires_at))
+    return sorted(reused + fresh)
+
+def _requested_count():
+    """Read the batch size from `?count=N` or a JSON body `{"count": N}`. Returns None for a single pull."""
+    count = request.args.get('count')
+    if count is not None:
+        count = int(count)
+    else:
+        data = request.get_json(silent=True)
+        if data is None:
+            return None
+        if not isinstance(data, dict):
+            raise ValueError
+        count = data.get('count')
+        if count is None:
+            return None
+        # bool is an int subclass, and 2.7 must not quietly become 2
+        if isinstance(count, bool) or not isinstance(count, int):
+            raise ValueError
+    if count < 1 or count > MAX_PULL_COUNT:
+        raise ValueError
+    return count
+
+@app.route('/pull/<model_type>', methods=['GET', 'POST'])
+def pull_number(model_type):
+    try:
+        count = _requested_count()
+    except (TypeError, ValueError):
+        return jsonify({"error": f"count must be an integer between 1 and {MAX_PULL_COUNT}."}), 400
+
+    numbers = storage.allocate(model_type, count or 1)
+    if numbers is None:
+        return jsonify({"error": "Model type not available. Please add a model type using add_model_type."}), 400
+
+    # Single pulls keep the original response shape
+    if count is None:
+        return jsonify({"number": numbers[0]}), 200
+    return jsonify({"numbers": numbers}), 200
+
+def _transition_number(cursor, model_type, number, from_status, to_status):
+    """Move a number from one status to another. Returns the status it had, or None if it does not exist."""
+    cursor.execute("SELECT status FROM model_details WHERE model_type=? AND model_number=?", (model_type, number))
+    result = cursor.fetchone()
+    if result is None:
+        cursor.execute("SELECT status FROM model_details_archive WHERE model_type=? AND model_number=?", (model_type, number))
+        result = cursor.fetchone()
+        if result and result[0] == from_status:
+            unarchive_numbers(cursor, [(model_type, number)])
+    if result and result[0] == from_status:
+        cursor.execute("UPDATE model_details SET status=? WHERE model_type=? AND model_number=?", (to_status, model_type, number))
+        if to_status == 'released':
+            after_commit(lambda: free_numbers.add(model_type, [number]))
+    return result[0] if result else None
+
+@app.route('/confirm/<model_type>/<number>', methods=['POST'])
+def confirm(model_type, number):
+    # Check and confirm in one write so the status cannot change in between
+    status = storage.transition(model_type, int(number), 'pulled', 'confirmed')
+
+    if status is None:
+        return jsonify({"error": f"Model {model_type}-{number} does not exist."}), 404  # 404 Not Found
 
-        if cursor.rowcount:
-            return jsonify({"status": "released"}), 200  # 200 OK
+    # If the model number exists, but has a different status
+    if status != 'pulled':
+        if status == 'confirmed':
+            return jsonify({"error": f"Model {model_type}-{number} is already confirmed."}), 400  # 400 Bad Request
         else:
-            return jsonify({"error": "Unexpected error while releasing."}), 500  # 500 Internal Server Error
+            return jsonify({"error": f"Model {model_type}-{number} cannot be confirmed in its current state."}), 400  # 400 Bad Request
+
+    return jsonify({"status": "confirmed"}), 200  # 200 OK
+
+@app.route('/release/<model_type>/<number>', methods=['POST'])
+def release(model_type, number):
+    # Check and release in one write so the status cannot change in between
+    status = storage.transition(model_type, int(number), 'confirmed', 'released')
+
+    if status is None:
+        return jsonify({"error": f"Model {model_type}-{number} does not exist."}), 404  # 404 Not Found
+
+    # If the model number exists, but has a different status
+    if status != 'confirmed':
+        if status == 'released':
+            return jsonify({"error": f"Model {model_type}-{number} is already released."}), 400  # 400 Bad Request
+        else:
+            return jsonify({"error": f"Model {model_type}-{number} cannot be released in its current state."}), 400  # 400 Bad Request
+
+    return jsonify({"status": "released"}), 200  # 200 OK
 
 
 @app.route('/search/<model_type>/<number>', methods=['GET'])
 def search(model_type, number):
-    with sqlite3.connect(DATABASE) as conn:
-        cursor = conn.cursor()
+    return cached_json("numbers", (model_type, number), lambda: _search(model_type, number))
 
-        # Retrieve status, model_name, and model_notes for the given model_type and model_number
-        cursor.execute("""
-            SELECT status, model_name, model_notes 
-            FROM model_details 
-            WHERE model_type=? AND model_number=?
-        """, (model_type, int(number)))
+def _search(model_type, number):
+    # Retrieve status, model_name, and model_notes for the given model_type and model_number
+    row = storage.search(model_type, int(number))
 
-        row = cursor.fetchone()
+    # If a matching row was found
+    if row:
+        status, model_name, model_notes = row
+        return {
+            "model_type": model_type,
+            "model_number": number,
+            "status": status,
+            "model_name": model_name,
+            "model_notes": model_notes
+        }, 200  # 200 OK
+    else:
+        # Return a more informative error message
+        return {
+            "error": f"Model number {model_type}-{number} not found in the database."
+        }, 404  # 404 Not Found
 
-        # If a matching row was found
-        if row:
-            status, model_name, model_notes = row
-            return jsonify({
-                "model_type": model_type,
-                "model_number": number,
-                "status": status,
-                "model_name": model_name,
-                "model_notes": model_notes
-            }), 200  # 200 OK
-        else:
-            # Return a more informative error message
-            return jsonify({
-                "error": f"Model number {model_type}-{number} not found in the database."
-            }), 404  # 404 Not Found
+def release_unconfirmed_numbers(now=None):
+    """
+    Release pulled numbers whose deadline has passed, through the
+    storage backend's `release_expired`, and record the run's metrics.
 
-def release_unconfirmed_numbers():
-    with sqlite3.connect(DATABASE) as conn:
-        cursor = conn.cursor()
-        cutoff_time = datetime.utcnow() - timedelta(seconds=RELEASE_TIME)
-        
-        # Fetch numbers that are set to be released
-        cursor.execute("SELECT * FROM model_details WHERE status='pulled'")
-        all_pulled = cursor.fetchall()
-
-        # Fetch numbers that should be released based on the timestamp
-        cursor.execute("SELECT * FROM model_details WHERE status='pulled' AND timestamp < ?", (cutoff_time,))
-        to_release = cursor.fetchall()
-
-        # Update those entries' status to 'released'
-        cursor.execute("UPDATE model_details SET status='released' WHERE status='pulled' AND timestamp < ?", (cutoff_time,))
-        conn.commit()
+    Returns a summary of the run, including the next pending deadline.
+    """
+    started = time.perf_counter()
+    summary = storage.release_expired(time.time() if now is None else now)
+    summary["duration"] = time.perf_counter() - started
+    REAPER_DURATION.observe(summary["duration"])
+    REAPER_RELEASED.inc(amount=summary["released"])
+    return summary
+
+# ---------------------------------------------------------------
+# Reaper scheduling
+#
+# The reaper is an APScheduler interval job; CHECK_INTERVAL is only a
+# safety net. After each run the job moves its own next run time to the
+# earliest pending deadline, and pulls move it forward when they create
+# an earlier one, so numbers are released when they fall due.
+#
+# Every process runs the scheduler, but only the holder of the `reaper`
+# lease in `service_leases` releases numbers. The holder renews the lease
+# every LEASE_TTL / 3 seconds; if it dies, another process takes over
+# once the lease expires.
+# ---------------------------------------------------------------
+
+REAPER_JOB_ID = "release_unconfirmed_numbers"
+REAPER_LEASE = "reaper"
+BLOCK_LEASE_JOB_ID = "renew_number_blocks"
+
+scheduler = None
+last_reaper_run = None
+_reaper_wake = None
+_reaper_lock = threading.Lock()
+_reaper_lease_until = 0.0
+
+def node_id():
+    """Identify this process in leases."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def acquire_lease(name, ttl=None, now=None):
+    """
+    Take the named lease if it is free or expired, or renew it if this
+    process already holds it. Returns the new expiry time, or None if
+    another process holds the lease.
+    """
+    ttl = LEASE_TTL if ttl is None else ttl
+    now = time.time() if now is None else now
+    holder = node_id()
+    current_holder, expires_at = storage.acquire_lease(name, holder, now + ttl, now)
+    return expires_at if current_holder == holder else None
+
+def release_lease(name):
+    """Give up the named lease, if held, so another process can take it at once."""
+    storage.release_lease(name, node_id())
 
-        # Print the information to console for debugging
-        # print(f"{datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')}: Checking for numbers to release...")
-        
-        # if all_pulled:
-        #     print(f"Currently pulled numbers:")
-        #     for entry in all_pulled:
-        #         print(f"Model type: {entry[1]}, Number: {entry[2]}, Timestamp: {entry[4]}")
+def is_reaper_leader():
+    """
+    Whether this process holds the reaper lease. Scheduled jobs that must
+    run once per deployment, however many workers there are, only run in
+    the leader: the reaper, backups and the archiver.
+    """
+    return time.time() < _reaper_lease_until
 
-        # if to_release:
-        #     print(f"Releasing the following numbers:")
-        #     for entry in to_release:
-        #         print(f"Model type: {entry[1]}, Number: {entry[2]}, Timestamp: {entry[4]}")
-        # else:
-        #     print(f"No numbers found to release at this time.")
+def reaper_lease_job():
+    global _reaper_lease_until
+    was_leader = is_reaper_leader()
+    # Count the lease as ours only until slightly before it expires in the database
+    expires_at = acquire_lease(REAPER_LEASE)
+    _reaper_lease_until = expires_at - LEASE_TTL / 3 if expires_at else 0.0
+    if not is_reaper_leader():
+        if was_leader:
+            app.logger.warning("%s lost the reaper lease", node_id())
+        return
 
-        # print("\n")  # Add a newline for clarity in the logs
+    if not was_leader:
+        app.logger.info("%s holds the reaper lease", node_id())
+        wake_reaper_at(time.time())
+    else:
+        # Other processes' pulls do not reach this scheduler; pick up their deadlines here
+        next_deadline = storage.next_deadline()
+        if next_deadline is not None:
+            wake_reaper_at(next_deadline)
+
+def wake_reaper_at(deadline):
+    """Make sure the reaper runs no later than `deadline` (epoch seconds)."""
+    global _reaper_wake
+    if scheduler is None:
+        return
+    with _reaper_lock:
+        if _reaper_wake is not None and _reaper_wake <= deadline:
+            return
+        _reaper_wake = deadline
+        scheduler.modify_job(REAPER_JOB_ID, next_run_time=datetime.fromtimestamp(deadline, timezone.utc))
+
+def reaper_job():
+    global last_reaper_run, _reaper_wake
+    # This run consumes any pending wake-up. Until it records the next one,
+    # wake_reaper_at always reschedules, so a process that skips the run here
+    # or fails below still wakes on time once it holds the lease.
+    with _reaper_lock:
+        _reaper_wake = None
+    if not is_reaper_leader():
+        return
+    last_reaper_run = release_unconfirmed_numbers()
+    app.logger.log(logging.INFO if last_reaper_run["released"] else logging.DEBUG,
+                   "Reaper released %d numbers in %d batches (%.1f ms)",
+                   last_reaper_run["released"], last_reaper_run["batches"], last_reaper_run["duration"] * 1000)
+    if last_reaper_run["reclaimed_blocks"]:
+        app.logger.info("Reaper reclaimed %d expired number blocks", last_reaper_run["reclaimed_blocks"])
+
+    # APScheduler has already queued the next interval run; pull it forward if a deadline is sooner
+    with _reaper_lock:
+        _reaper_wake = time.time() + CHECK_INTERVAL
+    if last_reaper_run["next_deadline"] is not None:
+        wake_reaper_at(last_reaper_run["next_deadline"])
+
+def start_scheduler():
+    global scheduler
+    scheduler = BackgroundScheduler()
+    scheduler.add_job(reaper_lease_job, trigger='interval', seconds=LEASE_TTL / 3, id=REAPER_LEASE,
+                      next_run_time=datetime.now(timezone.utc))
+    scheduler.add_job(reaper_job, trigger='interval', seconds=CHECK_INTERVAL, id=REAPER_JOB_ID)
+    if BLOCK_SIZE:
+        scheduler.add_job(block_allocator.renew, trigger='interval', seconds=BLOCK_LEASE_TTL / 3, id=BLOCK_LEASE_JOB_ID)
+    if BACKUP_INTERVAL:
+        scheduler.add_job(backup_job, trigger='interval', seconds=BACKUP_INTERVAL, id=BACKUP_JOB_ID)
+    if ARCHIVE_AFTER:
+        scheduler.add_job(archive_job, trigger='interval', seconds=ARCHIVE_INTERVAL, id=ARCHIVE_JOB_ID)
+    scheduler.start()
+    return scheduler
+
+def stop_scheduler():
+    """
+    Stop background jobs, return unused block numbers and hand the reaper
+    lease to another process.
+    """
+    global scheduler, _reaper_lease_until
+    if scheduler is None:
+        return
+    scheduler.shutdown(wait=True)
+    scheduler = None
+    block_allocator.return_unused()
+    if is_reaper_leader():
+        _reaper_lease_until = 0.0
+        release_lease(REAPER_LEASE)
 
 @app.route('/edit_model_details/<model_id>', methods=['POST'])
 def edit_model_details(model_id):
@@ -246,24 +1473,1813 @@ def edit_model_details(model_id):
         return jsonify({"error": "model_name and model_notes are required!"}), 400
 
     # Update the data in the database.
-    with sqlite3.connect(DATABASE) as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
+    storage.edit(model_type, int(number), model_name, model_notes)
+
+    # Send a response back to the client.
+    return jsonify({"status": "Successfully updated model details!"})
+
+# ---------------------------------------------------------------
+# Listing
+# ---------------------------------------------------------------
+
+def _parse_timestamp(value):
+    """Normalize an ISO 8601 time to the UTC `YYYY-MM-DD HH:MM:SS` form stored in model_details."""
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    # Times without an offset are taken as UTC
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc)
+    return parsed.strftime("%Y-%m-%d %H:%M:%S")
+
+def list_filters(args):
+    """
+    Read listing filters from query arguments: model_type, status,
+    min_number, max_number, since and until. Returns only the filters
+    given, converted for the storage backend. Raises ValueError on
+    malformed values.
+    """
+    filters = {}
+    for name in ("model_type", "status"):
+        if args.get(name):
+            filters[name] = args[name]
+    for name in ("min_number", "max_number"):
+        if args.get(name):
+            filters[name] = int(args[name])
+    for name in ("since", "until"):
+        if args.get(name):
+            filters[name] = _parse_timestamp(args[name])
+    return filters
+
+@app.route('/list_numbers', methods=['GET'])
+def list_numbers():
+    """
+    Page through model_details in (model_type, model_number) order.
+    Pass the returned `next_cursor` back as `cursor` to get the next page;
+    it is null on the last page.
+    """
+    try:
+        filters = list_filters(request.args)
+        page_size = int(request.args.get("page_size", DEFAULT_PAGE_SIZE))
+        if page_size < 1 or page_size > MAX_PAGE_SIZE:
+            raise ValueError
+        after = None
+        cursor_value = request.args.get("cursor")
+        if cursor_value:
+            # Keyset pagination: continue strictly after the last row returned
+            after_type, after_number = cursor_value.rsplit(":", 1)
+            after = (after_type, int(after_number))
+    except ValueError:
+        return jsonify({"error": f"Invalid filter, cursor or page_size (1-{MAX_PAGE_SIZE})."}), 400
+
+    # Fetch one extra row to learn whether another page exists
+    rows = storage.list_numbers(filters, after, page_size + 1)
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    items = [{
+        "model_type": model_type,
+        "model_number": model_number,
+        "status": status,
+        "model_name": model_name,
+        "model_notes": model_notes,
+        "timestamp": str(timestamp),
+    } for model_type, model_number, status, model_name, model_notes, timestamp in rows]
+    next_cursor = f"{rows[-1][0]}:{rows[-1][1]}" if has_more else None
+    return jsonify({"items": items, "next_cursor": next_cursor}), 200
+
+# ---------------------------------------------------------------
+# Storage backends
+#
+# Routes and background jobs reach the data through `storage`, chosen
+# by STORAGE_BACKEND in config.ini. `sqlite` is the durable engine
+# described throughout this module. `memory` keeps everything in dicts
+# and heaps inside one process: nothing survives a restart and it needs
+# WORKERS = 1, but it runs the core API (allocation, transitions,
+# search, listing and expiry) without touching disk, for tests and
+# benchmarks. Endpoints built on SQLite features answer 501 under it.
+# ---------------------------------------------------------------
+
+class Storage:
+    """The operations a storage backend provides. Numbers are ints; timestamps are `YYYY-MM-DD HH:MM:SS` text."""
+
+    name = None
+
+    def initialize(self):
+        """Prepare the backend for use. Called once per process."""
+
+    def add_model_type(self, model_type, description):
+        """Add a model type. Returns False if it already exists."""
+        raise NotImplementedError
+
+    def list_model_types(self):
+        """(model_type, description) pairs in the order the types were added."""
+        raise NotImplementedError
+
+    def allocate(self, model_type, count):
+        """Pull `count` numbers, lowest released first. Returns them ascending, or None for an unknown type."""
+        raise NotImplementedError
+
+    def transition(self, model_type, number, from_status, to_status):
+        """Move a number from `from_status` to `to_status`. Returns the status it had, or None if it does not exist."""
+        raise NotImplementedError
+
+    def search(self, model_type, number):
+        """(status, model_name, model_notes) for a number, or None."""
+        raise NotImplementedError
+
+    def edit(self, model_type, number, model_name, model_notes):
+        raise NotImplementedError
+
+    def list_numbers(self, filters, after, limit):
+        """
+        Up to `limit` rows of (model_type, model_number, status, model_name,
+        model_notes, timestamp) matching `list_filters`, in (model_type,
+        model_number) order and strictly after the `after` pair if given.
+        """
+        raise NotImplementedError
+
+    def release_expired(self, now):
+        """Release pulled numbers due by `now`. Returns released, batches, reclaimed_blocks and next_deadline."""
+        raise NotImplementedError
+
+    def next_deadline(self):
+        """The earliest release deadline of a pulled number, or None."""
+        raise NotImplementedError
+
+    def model_type_stats(self, model_type=None):
+        """(model_type, description, latest_number, {status: count}) per type, or for one type, by type name."""
+        raise NotImplementedError
+
+    def status_counts(self):
+        """{(model_type, status): count} over every number."""
+        raise NotImplementedError
+
+    def acquire_lease(self, name, holder, expires_at, now):
+        """Grant or renew the lease if it is free, expired or already `holder`'s. Returns the current (holder, expires_at)."""
+        raise NotImplementedError
+
+    def release_lease(self, name, holder):
+        raise NotImplementedError
+
+LIST_FILTER_CLAUSES = {
+    "model_type": "model_type = ?",
+    "status": "status = ?",
+    "min_number": "model_number >= ?",
+    "max_number": "model_number <= ?",
+    "since": "timestamp >= ?",
+    "until": "timestamp < ?",
+}
+
+class SQLiteStorage(Storage):
+    """The `model_numbers.db` engine: pooled connections, write transactions and the helpers above."""
+
+    name = "sqlite"
+
+    def initialize(self):
+        init_db()
+
+    def add_model_type(self, model_type, description):
+        with get_db() as conn:
+            try:
+                conn.execute("INSERT INTO model_numbers (model_type, description) VALUES (?, ?)", (model_type, description))
+            except sqlite3.IntegrityError:
+                return False
+        return True
+
+    def list_model_types(self):
+        with get_db() as conn:
+            return conn.execute("SELECT model_type, description FROM model_numbers").fetchall()
+
+    def allocate(self, model_type, count):
+        return run_write(lambda cursor: allocate_numbers(cursor, model_type, count))
+
+    def transition(self, model_type, number, from_status, to_status):
+        return run_write(lambda cursor: _transition_number(cursor, model_type, number, from_status, to_status))
+
+    def search(self, model_type, number):
+        with get_db() as conn:
+            return conn.execute("""
+                SELECT status, model_name, model_notes FROM model_details WHERE model_type=? AND model_number=?
+                UNION ALL
+                SELECT status, model_name, model_notes FROM model_details_archive WHERE model_type=? AND model_number=?
+                LIMIT 1
+            """, (model_type, number) * 2).fetchone()
+
+    def edit(self, model_type, number, model_name, model_notes):
+        statement = """
             UPDATE model_details
             SET model_name = ?, model_notes = ?
             WHERE model_type = ? AND model_number = ?
-        """, (model_name, model_notes, model_type, int(number)))
-        conn.commit()
+        """
+        params = (model_name, model_notes, model_type, number)
 
-    # Send a response back to the client.
-    return jsonify({"status": "Successfully updated model details!"})
+        def update(cursor):
+            cursor.execute(statement, params)
+            # Archived rows come back to model_details to be changed
+            if not cursor.rowcount and unarchive_numbers(cursor, [(model_type, number)]):
+                cursor.execute(statement, params)
+        run_write(update)
+
+    def list_numbers(self, filters, after, limit):
+        clauses = [LIST_FILTER_CLAUSES[name] for name in filters]
+        params = list(filters.values())
+        if after is not None:
+            if after[0] == filters.get("model_type"):
+                clauses.append("model_number > ?")
+                params.append(after[1])
+            else:
+                clauses.append("(model_type, model_number) > (?, ?)")
+                params.extend(after)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with get_db() as conn:
+            # Each side is read in index order and the two are merged
+            return conn.execute(f"""
+                SELECT model_type, model_number, status, model_name, model_notes, timestamp
+                FROM model_details {where}
+                UNION ALL
+                SELECT model_type, model_number, status, model_name, model_notes, timestamp
+                FROM model_details_archive {where}
+                ORDER BY model_type, model_number
+                LIMIT ?
+            """, params * 2 + [limit]).fetchall()
+
+    def release_expired(self, now):
+        """
+        Expired rows are found through the partial index on `expires_at`
+        and released in batches of REAPER_BATCH_SIZE, each in its own
+        short transaction. Blocks leased by processes that stopped renewing
+        them are reclaimed in the same run.
+        """
+        released = batches = 0
+        with get_db() as conn:
+            with write_transaction(conn) as cursor:
+                cursor.execute("SELECT id, model_type, start_number, end_number FROM number_blocks WHERE expires_at <= ?", (now,))
+                expired_blocks = cursor.fetchall()
+                for block_id, model_type, start_number, end_number in expired_blocks:
+                    _release_block_range(cursor, block_id, model_type, start_number, end_number)
+
+            while True:
+                with write_transaction(conn) as cursor:
+                    cursor.execute("""
+                        SELECT id, model_type, model_number FROM model_details
+                        WHERE status='pulled' AND expires_at <= ?
+                        ORDER BY expires_at LIMIT ?
+                    """, (now, REAPER_BATCH_SIZE))
+                    expired = cursor.fetchall()
+                    if expired:
+                        cursor.executemany("UPDATE model_details SET status='released' WHERE id=? AND status='pulled'",
+                                           [(row[0],) for row in expired])
+                        for _, model_type, model_number in expired:
+                            after_commit(lambda model_type=model_type, model_number=model_number: free_numbers.add(model_type, [model_number]))
+                released += len(expired)
+                batches += 1
+                if len(expired) < REAPER_BATCH_SIZE:
+                    break
+        return {
+            "released": released,
+            "batches": batches,
+            "reclaimed_blocks": len(expired_blocks),
+            "next_deadline": self.next_deadline(),
+        }
+
+    def next_deadline(self):
+        with get_db() as conn:
+            return conn.execute("SELECT MIN(expires_at) FROM model_details WHERE status='pulled'").fetchone()[0]
+
+    def model_type_stats(self, model_type=None):
+        with get_db() as conn:
+            rows = conn.execute(f"""
+                SELECT m.model_type, m.description, m.latest_number, c.status, c.count
+                FROM model_numbers m LEFT JOIN status_counts c ON c.model_type = m.model_type
+                {"WHERE m.model_type = ?" if model_type else ""}
+                ORDER BY m.model_type
+            """, (model_type,) if model_type else ()).fetchall()
+        types = {}
+        for name, description, latest_number, status, count in rows:
+            counts = types.setdefault(name, (name, description, latest_number, {}))[3]
+            if status is not None:
+                counts[status] = count
+        return list(types.values())
+
+    def status_counts(self):
+        with get_db() as conn:
+            rows = conn.execute("SELECT model_type, status, count FROM status_counts").fetchall()
+        return {(model_type, status): count for model_type, status, count in rows}
+
+    def acquire_lease(self, name, holder, expires_at, now):
+        with get_db() as conn, write_transaction(conn) as cursor:
+            cursor.execute("""
+                INSERT INTO service_leases (name, holder, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+                WHERE service_leases.holder = excluded.holder OR service_leases.expires_at < ?
+            """, (name, holder, expires_at, now))
+            cursor.execute("SELECT holder, expires_at FROM service_leases WHERE name=?", (name,))
+            return cursor.fetchone()
+
+    def release_lease(self, name, holder):
+        with get_db() as conn, write_transaction(conn) as cursor:
+            cursor.execute("DELETE FROM service_leases WHERE name=? AND holder=?", (name, holder))
+
+class MemoryStorage(Storage):
+    """
+    Everything in process memory behind one lock. Each type keeps its
+    numbers in a list that only grows upward, so listings page through
+    it with bisect; released numbers wait in per-type min-heaps and
+    pulled ones in one heap ordered by deadline. Heap entries whose
+    number has moved on since are skipped when they come up.
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._types = {}     # model_type -> [description, latest_number]
+        self._rows = {}      # (model_type, number) -> [status, model_name, model_notes, timestamp, expires_at]
+        self._numbers = {}   # model_type -> every number handed out, ascending
+        self._released = {}  # model_type -> heap of released numbers
+        self._deadlines = [] # heap of (expires_at, model_type, number) for pulled numbers
+        self._counts = {}    # (model_type, status) -> count
+        self._leases = {}    # name -> (holder, expires_at)
+
+    def _set_status(self, model_type, number, row, status):
+        self._counts[(model_type, row[0])] -= 1
+        self._counts[(model_type, status)] = self._counts.get((model_type, status), 0) + 1
+        row[0] = status
+        if status == "released":
+            heapq.heappush(self._released.setdefault(model_type, []), number)
+
+    def add_model_type(self, model_type, description):
+        with self._lock:
+            if model_type in self._types:
+                return False
+            self._types[model_type] = [description, 0]
+            self._numbers[model_type] = []
+        return True
+
+    def list_model_types(self):
+        with self._lock:
+            return [(model_type, entry[0]) for model_type, entry in self._types.items()]
+
+    def allocate(self, model_type, count):
+        expires_at = time.time() + RELEASE_TIME
+        timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            entry = self._types.get(model_type)
+            if entry is None:
+                return None
+            numbers = []
+            released = self._released.get(model_type, [])
+            while released and len(numbers) < count:
+                number = heapq.heappop(released)
+                row = self._rows[(model_type, number)]
+                if row[0] == "released":
+                    self._set_status(model_type, number, row, "pulled")
+                    row[3:] = [timestamp, expires_at]
+                    numbers.append(number)
+            fresh = range(entry[1] + 1, entry[1] + 1 + count - len(numbers))
+            for number in fresh:
+                self._rows[(model_type, number)] = ["pulled", None, None, timestamp, expires_at]
+                self._numbers[model_type].append(number)
+            if fresh:
+                entry[1] = fresh[-1]
+                self._counts[(model_type, "pulled")] = self._counts.get((model_type, "pulled"), 0) + len(fresh)
+            numbers.extend(fresh)
+            for number in numbers:
+                heapq.heappush(self._deadlines, (expires_at, model_type, number))
+        notify_write()
+        wake_reaper_at(expires_at)
+        return numbers
+
+    def transition(self, model_type, number, from_status, to_status):
+        with self._lock:
+            row = self._rows.get((model_type, number))
+            if row is None:
+                return None
+            status = row[0]
+            if status == from_status:
+                self._set_status(model_type, number, row, to_status)
+        if status == from_status:
+            notify_write()
+        return status
+
+    def search(self, model_type, number):
+        with self._lock:
+            row = self._rows.get((model_type, number))
+            return tuple(row[:3]) if row else None
+
+    def edit(self, model_type, number, model_name, model_notes):
+        with self._lock:
+            row = self._rows.get((model_type, number))
+            if row is not None:
+                row[1:3] = [model_name, model_notes]
+        notify_write()
+
+    def list_numbers(self, filters, after, limit):
+        low, high = filters.get("min_number"), filters.get("max_number")
+        rows = []
+        with self._lock:
+            if "model_type" in filters:
+                types = [filters["model_type"]] if filters["model_type"] in self._numbers else []
+            else:
+                types = sorted(self._numbers)
+            for model_type in types:
+                if after is not None and model_type < after[0]:
+                    continue
+                numbers = self._numbers[model_type]
+                start = 0
+                if low is not None:
+                    start = bisect.bisect_left(numbers, low)
+                if after is not None and model_type == after[0]:
+                    start = max(start, bisect.bisect_right(numbers, after[1]))
+                end = len(numbers) if high is None else bisect.bisect_right(numbers, high)
+                for number in numbers[start:end]:
+                    status, model_name, model_notes, timestamp, _ = self._rows[(model_type, number)]
+                    if "status" in filters and status != filters["status"]:
+                        continue
+                    if "since" in filters and timestamp < filters["since"] or "until" in filters and timestamp >= filters["until"]:
+                        continue
+                    rows.append((model_type, number, status, model_name, model_notes, timestamp))
+                    if len(rows) == limit:
+                        return rows
+        return rows
+
+    def _pending(self, deadline):
+        expires_at, model_type, number = deadline
+        row = self._rows[(model_type, number)]
+        return row[0] == "pulled" and row[4] == expires_at
+
+    def release_expired(self, now):
+        released = 0
+        with self._lock:
+            while self._deadlines and self._deadlines[0][0] <= now:
+                deadline = heapq.heappop(self._deadlines)
+                if self._pending(deadline):
+                    _, model_type, number = deadline
+                    self._set_status(model_type, number, self._rows[(model_type, number)], "released")
+                    released += 1
+        if released:
+            notify_write()
+        return {"released": released, "batches": 1, "reclaimed_blocks": 0, "next_deadline": self.next_deadline()}
+
+    def next_deadline(self):
+        with self._lock:
+            while self._deadlines and not self._pending(self._deadlines[0]):
+                heapq.heappop(self._deadlines)
+            return self._deadlines[0][0] if self._deadlines else None
+
+    def model_type_stats(self, model_type=None):
+        with self._lock:
+            names = sorted(self._types) if model_type is None else [model_type] if model_type in self._types else []
+            return [(name, self._types[name][0], self._types[name][1],
+                     {status: self._counts.get((name, status), 0) for status in STATUSES}) for name in names]
+
+    def status_counts(self):
+        with self._lock:
+            return dict(self._counts)
+
+    def acquire_lease(self, name, holder, expires_at, now):
+        with self._lock:
+            current = self._leases.get(name)
+            if current is None or current[0] == holder or current[1] < now:
+                current = self._leases[name] = (holder, expires_at)
+            return current
+
+    def release_lease(self, name, holder):
+        with self._lock:
+            if self._leases.get(name, (None,))[0] == holder:
+                del self._leases[name]
+
+STORAGE_BACKENDS = {
+    "sqlite": SQLiteStorage,
+    "memory": MemoryStorage,
+}
+
+def create_storage(name):
+    if name not in STORAGE_BACKENDS:
+        raise ValueError(f"STORAGE_BACKEND must be one of {', '.join(STORAGE_BACKENDS)}, not {name!r}.")
+    return STORAGE_BACKENDS[name]()
+
+storage = create_storage(STORAGE_BACKEND)
+
+def requires_sqlite(view):
+    """Answer 501 from endpoints built on SQLite features when another backend is configured."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not isinstance(storage, SQLiteStorage):
+            return jsonify({"error": f"{request.path} is not available with the {storage.name} storage backend."}), 501
+        return view(*args, **kwargs)
+    return wrapper
+
+# ---------------------------------------------------------------
+# Full-text search
+# ---------------------------------------------------------------
+
+def fts_query(text):
+    """Turn free text into an FTS5 query: every word must match, as a prefix."""
+    terms = text.split()
+    return " ".join('"' + term.replace('"', '""') + '"*' for term in terms)
+
+@app.route('/find', methods=['GET'])
+@requires_sqlite
+def find():
+    """
+    Ranked text search over model names and notes, optionally filtered by
+    model_type and status. Results are paged with `page` (from 1) and
+    `page_size`; `next_page` is null on the last page.
+    """
+    query = fts_query(request.args.get("q", ""))
+    if not query:
+        return jsonify({"error": "A search query is required, e.g. /find?q=widget"}), 400
+    try:
+        page = int(request.args.get("page", 1))
+        page_size = int(request.args.get("page_size", DEFAULT_PAGE_SIZE))
+        if page < 1 or page_size < 1 or page_size > MAX_PAGE_SIZE:
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": f"page must be 1 or more and page_size between 1 and {MAX_PAGE_SIZE}."}), 400
+
+    clauses = []
+    params = [query]
+    for column in ("model_type", "status"):
+        if request.args.get(column):
+            clauses.append(f" AND d.{column} = ?")
+            params.append(request.args[column])
+
+    # Names weigh twice as much as notes in the ranking. Each table has its
+    # own index, and bm25 scores from different indexes are not comparable,
+    # so live numbers are ranked first and archived ones after them.
+    selects = [f"""
+        SELECT d.model_type, d.model_number, d.status, d.model_name, d.model_notes,
+               snippet({index}, -1, '[', ']', '...', 12),
+               bm25({index}, 2.0, 1.0) AS rank, {source} AS source
+        FROM {index}
+        JOIN {table} d ON d.id = {index}.rowid
+        WHERE {index} MATCH ?{''.join(clauses)}
+    """ for source, (table, index) in enumerate((("model_details", "model_details_fts"), ("model_details_archive", "model_details_archive_fts")))]
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(" UNION ALL ".join(selects) + " ORDER BY source, rank LIMIT ? OFFSET ?",
+                       params * 2 + [page_size + 1, (page - 1) * page_size])
+        rows = cursor.fetchall()
+
+    results = [{
+        "model_type": model_type,
+        "model_number": model_number,
+        "status": status,
+        "model_name": model_name,
+        "model_notes": model_notes,
+        "snippet": snippet,
+        "score": round(-rank, 4),
+    } for model_type, model_number, status, model_name, model_notes, snippet, rank, _ in rows[:page_size]]
+    return jsonify({"results": results, "next_page": page + 1 if len(rows) > page_size else None}), 200
+
+# ---------------------------------------------------------------
+# Status counters
+#
+# `status_counts` holds the number of rows per model type and status.
+# Triggers on model_details and model_details_archive keep it in step
+# within the same transaction as every insert, transition and delete,
+# so /stats never scans either table. `verify_status_counts` / `rebuild_status_counts` check
+# and repair drift, e.g. after editing the database by hand.
+# ---------------------------------------------------------------
+
+STATUSES = ("pulled", "confirmed", "released")
+
+COUNT_ALL_NUMBERS = """
+    SELECT model_type, status, COUNT(*) FROM (
+        SELECT model_type, status FROM model_details
+        UNION ALL
+        SELECT model_type, status FROM model_details_archive
+    ) GROUP BY model_type, status
+"""
+
+def rebuild_status_counts(cursor):
+    cursor.execute("DELETE FROM status_counts")
+    cursor.execute("INSERT INTO status_counts (model_type, status, count) " + COUNT_ALL_NUMBERS)
+
+def verify_status_counts(cursor):
+    """Counters that disagree with a full count of both detail tables, as (model_type, status, counted, actual)."""
+    cursor.execute(COUNT_ALL_NUMBERS)
+    actual = {(model_type, status): count for model_type, status, count in cursor.fetchall()}
+    cursor.execute("SELECT model_type, status, count FROM status_counts")
+    counted = {(model_type, status): count for model_type, status, count in cursor.fetchall()}
+    return [(model_type, status, counted.get((model_type, status), 0), actual.get((model_type, status), 0))
+            for model_type, status in sorted(set(actual) | set(counted))
+            if counted.get((model_type, status), 0) != actual.get((model_type, status), 0)]
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """Per-type counts by status and the numbers still available, optionally for one `model_type`."""
+    model_type = request.args.get("model_type")
+    rows = storage.model_type_stats(model_type)
+    if model_type and not rows:
+        return jsonify({"error": f"Model type {model_type} does not exist."}), 404
+
+    types = {}
+    for name, description, latest_number, counts in rows:
+        types[name] = {"type": name, "description": description, "latest_number": latest_number,
+                       **{key: counts.get(key, 0) for key in STATUSES}}
+    for entry in types.values():
+        entry["total"] = sum(entry[key] for key in STATUSES)
+        # Released numbers are reused; the rest of the space has never been handed out
+        entry["available"] = entry["released"] + max(0, NUMBER_SPACE - entry["latest_number"])
+    return jsonify({"model_types": list(types.values()), "number_space": NUMBER_SPACE}), 200
+
+@app.route('/verify_stats', methods=['GET'])
+@requires_sqlite
+def verify_stats():
+    with get_db() as conn:
+        drift = verify_status_counts(conn.cursor())
+    return jsonify({
+        "consistent": not drift,
+        "drift": [{"model_type": model_type, "status": status, "counted": counted, "actual": actual}
+                  for model_type, status, counted, actual in drift],
+    }), 200
+
+@app.route('/rebuild_stats', methods=['POST'])
+@requires_sqlite
+def rebuild_stats():
+    with get_db() as conn, write_transaction(conn) as cursor:
+        rebuild_status_counts(cursor)
+    return jsonify({"status": "Status counters rebuilt from the database."}), 200
+
+# ---------------------------------------------------------------
+# Change feed
+#
+# The `events` table is an append-only log of pulls, status changes and
+# edits, filled by triggers on model_details. /events serves it after a
+# given id, either as JSON (optionally long-polling for new events) or
+# as a server-sent event stream. Commits in this process wake waiting
+# readers at once; changes made by other processes are picked up every
+# EVENTS_POLL_INTERVAL seconds.
+# ---------------------------------------------------------------
+
+_events_changed = threading.Condition()
+_events_generation = 0
+
+def signal_events():
+    """Wake readers waiting in `wait_for_events`."""
+    global _events_generation
+    with _events_changed:
+        _events_generation += 1
+        _events_changed.notify_all()
+
+def read_events(since, model_type=None, limit=DEFAULT_PAGE_SIZE):
+    clauses, params = ["id > ?"], [since]
+    if model_type:
+        clauses.append("model_type = ?")
+        params.append(model_type)
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT id, model_type, model_number, event, previous_status, created_at
+            FROM events WHERE {' AND '.join(clauses)}
+            ORDER BY id LIMIT ?
+        """, params + [limit])
+        rows = cursor.fetchall()
+    return [{
+        "id": event_id,
+        "model_type": model_type,
+        "model_number": model_number,
+        "event": event,
+        "previous_status": previous_status,
+        "timestamp": created_at,
+    } for event_id, model_type, model_number, event, previous_status, created_at in rows]
+
+def latest_event_id():
+    with get_db() as conn:
+        return conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+
+def wait_for_events(since, model_type=None, limit=DEFAULT_PAGE_SIZE, timeout=0):
+    """Return events after `since`, waiting up to `timeout` seconds for the first one."""
+    deadline = time.monotonic() + timeout
+    while True:
+        generation = _events_generation
+        found = read_events(since, model_type, limit)
+        remaining = deadline - time.monotonic()
+        if found or remaining <= 0:
+            return found
+        with _events_changed:
+            if generation == _events_generation:
+                _events_changed.wait(min(remaining, EVENTS_POLL_INTERVAL))
+
+def _event_stream(since, model_type):
+    yield "retry: 3000\n\n"
+    while True:
+        found = wait_for_events(since, model_type, MAX_PAGE_SIZE, EVENTS_HEARTBEAT)
+        if not found:
+            yield ": keep-alive\n\n"
+            continue
+        for event in found:
+            yield f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event)}\n\n"
+        since = found[-1]["id"]
+
+@app.route('/events', methods=['GET'])
+@requires_sqlite
+def events():
+    """
+    Events after `since` (or the Last-Event-ID header), oldest first,
+    optionally for one `model_type`. `since=latest` skips to new events. Clients that accept
+    text/event-stream get a live stream. Others get up to `limit` events
+    as JSON, waiting up to `wait` seconds if there are none yet; resume
+    from the returned `last_id`.
+    """
+    try:
+        since = request.headers.get("Last-Event-ID") or request.args.get("since", "0")
+        since = latest_event_id() if since == "latest" else int(since)
+        limit = int(request.args.get("limit", DEFAULT_PAGE_SIZE))
+        wait = float(request.args.get("wait", 0))
+        if since < 0 or not 1 <= limit <= MAX_PAGE_SIZE or not 0 <= wait <= EVENTS_MAX_WAIT:
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": f"since must be an event id, limit 1-{MAX_PAGE_SIZE} and wait 0-{EVENTS_MAX_WAIT:g} seconds."}), 400
+    model_type = request.args.get("model_type")
+
+    if request.accept_mimetypes.best == "text/event-stream":
+        return Response(stream_with_context(_event_stream(since, model_type)), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    found = wait_for_events(since, model_type, limit, wait)
+    return jsonify({"events": found, "last_id": found[-1]["id"] if found else since}), 200
+
+# ---------------------------------------------------------------
+# Export / import
+#
+# Both tables travel in one stream. Every record carries a `table` field
+# naming where it belongs; CSV uses the union of both tables' columns.
+# Archived numbers are exported as ordinary model_details rows.
+# ---------------------------------------------------------------
+
+EXPORT_COLUMNS = {
+    "model_numbers": ("model_type", "description", "latest_number", "timestamp"),
+    "model_details": ("model_type", "model_number", "model_name", "model_notes", "status", "timestamp", "expires_at"),
+}
+CSV_COLUMNS = ("table", "model_type", "description", "latest_number", "model_number",
+               "model_name", "model_notes", "status", "timestamp", "expires_at")
+
+def _export_query(table, as_json):
+    """SELECT for one table, producing either NDJSON lines (built by SQLite) or CSV_COLUMNS-ordered rows."""
+    columns = EXPORT_COLUMNS[table]
+    source, order = table, "model_type"
+    if table == "model_details":
+        listed = ", ".join(columns)
+        source = f"(SELECT {listed} FROM model_details UNION ALL SELECT {listed} FROM model_details_archive)"
+        order = "model_type, model_number"
+    if as_json:
+        fields = ", ".join(f"'{column}', {column}" for column in columns)
+        return f"SELECT json_object('table', '{table}', {fields}) FROM {source} ORDER BY {order}"
+    fields = ", ".join(column if column in columns else "NULL" for column in CSV_COLUMNS[1:])
+    return f"SELECT '{table}', {fields} FROM {source} ORDER BY {order}"
+
+def export_rows(as_json):
+    """Yield batches of rows from both tables, read from one consistent snapshot."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        # A read transaction pins the WAL snapshot until the export finishes
+        cursor.execute("BEGIN")
+        for table in EXPORT_COLUMNS:
+            cursor.execute(_export_query(table, as_json))
+            while True:
+                rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+                if not rows:
+                    break
+                yield rows
+
+def _ndjson_chunks():
+    for rows in export_rows(as_json=True):
+        yield "\n".join(row[0] for row in rows) + "\n"
+
+def _csv_chunks():
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for rows in export_rows(as_json=False):
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+@app.route('/export', methods=['GET'])
+@requires_sqlite
+def export_registry():
+    """Stream the whole registry as NDJSON (default) or CSV in constant memory."""
+    export_format = request.args.get("format", "ndjson")
+    if export_format == "ndjson":
+        return Response(_ndjson_chunks(), mimetype="application/x-ndjson")
+    if export_format == "csv":
+        return Response(_csv_chunks(), mimetype="text/csv")
+    return jsonify({"error": "format must be ndjson or csv."}), 400
+
+def _read_import_records(stream, import_format):
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    if import_format == "csv":
+        return csv.DictReader(text)
+    return (json.loads(line) for line in text if line.strip())
+
+def import_records(records):
+    """
+    Upsert exported records in chunks of IMPORT_BATCH_SIZE, each chunk in
+    its own transaction, then raise `latest_number` to cover every
+    imported number. Imported rows replace existing rows with the same key.
+    Returns the number of rows written to each table.
+
+    A bad record raises ValueError. Chunks committed before it are kept,
+    and `latest_number` and the free-number index are still brought up
+    to date for them, so later pulls never collide with imported rows.
+
+    Empty CSV fields become NULL; numeric text is converted by the
+    columns' INTEGER/REAL affinity, so only model_number is checked here.
+    """
+    counts = {"model_numbers": 0, "model_details": 0}
+    batches = {"model_numbers": [], "model_details": []}
+    now = time.time()
+
+    def flush(conn):
+        with write_transaction(conn) as cursor:
+            if batches["model_numbers"]:
+                after_commit(lambda: read_cache.invalidate("model_types"))
+            cursor.executemany("""
+                INSERT INTO model_numbers (model_type, description, latest_number, timestamp)
+                VALUES (?, ?, COALESCE(?, 0), COALESCE(?, CURRENT_TIMESTAMP))
+                ON CONFLICT (model_type) DO UPDATE SET
+                    description = excluded.description,
+                    latest_number = MAX(latest_number, excluded.latest_number)
+            """, batches["model_numbers"])
+            # An imported row replaces an archived one with the same key
+            cursor.executemany("DELETE FROM model_details_archive WHERE model_type = ? AND model_number = ?",
+                               [row[:2] for row in batches["model_details"]])
+            cursor.executemany("""
+                INSERT INTO model_details (model_type, model_number, model_name, model_notes, status, timestamp, expires_at)
+                VALUES (?, ?, ?, ?, COALESCE(?, 'pulled'), COALESCE(?, CURRENT_TIMESTAMP), ?)
+                ON CONFLICT (model_type, model_number) DO UPDATE SET
+                    model_name = excluded.model_name,
+                    model_notes = excluded.model_notes,
+                    status = excluded.status,
+                    timestamp = excluded.timestamp,
+                    expires_at = excluded.expires_at
+            """, batches["model_details"])
+        for table, batch in batches.items():
+            counts[table] += len(batch)
+            batch.clear()
+
+    with get_db() as conn:
+        try:
+            for line_number, record in enumerate(records, 1):
+                if not isinstance(record, dict):
+                    raise ValueError(f"Record {line_number}: expected a JSON object.")
+                table = record.get("table")
+                if table not in EXPORT_COLUMNS:
+                    raise ValueError(f"Record {line_number}: unknown table {table!r}.")
+                row = [None if value == "" else value for value in map(record.get, EXPORT_COLUMNS[table])]
+                if row[0] is None:
+                    raise ValueError(f"Record {line_number}: model_type is required.")
+                if table == "model_details":
+                    if row[1] is None:
+                        raise ValueError(f"Record {line_number}: model_number is required.")
+                    row[1] = int(row[1])
+                    if row[4] is not None and row[4] not in STATUSES:
+                        raise ValueError(f"Record {line_number}: status must be one of {', '.join(STATUSES)}.")
+                if table == "model_details" and (row[4] or "pulled") == "pulled" and row[6] is None:
+                    row[6] = now + RELEASE_TIME  # Give imported pulled numbers a fresh deadline
+                batches[table].append(row)
+                if len(batches[table]) >= IMPORT_BATCH_SIZE:
+                    flush(conn)
+            flush(conn)
+        finally:
+            # Also after a failure, for the chunks that were already committed
+            with write_transaction(conn) as cursor:
+                cursor.execute("INSERT OR IGNORE INTO model_numbers (model_type) SELECT DISTINCT model_type FROM model_details")
+                if cursor.rowcount:
+                    after_commit(lambda: read_cache.invalidate("model_types"))
+                cursor.execute("""
+                    UPDATE model_numbers SET latest_number = MAX(latest_number, COALESCE(
+                        (SELECT MAX(model_number) FROM model_details d WHERE d.model_type = model_numbers.model_type), 0))
+                """)
+                free_numbers.rebuild(cursor)
+                # Imported pulled numbers may already be due
+                cursor.execute("SELECT MIN(expires_at) FROM model_details WHERE status='pulled'")
+                next_deadline = cursor.fetchone()[0]
+                if next_deadline is not None:
+                    after_commit(lambda: wake_reaper_at(next_deadline))
+    return counts
+
+@app.route('/import', methods=['POST'])
+@requires_sqlite
+def import_registry():
+    """Load an NDJSON (default) or CSV export streamed in the request body."""
+    import_format = request.args.get("format")
+    if import_format is None:
+        import_format = "csv" if request.mimetype == "text/csv" else "ndjson"
+    if import_format not in ("ndjson", "csv"):
+        return jsonify({"error": "format must be ndjson or csv."}), 400
+
+    started = time.perf_counter()
+    try:
+        counts = import_records(_read_import_records(request.stream, import_format))
+    except (ValueError, KeyError, TypeError, sqlite3.IntegrityError) as error:
+        return jsonify({"error": f"Import failed: {error}"}), 400
+    return jsonify({"status": "imported", "rows": counts,
+                    "seconds": round(time.perf_counter() - started, 3)}), 200
+
+# ---------------------------------------------------------------
+# Bulk endpoints
+#
+# Each takes a JSON list of items (or {"items": [...]}) and applies them
+# in one transaction. Current states are checked set-wise by joining a
+# temp table of the requested numbers against model_details, and every
+# item gets its own result in request order. Requested numbers that are
+# archived are moved back to model_details first when the operation will
+# change them: always for edits, and for transitions only when the
+# archived status is the one the transition starts from.
+# ---------------------------------------------------------------
+
+BULK_TRANSITIONS = {
+    # action: (required status, new status)
+    "confirm": ("pulled", "confirmed"),
+    "release": ("confirmed", "released"),
+}
+
+def _bulk_request_items():
+    data = request.get_json(silent=True)
+    items = data.get("items") if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        raise ValueError("Request body must be a non-empty JSON list of items.")
+    if len(items) > MAX_BULK_ITEMS:
+        raise ValueError(f"At most {MAX_BULK_ITEMS} items are allowed per request.")
+    return items
+
+def _parse_bulk_items(items, results):
+    """Validate items, recording errors in `results`. Returns (index, model_type, number, item) for valid ones."""
+    valid = []
+    seen = set()
+    for index, item in enumerate(items):
+        try:
+            model_type = item["model_type"]
+            number = int(item["number"])
+        except (KeyError, TypeError, ValueError):
+            results[index] = {"error": "Each item needs a model_type and an integer number.", "code": 400}
+            continue
+        if (model_type, number) in seen:
+            results[index] = {"model_type": model_type, "number": number,
+                              "error": f"Model {model_type}-{item['number']} appears more than once in the request.", "code": 400}
+            continue
+        seen.add((model_type, number))
+        valid.append((index, model_type, number, item))
+    return valid
+
+def _current_statuses(cursor, valid, unarchive_status=None):
+    """
+    Return {index: (row id, status)} for the requested numbers, None where
+    missing. Archived numbers are moved back to model_details when their
+    status is `unarchive_status` (any status when it is None); the rest keep
+    a row id of None.
+    """
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS bulk_items (idx INTEGER PRIMARY KEY, model_type TEXT, model_number INTEGER)")
+    cursor.execute("DELETE FROM temp.bulk_items")
+    cursor.executemany("INSERT INTO temp.bulk_items (idx, model_type, model_number) VALUES (?, ?, ?)",
+                       [(index, model_type, number) for index, model_type, number, _ in valid])
+    cursor.execute("""
+        SELECT a.model_type, a.model_number
+        FROM temp.bulk_items b
+        JOIN model_details_archive a ON a.model_type = b.model_type AND a.model_number = b.model_number
+        WHERE ? IS NULL OR a.status = ?
+    """, (unarchive_status, unarchive_status))
+    unarchive_numbers(cursor, cursor.fetchall())
+    cursor.execute("""
+        SELECT b.idx, d.id, COALESCE(d.status, a.status)
+        FROM temp.bulk_items b
+        LEFT JOIN model_details d ON d.model_type = b.model_type AND d.model_number = b.model_number
+        LEFT JOIN model_details_archive a ON a.model_type = b.model_type AND a.model_number = b.model_number
+    """)
+    return {index: (row_id, status) if status is not None else None for index, row_id, status in cursor.fetchall()}
+
+def _bulk_response(results):
+    failed = sum(1 for result in results if "error" in result)
+    return jsonify({"results": results, "succeeded": len(results) - failed, "failed": failed}), 200
+
+def _bulk_transition(action):
+    required, new_status = BULK_TRANSITIONS[action]
+    try:
+        items = _bulk_request_items()
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+
+    results = [None] * len(items)
+    valid = _parse_bulk_items(items, results)
+    with get_db() as conn, write_transaction(conn) as cursor:
+        current = _current_statuses(cursor, valid, unarchive_status=required)
+        for index, model_type, number, item in valid:
+            label = f"{model_type}-{item['number']}"
+            result = {"model_type": model_type, "number": number}
+            if current[index] is None:
+                result.update(error=f"Model {label} does not exist.", code=404)
+            elif current[index][1] == required:
+                result["status"] = new_status
+            elif current[index][1] == new_status:
+                result.update(error=f"Model {label} is already {new_status}.", code=400)
+            else:
+                result.update(error=f"Model {label} cannot be {new_status} in its current state.", code=400)
+            results[index] = result
+
+        changed = [(model_type, number) for index, model_type, number, _ in valid if "status" in results[index]]
+        cursor.execute("""
+            UPDATE model_details SET status = ?
+            WHERE id IN (
+                SELECT d.id FROM temp.bulk_items b
+                JOIN model_details d ON d.model_type = b.model_type AND d.model_number = b.model_number
+                WHERE d.status = ?
+            )
+        """, (new_status, required))
+        if new_status == "released":
+            for model_type, number in changed:
+                after_commit(lambda model_type=model_type, number=number: free_numbers.add(model_type, [number]))
+    return _bulk_response(results)
+
+@app.route('/bulk_confirm', methods=['POST'])
+@requires_sqlite
+def bulk_confirm():
+    return _bulk_transition("confirm")
+
+@app.route('/bulk_release', methods=['POST'])
+@requires_sqlite
+def bulk_release():
+    return _bulk_transition("release")
+
+@app.route('/bulk_edit_model_details', methods=['POST'])
+@requires_sqlite
+def bulk_edit_model_details():
+    try:
+        items = _bulk_request_items()
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+
+    results = [None] * len(items)
+    valid = []
+    for entry in _parse_bulk_items(items, results):
+        index, model_type, number, item = entry
+        if not item.get("model_name") or not item.get("model_notes"):
+            results[index] = {"model_type": model_type, "number": number,
+                              "error": "model_name and model_notes are required!", "code": 400}
+        else:
+            valid.append(entry)
+
+    with get_db() as conn, write_transaction(conn) as cursor:
+        current = _current_statuses(cursor, valid)
+        updates = []
+        for index, model_type, number, item in valid:
+            if current[index] is None:
+                results[index] = {"model_type": model_type, "number": number,
+                                  "error": f"Model {model_type}-{item['number']} does not exist.", "code": 404}
+            else:
+                results[index] = {"model_type": model_type, "number": number, "status": "updated"}
+                updates.append((item["model_name"], item["model_notes"], current[index][0]))
+        cursor.executemany("UPDATE model_details SET model_name = ?, model_notes = ? WHERE id = ?", updates)
+    return _bulk_response(results)
+
+
+@app.route('/verify_free_numbers', methods=['GET'])
+@requires_sqlite
+def verify_free_numbers():
+    with get_db() as conn:
+        differences = free_numbers.verify(conn.cursor())
+    consistent = not differences["missing"] and not differences["stale"]
+    return jsonify({
+        "consistent": consistent,
+        "missing": [f"{model_type}-{number:04}" for model_type, number in differences["missing"]],
+        "stale": [f"{model_type}-{number:04}" for model_type, number in differences["stale"]],
+    }), 200
+
+@app.route('/rebuild_free_numbers', methods=['POST'])
+@requires_sqlite
+def rebuild_free_numbers():
+    # Hold the write lock so no pull or release interleaves with the reload
+    with get_db() as conn, write_transaction(conn) as cursor:
+        free_numbers.rebuild(cursor)
+    return jsonify({"status": "Free-number index rebuilt from the database."}), 200
+
+
+# ---------------------------------------------------------------
+# Backups
+#
+# Snapshots are taken while the service runs, with SQLite's online
+# backup API: BACKUP_STEP_PAGES pages per step and a BACKUP_STEP_PAUSE
+# pause between steps, so the copy never holds a lock for long. A write
+# from another connection restarts the copy; after BACKUP_MAX_RESTARTS
+# restarts the rest is copied in one step, which under WAL reads a
+# single snapshot without blocking writers. Each snapshot is gzipped
+# into BACKUP_DIR, and only the newest BACKUP_KEEP are kept.
+#
+# Backups run on demand (POST /backup or `model_numbering_backup.py
+# backup`) and every BACKUP_INTERVAL seconds on the reaper lease holder.
+# `verify_backup` and `restore_backup` back the CLI.
+# ---------------------------------------------------------------
+
+BACKUP_JOB_ID = "backup_database"
+
+class BackupInProgress(RuntimeError):
+    pass
+
+class _TooManyRestarts(Exception):
+    pass
+
+_backup_lock = threading.Lock()
+
+def backup_files():
+    """Snapshots of the current DATABASE in BACKUP_DIR, oldest first."""
+    stem = os.path.splitext(os.path.basename(DATABASE))[0]
+    return sorted(glob.glob(os.path.join(BACKUP_DIR, f"{stem}-*.db.gz")))
+
+def copy_database(destination):
+    """Copy DATABASE into the SQLite file `destination` step by step. Returns pages, steps and restarts."""
+    progress_stats = {"pages": 0, "steps": 0, "restarts": 0}
+    last_remaining = None
+
+    def progress(status, remaining, total):
+        nonlocal last_remaining
+        before = total if last_remaining is None else last_remaining
+        last_remaining = remaining
+        progress_stats["steps"] += 1
+        if remaining <= before:
+            progress_stats["pages"] += before - remaining
+        else:
+            # Another connection wrote to the database and SQLite started the copy over
+            progress_stats["pages"] += total - remaining
+            progress_stats["restarts"] += 1
+            if progress_stats["restarts"] >= BACKUP_MAX_RESTARTS:
+                raise _TooManyRestarts
+        if remaining:
+            time.sleep(BACKUP_STEP_PAUSE)
+
+    source = sqlite3.connect(DATABASE, timeout=DB_TIMEOUT)
+    target = sqlite3.connect(destination)
+    try:
+        try:
+            source.backup(target, pages=BACKUP_STEP_PAGES, progress=progress)
+        except _TooManyRestarts:
+            source.backup(target)
+            progress_stats["steps"] += 1
+            progress_stats["pages"] += source.execute("PRAGMA page_count").fetchone()[0]
+    finally:
+        target.close()
+        source.close()
+    return progress_stats
+
+def run_backup():
+    """
+    Take a compressed snapshot of DATABASE and prune old ones. Returns a
+    summary of the run. Raises BackupInProgress if a backup is already
+    running in this process.
+    """
+    if not _backup_lock.acquire(blocking=False):
+        raise BackupInProgress("A backup is already running.")
+    started = time.perf_counter()
+    try:
+        os.makedirs(BACKUP_DIR, exist_ok=True)
+        stem = os.path.splitext(os.path.basename(DATABASE))[0]
+        path = os.path.join(BACKUP_DIR, f"{stem}-{datetime.utcnow():%Y%m%dT%H%M%S%fZ}.db.gz")
+        copy_path = path[:-len(".gz")] + ".partial"
+        try:
+            summary = copy_database(copy_path)
+            with open(copy_path, "rb") as copy_file, gzip.open(path + ".partial", "wb") as snapshot:
+                shutil.copyfileobj(copy_file, snapshot)
+            summary["bytes"] = os.path.getsize(copy_path)
+            # Only complete snapshots ever carry the final name
+            os.replace(path + ".partial", path)
+        finally:
+            for leftover in (copy_path, path + ".partial"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+        snapshots = backup_files()
+        removed = snapshots[:-BACKUP_KEEP] if BACKUP_KEEP > 0 else []
+        for old in removed:
+            os.remove(old)
+    except Exception:
+        BACKUP_RUNS.inc("failure")
+        raise
+    finally:
+        _backup_lock.release()
+
+    summary.update(file=path, compressed_bytes=os.path.getsize(path), removed=removed,
+                   duration=time.perf_counter() - started)
+    BACKUP_DURATION.observe(summary["duration"])
+    BACKUP_PAGES.inc(amount=summary["pages"])
+    BACKUP_RUNS.inc("success")
+    BACKUP_LAST_SUCCESS.set(value=time.time())
+    return summary
+
+def backup_job():
+    if not is_reaper_leader() or not isinstance(storage, SQLiteStorage):
+        return
+    try:
+        summary = run_backup()
+    except BackupInProgress:
+        return
+    app.logger.info("Backed up %d pages to %s in %.1f s", summary["pages"], summary["file"], summary["duration"])
+
+@contextmanager
+def _unpacked(path):
+    """Decompress a snapshot into a temporary SQLite file for the duration of the block."""
+    fd, unpacked = tempfile.mkstemp(suffix=".db", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "wb") as unpacked_file, gzip.open(path, "rb") as snapshot:
+            shutil.copyfileobj(snapshot, unpacked_file)
+        yield unpacked
+    finally:
+        os.remove(unpacked)
+
+def verify_backup(path):
+    """
+    Check that a snapshot decompresses and passes SQLite's integrity
+    check. Returns {"ok": bool, ...} with what was found.
+    """
+    try:
+        with _unpacked(path) as unpacked:
+            conn = sqlite3.connect(unpacked)
+            try:
+                integrity = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+                result = {
+                    "ok": integrity == ["ok"],
+                    "integrity": integrity,
+                    "schema_version": schema_version(conn.cursor()),
+                    "model_types": conn.execute("SELECT COUNT(*) FROM model_numbers").fetchone()[0],
+                    "numbers": conn.execute("SELECT COUNT(*) FROM model_details").fetchone()[0],
+                }
+            finally:
+                conn.close()
+    except (OSError, EOFError, zlib.error, sqlite3.DatabaseError) as error:
+        return {"ok": False, "error": str(error)}
+    return result
+
+def restore_backup(path, database=None):
+    """
+    Replace `database` (DATABASE by default) with a verified snapshot.
+    The service must be stopped. The current file is kept as
+    `<database>.pre-restore`. Returns the verification result.
+    """
+    database = database or DATABASE
+    verified = verify_backup(path)
+    if not verified["ok"]:
+        raise ValueError(f"{path} failed verification: {verified.get('error') or verified['integrity']}")
+    restoring = database + ".restoring"
+    with open(restoring, "wb") as restored, gzip.open(path, "rb") as snapshot:
+        shutil.copyfileobj(snapshot, restored)
+    if os.path.exists(database):
+        # Fold any committed WAL frames into the file being set aside
+        conn = sqlite3.connect(database)
+        try:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        finally:
+            conn.close()
+        os.replace(database, database + ".pre-restore")
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(database + suffix):
+            os.remove(database + suffix)
+    os.replace(restoring, database)
+    return verified
+
+@app.route('/backup', methods=['POST'])
+@requires_sqlite
+def backup():
+    try:
+        summary = run_backup()
+    except BackupInProgress as error:
+        return jsonify({"error": str(error)}), 409
+    summary["duration"] = round(summary["duration"], 3)
+    return jsonify(summary), 200
+
+@app.route('/backups', methods=['GET'])
+@requires_sqlite
+def list_backups():
+    return jsonify({"backups": [{"file": path, "bytes": os.path.getsize(path)} for path in reversed(backup_files())]}), 200
+
+# ---------------------------------------------------------------
+# Archiving
+#
+# Confirmed numbers pulled more than ARCHIVE_AFTER seconds ago are moved
+# from model_details to model_details_archive, in batches of
+# ARCHIVE_BATCH_SIZE with one transaction each, every ARCHIVE_INTERVAL
+# seconds on the reaper lease holder. Allocation, the reaper and the
+# change feed only ever touch recent numbers, so their indexes stay
+# small. Both tables live in the same file so the FTS and status count
+# triggers keep working; reads (search, listings, /find, /stats and
+# export) cover both. A number that is released, edited or imported
+# again is moved back to model_details first.
+# ---------------------------------------------------------------
+
+ARCHIVE_JOB_ID = "archive_confirmed_numbers"
+
+def unarchive_numbers(cursor, keys):
+    """Move archived (model_type, model_number) rows back to model_details. Returns how many were moved."""
+    keys = list(keys)
+    if not keys:
+        return 0
+    cursor.executemany("""
+        INSERT INTO model_details (model_type, model_number, model_name, model_notes, status, timestamp, expires_at)
+        SELECT model_type, model_number, model_name, model_notes, status, timestamp, expires_at
+        FROM model_details_archive WHERE model_type = ? AND model_number = ?
+    """, keys)
+    moved = cursor.rowcount
+    cursor.executemany("DELETE FROM model_details_archive WHERE model_type = ? AND model_number = ?", keys)
+    return moved
+
+def archive_confirmed_numbers(older_than=None, now=None):
+    """
+    Move confirmed numbers pulled more than `older_than` seconds
+    (ARCHIVE_AFTER by default) before `now` to the archive table.
+    Returns a summary of the run.
+    """
+    started = time.perf_counter()
+    now = time.time() if now is None else now
+    older_than = ARCHIVE_AFTER if older_than is None else older_than
+    # Matches the text CURRENT_TIMESTAMP stores in model_details.timestamp
+    cutoff = datetime.fromtimestamp(now - older_than, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    archived = batches = 0
+    with get_db() as conn:
+        while True:
+            with write_transaction(conn) as cursor:
+                cursor.execute("""
+                    SELECT id FROM model_details
+                    WHERE status='confirmed' AND timestamp < ?
+                    ORDER BY timestamp LIMIT ?
+                """, (cutoff, ARCHIVE_BATCH_SIZE))
+                ids = [(row[0],) for row in cursor.fetchall()]
+                cursor.executemany("""
+                    INSERT INTO model_details_archive
+                        (model_type, model_number, model_name, model_notes, status, timestamp, expires_at, archived_at)
+                    SELECT model_type, model_number, model_name, model_notes, status, timestamp, expires_at, ?
+                    FROM model_details WHERE id = ?
+                """, [(now, row_id) for row_id, in ids])
+                cursor.executemany("DELETE FROM model_details WHERE id = ?", ids)
+            archived += len(ids)
+            batches += 1
+            if len(ids) < ARCHIVE_BATCH_SIZE:
+                break
+    ARCHIVED_NUMBERS.inc(amount=archived)
+    return {"archived": archived, "batches": batches, "duration": time.perf_counter() - started}
+
+def archive_job():
+    if not ARCHIVE_AFTER or not is_reaper_leader() or not isinstance(storage, SQLiteStorage):
+        return
+    summary = archive_confirmed_numbers()
+    app.logger.log(logging.INFO if summary["archived"] else logging.DEBUG,
+                   "Archived %d confirmed numbers in %d batches (%.1f ms)",
+                   summary["archived"], summary["batches"], summary["duration"] * 1000)
+
+@app.route('/archive', methods=['POST'])
+@requires_sqlite
+def archive():
+    """Archive now. `older_than` (seconds) overrides ARCHIVE_AFTER and is required when that is 0."""
+    older_than = request.args.get("older_than", ARCHIVE_AFTER or None)
+    if older_than is None:
+        return jsonify({"error": "older_than is required when ARCHIVE_AFTER is not set."}), 400
+    try:
+        older_than = float(older_than)
+        if older_than < 0:
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": "older_than must be a number of seconds, 0 or more."}), 400
+    summary = archive_confirmed_numbers(older_than)
+    summary["duration"] = round(summary["duration"], 3)
+    return jsonify(summary), 200
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_LATENCY.observe(time.perf_counter() - started, route)
+        REQUEST_COUNT.inc(route, request.method, str(response.status_code))
+    return response
+
+# ---------------------------------------------------------------
+# Request profiling
+#
+# A request is profiled when it is sampled at PROFILE_SAMPLE_RATE or,
+# with PROFILE_ALLOW_CLIENT on, carries the PROFILE_HEADER header or a
+# `profile` query argument. It runs under cProfile and records where its time went: waiting for a
+# pooled connection, each SQL statement (BEGIN IMMEDIATE includes any
+# wait for the write lock), waiting for a write slot or the group-commit
+# writer, and JSON encoding. The breakdown and profile are saved in
+# PROFILE_DIR, newest PROFILE_KEEP kept, and the request's profile id is
+# returned in the X-Profile-ID header. With PROFILE_ALLOW_CLIENT on,
+# GET /profiles lists them and GET /profiles/<id> downloads one; both
+# expose request paths and timings, so the switch is off by default.
+#
+# With SLOW_REQUEST_THRESHOLD set, every request keeps the same
+# breakdown (without cProfile) and those slower than the threshold are
+# logged with it. SQL run on the group-commit writer thread shows up as
+# `group_commit` time rather than as statements.
+# ---------------------------------------------------------------
+
+PROFILE_ID = re.compile(r"^[0-9A-Za-z-]+$")
+
+_tracing = threading.local()
+# Newer Pythons allow one active cProfile per process
+_profiler_lock = threading.Lock()
+_profile_ids = itertools.count(1)
+
+class RequestTrace:
+    """Where one request's time went, filled in by the thread serving it."""
+
+    def __init__(self, profiled):
+        self.started = time.perf_counter()
+        self.profiled = profiled
+        self.profiler = None
+        self.profiling = False
+        self.phases = {}
+        self.statements = {}
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def add_statement(self, label, seconds):
+        entry = self.statements.setdefault(label, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+        self.add("sql", seconds)
+
+    def summary(self, response):
+        total = time.perf_counter() - self.started
+        phases = dict(self.phases, other=max(0.0, total - sum(self.phases.values())))
+        return {
+            "method": request.method,
+            "path": request.full_path.rstrip("?"),
+            "route": request.url_rule.rule if request.url_rule else "unmatched",
+            "status": response.status_code,
+            "time": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(total * 1000, 3),
+            "breakdown_ms": {phase: round(seconds * 1000, 3) for phase, seconds in phases.items()},
+            "statements": [{"sql": label, "count": count, "ms": round(seconds * 1000, 3)}
+                           for label, (count, seconds) in sorted(self.statements.items(), key=lambda item: -item[1][1])],
+        }
+
+def current_trace():
+    return getattr(_tracing, "trace", None)
+
+@contextmanager
+def traced(phase):
+    """Add the time spent in the block to the current request's `phase`."""
+    trace = current_trace()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(phase, time.perf_counter() - started)
+
+class TracedJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        with traced("json"):
+            return super().dumps(obj, **kwargs)
+
+app.json = TracedJSONProvider(app)
+
+def _wants_profile():
+    if PROFILE_ALLOW_CLIENT and (request.headers.get(PROFILE_HEADER) or "profile" in request.args):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+def _stop_trace():
+    """Detach this thread's trace and stop its profiler. Returns the trace, or None."""
+    trace = current_trace()
+    _tracing.trace = None
+    if trace is not None and trace.profiling:
+        trace.profiler.disable()
+        trace.profiling = False
+        _profiler_lock.release()
+    return trace
+
+def profile_files():
+    """Saved profile summaries, oldest first."""
+    return sorted(glob.glob(os.path.join(PROFILE_DIR, "*.json")))
+
+def save_profile(trace, summary):
+    """Write a profiled request's summary (and cProfile data, if taken) to PROFILE_DIR. Returns its id."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profile_id = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{os.getpid()}-{next(_profile_ids)}"
+    summary.update(id=profile_id, cprofile=trace.profiler is not None)
+    if trace.profiler is not None:
+        trace.profiler.dump_stats(os.path.join(PROFILE_DIR, profile_id + ".prof"))
+    with open(os.path.join(PROFILE_DIR, profile_id + ".json"), "w") as summary_file:
+        json.dump(summary, summary_file)
+    for old in profile_files()[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else []:
+        for path in (old, old[:-len(".json")] + ".prof"):
+            if os.path.exists(path):
+                os.remove(path)
+    return profile_id
+
+@app.before_request
+def start_request_trace():
+    profiled = _wants_profile()
+    if not profiled and not SLOW_REQUEST_THRESHOLD:
+        return
+    trace = _tracing.trace = RequestTrace(profiled)
+    # A request that cannot get the profiler still records its breakdown
+    if profiled and _profiler_lock.acquire(blocking=False):
+        trace.profiler = cProfile.Profile()
+        trace.profiler.enable()
+        trace.profiling = True
+
+@app.after_request
+def finish_request_trace(response):
+    trace = _stop_trace()
+    if trace is None:
+        return response
+    summary = trace.summary(response)
+    if trace.profiled:
+        response.headers["X-Profile-ID"] = save_profile(trace, summary)
+    if SLOW_REQUEST_THRESHOLD and summary["duration_ms"] >= SLOW_REQUEST_THRESHOLD * 1000:
+        slowest = summary["statements"][0] if summary["statements"] else None
+        app.logger.warning("Slow request %s %s: %.1f ms (%s)%s", summary["method"], summary["path"], summary["duration_ms"],
+                           ", ".join(f"{phase} {ms:.1f} ms" for phase, ms in summary["breakdown_ms"].items()),
+                           f"; slowest SQL {slowest['ms']:.1f} ms x{slowest['count']}: {slowest['sql']}" if slowest else "")
+    return response
+
+@app.teardown_request
+def discard_request_trace(error=None):
+    # Requests that failed before after_request still give up the profiler
+    _stop_trace()
+
+def requires_profile_access(view):
+    """Answer 403 from the profile endpoints unless PROFILE_ALLOW_CLIENT is on."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not PROFILE_ALLOW_CLIENT:
+            return jsonify({"error": "Profiles are not served; set PROFILE_ALLOW_CLIENT to enable them."}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.route('/profiles', methods=['GET'])
+@requires_profile_access
+def list_profiles():
+    profiles = []
+    for path in reversed(profile_files()):
+        with open(path) as summary_file:
+            profiles.append(json.load(summary_file))
+    return jsonify({"profiles": profiles}), 200
+
+@app.route('/profiles/<profile_id>', methods=['GET'])
+@requires_profile_access
+def download_profile(profile_id):
+    """The cProfile data of one request (load with `pstats`), or `?format=text` / `?format=json`."""
+    path = os.path.join(PROFILE_DIR, profile_id)
+    if not PROFILE_ID.match(profile_id) or not os.path.exists(path + ".json"):
+        return jsonify({"error": f"Profile {profile_id} does not exist."}), 404
+    profile_format = request.args.get("format", "pstats")
+    if profile_format == "json":
+        with open(path + ".json") as summary_file:
+            return jsonify(json.load(summary_file)), 200
+    if profile_format not in ("pstats", "text"):
+        return jsonify({"error": "format must be pstats, text or json."}), 400
+    if not os.path.exists(path + ".prof"):
+        return jsonify({"error": f"Profile {profile_id} has no cProfile data; another request held the profiler."}), 404
+    if profile_format == "text":
+        output = io.StringIO()
+        pstats.Stats(path + ".prof", stream=output).sort_stats("cumulative").print_stats(50)
+        return Response(output.getvalue(), mimetype="text/plain")
+    return send_file(os.path.abspath(path + ".prof"), mimetype="application/octet-stream",
+                     as_attachment=True, download_name=profile_id + ".prof")
+
+# ---------------------------------------------------------------
+# Admission control
+#
+# Every SQLite write serializes on one file, so a single client can
+# starve the rest. Two checks run before each request:
+#
+# - Rate limiting: each client (its remote address, or the
+#   RATE_LIMIT_CLIENT_HEADER header when one is configured) gets a
+#   token bucket refilled at RATE_LIMIT per
+#   second, holding up to RATE_LIMIT_BURST. Routes listed in the
+#   [rate_limits] section of config.ini get their own bucket and limits.
+# - Write admission: at most MAX_INFLIGHT_WRITES writes run at once.
+#   Up to WRITE_QUEUE_SIZE more wait WRITE_QUEUE_TIMEOUT seconds for a
+#   slot; beyond that, writes are turned away at once.
+#
+# Rejected requests get 429 Too Many Requests with Retry-After. Limits
+# are kept per process.
+# ---------------------------------------------------------------
+
+class TokenBuckets:
+    """Token buckets keyed by (client, scope), refilled lazily whenever a token is taken."""
+
+    def __init__(self):
+        self._buckets = {}  # key -> (tokens, updated, full_at)
+        self._prune_at = 1024
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, now=None):
+        """Spend one token. Returns 0 if one was available, else the seconds until one will be."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (burst, now, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            if len(self._buckets) >= self._prune_at:
+                # Buckets that have refilled behave exactly like new ones
+                self._buckets = {key: bucket for key, bucket in self._buckets.items() if bucket[2] > now}
+                self._prune_at = max(1024, 2 * len(self._buckets))
+            return wait
+
+class WriteGate:
+    """At most `limit` writes at once; up to `queue_size` more wait up to `timeout` seconds for a slot."""
+
+    def __init__(self, limit, queue_size, timeout):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._ready = threading.Condition()
+
+    def enter(self):
+        """Take a slot. Returns False if none came free in time or the queue is full."""
+        with self._ready:
+            if self.in_flight >= self.limit:
+                if self.waiting >= self.queue_size:
+                    return False
+                self.waiting += 1
+                try:
+                    if not self._ready.wait_for(lambda: self.in_flight < self.limit, self.timeout):
+                        return False
+                finally:
+                    self.waiting -= 1
+            self.in_flight += 1
+            return True
+
+    def exit(self):
+        with self._ready:
+            self.in_flight -= 1
+            self._ready.notify()
+
+rate_limiter = TokenBuckets()
+write_gate = WriteGate(MAX_INFLIGHT_WRITES, WRITE_QUEUE_SIZE, WRITE_QUEUE_TIMEOUT)
+
+def client_identity():
+    # Clients choose their own headers, so one is trusted only when configured
+    if RATE_LIMIT_CLIENT_HEADER and request.headers.get(RATE_LIMIT_CLIENT_HEADER):
+        return request.headers[RATE_LIMIT_CLIENT_HEADER]
+    return request.remote_addr or "unknown"
+
+def _is_write():
+    # Pulls allocate numbers even when sent as GET
+    return request.method != "GET" or request.endpoint == "pull_number"
+
+def _too_many_requests(route, reason, retry_after, message):
+    REJECTED_REQUESTS.inc(route, reason)
+    response = jsonify({"error": message})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+@app.before_request
+def admit_request():
+    if request.url_rule is None:
+        return None
+    route = request.url_rule.rule
+    rate, burst = ROUTE_RATE_LIMITS.get(route, (RATE_LIMIT, RATE_LIMIT_BURST))
+    if rate > 0:
+        wait = rate_limiter.take((client_identity(), route if route in ROUTE_RATE_LIMITS else "*"), rate, burst)
+        if wait:
+            return _too_many_requests(route, "rate_limit", wait, f"Rate limit exceeded; retry in {math.ceil(wait)} seconds.")
+    if write_gate.limit and _is_write():
+        with traced("write_queue"):
+            admitted = write_gate.enter()
+        if not admitted:
+            return _too_many_requests(route, "overload", write_gate.timeout, "Too many writes in progress; retry shortly.")
+        g.write_slot = True
+    return None
+
+@app.teardown_request
+def release_write_slot(error=None):
+    if g.pop("write_slot", False):
+        write_gate.exit()
+
+def collect_write_gate_gauges():
+    WRITE_GATE.replace({("in_flight",): write_gate.in_flight, ("waiting",): write_gate.waiting})
+
+metrics.collectors.append(collect_write_gate_gauges)
+
+def collect_model_number_gauges():
+    MODEL_NUMBERS.replace(storage.status_counts())
+
+metrics.collectors.append(collect_model_number_gauges)
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.expose(), mimetype="text/plain; version=0.0.4")
+
+
+# ---------------------------------------------------------------
+# Deployment
+# ---------------------------------------------------------------
+
+def create_app():
+    """
+    Application factory for multi-worker WSGI servers, e.g.
+
+        gunicorn --workers 4 --bind 0.0.0.0:5001 "model_numbering_service:create_app()"
+
+    Set WORKERS in config.ini to the number of worker processes. Each
+    process initializes the database and runs its own scheduler; the
+    reaper lease makes sure only one of them releases expired numbers.
+    """
+    initialize()
+    start_scheduler()
+    atexit.register(stop_scheduler)
+    atexit.register(group_writer.stop)
+    return app
+
+def several_server_processes():
+    """Signs, beyond WORKERS, that the server runs more than one worker process."""
+    # gunicorn and uvicorn both take their default worker count from WEB_CONCURRENCY
+    if int(os.environ.get("WEB_CONCURRENCY") or 1) > 1:
+        return True
+    # uvicorn --workers starts each worker through multiprocessing. So does --reload,
+    # which runs a single worker, so this alone never stops the memory backend.
+    return multiprocessing.parent_process() is not None and not isinstance(storage, MemoryStorage)
+
+def use_shared_state_only(reason):
+    """
+    Turn off the per-process state that writes made by other worker
+    processes cannot keep current. Raises RuntimeError for the memory
+    backend, which cannot be shared at all.
+    """
+    global FREE_NUMBER_INDEX
+    if isinstance(storage, MemoryStorage):
+        raise RuntimeError(f"{reason}, but the memory storage backend keeps its data in one process; run one worker.")
+    if FREE_NUMBER_INDEX:
+        # Releases made by other workers would never reach this process's in-memory index
+        app.logger.info("%s: serving released numbers from the database index", reason)
+        FREE_NUMBER_INDEX = False
+    if read_cache.size:
+        # Nor would their writes expire this process's cached reads
+        app.logger.info("%s: read cache disabled", reason)
+        read_cache.disable()
+
+def initialize():
+    """Prepare this process to serve requests: apply WORKERS and set up the storage backend."""
+    global BLOCK_SIZE
+    if WORKERS > 1:
+        use_shared_state_only(f"WORKERS={WORKERS}")
+    elif several_server_processes():
+        app.logger.warning("The server runs several worker processes but WORKERS = 1; set WORKERS to the worker count")
+        use_shared_state_only("Several worker processes")
+    if isinstance(storage, MemoryStorage):
+        # Blocks are leased through the database; memory pulls never touch one
+        BLOCK_SIZE = 0
+    storage.initialize()
+
+@app.before_request
+def check_server_processes():
+    # Last line of defence when the server forks workers WORKERS does not know about
+    if request.environ.get("wsgi.multiprocess") and (FREE_NUMBER_INDEX or read_cache.size or isinstance(storage, MemoryStorage)):
+        app.logger.warning("The WSGI server runs several worker processes but WORKERS = 1; set WORKERS to the worker count")
+        use_shared_state_only("Several worker processes")
+
+def _reset_after_fork():
+    """
+    Servers that import the app before forking (e.g. gunicorn --preload)
+    leave children with the parent's connections and locks. Drop them;
+    the parent keeps running the scheduler.
+    """
+    global _pool, _pool_lock, _reaper_lock, scheduler, _reaper_wake, _reaper_lease_until, _events_changed, _backup_lock, \
+        _profiler_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+    _reaper_lock = threading.Lock()
+    scheduler = None
+    _reaper_wake = None
+    _reaper_lease_until = 0.0
+    free_numbers._lock = threading.Lock()
+    read_cache._lock = threading.Lock()
+    rate_limiter._lock = threading.Lock()
+    write_gate.__init__(write_gate.limit, write_gate.queue_size, write_gate.timeout)
+    _events_changed = threading.Condition()
+    _backup_lock = threading.Lock()
+    _profiler_lock = threading.Lock()
+    # The writer thread is not copied into the child; start a fresh one on first use
+    group_writer.__init__()
+    # The parent may still hand out numbers from these blocks
+    block_allocator._blocks = {}
+    block_allocator._lock = threading.Lock()
+    for metric in metrics.metrics:
+        metric._lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
 
 
 if __name__ == '__main__':
-    init_db()
-    from apscheduler.schedulers.background import BackgroundScheduler
-    scheduler = BackgroundScheduler()
-    # scheduler.add_job(release_unconfirmed_numbers, 'interval', hours=1)
-    scheduler.add_job(release_unconfirmed_numbers, trigger='interval', seconds=CHECK_INTERVAL)
-    scheduler.start()
-    app.run(host=HOST, port=PORT)
+    app.logger.setLevel(logging.INFO)
+    create_app().run(host=HOST, port=PORT, threaded=True)
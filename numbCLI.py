@@ -22,10 +22,15 @@ License:
 
 
 import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import requests
 import cmd
 import configparser
+from datetime import datetime
+import json
 import os
+import shlex
 import sys
 
 # Clear the screen 
@@ -59,6 +64,34 @@ HOST = 'localhost'
 PORT = config.get('DEFAULT', 'PORT', fallback='5001')
 BASE_URL = get_config("BASE_URL") or f"http://{HOST}:{PORT}"
 
+# One pooled session for every request, so connections are kept alive
+session = requests.Session()
+
+def set_pool_size(size):
+    """Allow up to `size` concurrent keep-alive connections to the server."""
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+# ETag and body of the last 200 response per URL, so repeated reads are
+# answered with 304 Not Modified instead of the full body
+MAX_CACHED_RESPONSES = 256
+cached_responses = {}
+
+def conditional_get(url):
+    """GET with If-None-Match. Returns (status_code, json), using the cached body on 304."""
+    cached = cached_responses.get(url)
+    response = session.get(url, headers={"If-None-Match": cached[0]} if cached else {})
+    if response.status_code == 304 and cached:
+        return 200, cached[1]
+    data = response.json()
+    if response.status_code == 200 and response.headers.get("ETag"):
+        cached_responses.pop(url, None)
+        cached_responses[url] = (response.headers["ETag"], data)
+        if len(cached_responses) > MAX_CACHED_RESPONSES:
+            del cached_responses[next(iter(cached_responses))]
+    return response.status_code, data
+
 class NumberingCLI(cmd.Cmd):
     use_rawinput = True
     intro = "Welcome to the model numbering CLI. Type the number of the desired command from the list below:\n"
@@ -68,9 +101,14 @@ class NumberingCLI(cmd.Cmd):
         "A": {"info": "Add - Model Type", "func": "add_model_type_prompt"},
         "L": {"info": "List - Model Types", "func": "list_model_types"},
         "P": {"info": "Pull - Model Number", "func": "pull_prompt"},
+        "B": {"info": "Batch Pull - Model Numbers", "func": "pull_batch_prompt"},
         "C": {"info": "Confirm - Model Number", "func": "confirm_prompt"},
         "R": {"info": "Release - Model Number", "func": "release_prompt"},
         "S": {"info": "Search - Model Number", "func": "search_prompt"},
+        "N": {"info": "Numbers - Browse a Model Type", "func": "list_numbers_prompt"},
+        "F": {"info": "Find - Search Names and Notes", "func": "find_prompt"},
+        "W": {"info": "Watch - Number Changes", "func": "watch_prompt"},
+        "T": {"info": "Totals - Usage by Model Type", "func": "stats_prompt"},
         "E": {"info": "Edit - Model Number", "func": "edit_model_details_prompt"},
         "U": {"info": "Update - Base URL", "func": "set_base_url_prompt"},
         "X": {"info": "Exit", "func": "do_exit"},
@@ -111,6 +149,15 @@ class NumberingCLI(cmd.Cmd):
         print("-" * 50)  # Prints 50 dashes
         self.print_menu()
 
+    def pull_batch_prompt(self, _):
+        clear_console() # Clear console and list commands
+        model_type = input("Enter model type for which to retrieve numbers (e.g. SYS): ")
+        count = input("Enter how many numbers to retrieve: ")
+        self.do_pull(f"{model_type} {count}")
+        # Clear console and list commands
+        print("-" * 50)  # Prints 50 dashes
+        self.print_menu()
+
     def list_model_types(self, _):
         clear_console() # Clear console and list commands
         print("Current Model Types:")  # Prints 50 dashes
@@ -144,6 +191,38 @@ class NumberingCLI(cmd.Cmd):
         print("-" * 50)  # Prints 50 dashes
         self.print_menu()
 
+    def list_numbers_prompt(self, _):
+        clear_console() # Clear console and list commands
+        model_type = input("Enter model type to browse (e.g. SYS): ")
+        status = input("Enter status to filter by (pulled/confirmed/released, blank for all): ")
+        self.do_list_numbers(f"{model_type} --status {status}" if status else model_type)
+        # Clear console and list commands
+        print("-" * 50)  # Prints 50 dashes
+        self.print_menu()
+
+    def find_prompt(self, _):
+        clear_console() # Clear console and list commands
+        text = input("Enter words to search model names and notes for: ")
+        self.do_find(text)
+        # Clear console and list commands
+        print("-" * 50)  # Prints 50 dashes
+        self.print_menu()
+
+    def watch_prompt(self, _):
+        clear_console() # Clear console and list commands
+        model_type = input("Enter model type to watch (blank for all): ")
+        self.do_watch(model_type)
+        # Clear console and list commands
+        print("-" * 50)  # Prints 50 dashes
+        self.print_menu()
+
+    def stats_prompt(self, _):
+        clear_console() # Clear console and list commands
+        self.do_stats("")
+        # Clear console and list commands
+        print("-" * 50)  # Prints 50 dashes
+        self.print_menu()
+
     def edit_model_details_prompt(self, _):
         clear_console() # Clear console and list commands
         model_number = input("Enter model number (e.g. SYS-0001): ")
@@ -170,42 +249,62 @@ class NumberingCLI(cmd.Cmd):
             return
 
         model_type, description = args
-        response = requests.post(f"{BASE_URL}/add_model_type/{model_type}/{description}")
+        response = session.post(f"{BASE_URL}/add_model_type/{model_type}/{description}")
         print(response.json().get("status", "An error occurred."))
 
 
     def do_list_model_types(self, _):
         """List available model types with their descriptions."""
-        response = requests.get(f"{BASE_URL}/list_model_types")
-        model_types = response.json().get("model_types", [])
+        _, data = conditional_get(f"{BASE_URL}/list_model_types")
+        model_types = data.get("model_types", [])
         for model in model_types:
             print(f"Type: {model['type']}, Description: {model['description']}")
 
 
-    def do_pull(self, model_type):
-        """Retrieve and reserve the next available number for a given model type."""
-        response = requests.get(f"{BASE_URL}/pull/{model_type}")
+    def do_pull(self, arg):
+        """Retrieve and reserve the next available number(s) for a given model type. Usage: pull <model_type> [count]"""
+        args = arg.split()
+        if len(args) not in (1, 2):
+            print("Usage: pull <model_type> [count]")
+            return
+
+        model_type = args[0]
+        if len(args) == 1:
+            response = session.get(f"{BASE_URL}/pull/{model_type}")
+            try:
+                number = response.json()["number"]
+                formatted_number = f"{model_type}-{number:04}"
+                print(formatted_number)
+            except:
+                print("Error:", response.json().get("error", "An error occurred."))
+            return
+
+        # Batch pull: all numbers are reserved in a single request
+        response = session.get(f"{BASE_URL}/pull/{model_type}", params={"count": args[1]})
         try:
-            number = response.json()["number"]
-            formatted_number = f"{model_type}-{number:04}"
-            print(formatted_number)
+            for number in response.json()["numbers"]:
+                print(f"{model_type}-{number:04}")
         except:
             print("Error:", response.json().get("error", "An error occurred."))
 
     def do_confirm(self, arg):
-        """Confirm the use of a specific number for a given model type."""
+        """Confirm the use of one or more numbers. Usage: confirm <MODEL-NUMBER> [<MODEL-NUMBER> ...]"""
         try:
             parser = argparse.ArgumentParser(prog="confirm", description="Confirm the use of a specific number for a given model type.")
-            parser.add_argument("model_number", help="Model number in the format MODEL-NUMBER", type=str)
+            parser.add_argument("model_number", help="Model number in the format MODEL-NUMBER", type=str, nargs="+")
             args = parser.parse_args(arg.split())
 
+            if len(args.model_number) > 1:
+                self._bulk_transition("confirm", args.model_number)
+                return
+
             # Splitting the input and checking if it has the correct number of parts
-            parts = args.model_number.split('-')
+            parts = args.model_number[0].split('-')
             if len(parts) != 2:
                 raise ValueError("Invalid input format.")
 
             model_type, number = parts
-            response = requests.post(f"{BASE_URL}/confirm/{model_type}/{number}")
+            response = session.post(f"{BASE_URL}/confirm/{model_type}/{number}")
             if response.status_code == 200:
                 status = response.json()["status"]
                 print(f"{status}: {model_type}-{number}")
@@ -216,19 +315,23 @@ class NumberingCLI(cmd.Cmd):
             print("Invalid input format. Please use the format MODEL-NUMBER, e.g., SYS-0001")
 
     def do_release(self, arg):
-        """Release a specific number for a given model type."""
+        """Release one or more numbers. Usage: release <MODEL-NUMBER> [<MODEL-NUMBER> ...]"""
         try:
             parser = argparse.ArgumentParser(prog="release", description="Release a specific number for a given model type.")
-            parser.add_argument("model_number", help="Model number in the format MODEL-NUMBER", type=str)
+            parser.add_argument("model_number", help="Model number in the format MODEL-NUMBER", type=str, nargs="+")
             args = parser.parse_args(arg.split())
 
+            if len(args.model_number) > 1:
+                self._bulk_transition("release", args.model_number)
+                return
+
             # Splitting the input and checking if it has the correct number of parts
-            parts = args.model_number.split('-')
+            parts = args.model_number[0].split('-')
             if len(parts) != 2:
                 raise ValueError("Invalid input format.")
 
             model_type, number = parts
-            response = requests.post(f"{BASE_URL}/release/{model_type}/{number}")
+            response = session.post(f"{BASE_URL}/release/{model_type}/{number}")
             if response.status_code == 200:
                 print(response.json()["status"])
             else:
@@ -237,6 +340,25 @@ class NumberingCLI(cmd.Cmd):
         except (ValueError, argparse.ArgumentError):
             print("Invalid input format. Please use the format MODEL-NUMBER, e.g., SYS-0001")
 
+    def _bulk_transition(self, action, model_numbers):
+        """Confirm or release several numbers in a single request."""
+        items = []
+        for model_number in model_numbers:
+            parts = model_number.split('-')
+            if len(parts) != 2:
+                raise ValueError("Invalid input format.")
+            items.append({"model_type": parts[0], "number": parts[1]})
+
+        response = session.post(f"{BASE_URL}/bulk_{action}", json=items)
+        if response.status_code != 200:
+            print(response.json().get("error", "An error occurred."))
+            return
+        for model_number, result in zip(model_numbers, response.json()["results"]):
+            if "error" in result:
+                print(result["error"])
+            else:
+                print(f"{result['status']}: {model_number}")
+
     def do_search(self, arg):
         """Search for a specific number for a given model type."""
         try:
@@ -249,9 +371,8 @@ class NumberingCLI(cmd.Cmd):
                 raise ValueError("Invalid input format.")
             
             model_type, number = parts
-            response = requests.get(f"{BASE_URL}/search/{model_type}/{number}")
-            if response.status_code == 200:
-                data = response.json()
+            status_code, data = conditional_get(f"{BASE_URL}/search/{model_type}/{number}")
+            if status_code == 200:
                 status = data["status"]
                 model_name = data.get("model_name", "N/A")  # Default to "N/A" if not provided
                 model_notes = data.get("model_notes", "N/A")  # Default to "N/A" if not provided
@@ -269,11 +390,150 @@ class NumberingCLI(cmd.Cmd):
                 print(f"Model Notes: {model_notes}")
                 
             else:
-                print(response.json()["error"])
+                print(data["error"])
             
         except (ValueError, argparse.ArgumentError):
             print("Invalid input format. Please use the format MODEL-NUMBER, e.g., SYS-0001")
 
+    def do_list_numbers(self, arg):
+        """Browse numbers page by page. Usage: list_numbers [model_type] [--status S] [--min N] [--max N] [--since T] [--until T] [--page-size N] [--all]"""
+        parser = argparse.ArgumentParser(prog="list_numbers", description="Browse model numbers page by page.")
+        parser.add_argument("model_type", nargs="?", help="Only list this model type")
+        parser.add_argument("--status", choices=["pulled", "confirmed", "released"], help="Only list numbers in this state")
+        parser.add_argument("--min", dest="min_number", type=int, help="Lowest number to list")
+        parser.add_argument("--max", dest="max_number", type=int, help="Highest number to list")
+        parser.add_argument("--since", help="Only numbers pulled at or after this time (ISO 8601, UTC unless an offset is given)")
+        parser.add_argument("--until", help="Only numbers pulled before this time (ISO 8601, UTC unless an offset is given)")
+        parser.add_argument("--page-size", type=int, default=50, help="Numbers per page")
+        parser.add_argument("--all", action="store_true", help="Print every page without pausing")
+        try:
+            args = parser.parse_args(arg.split())
+        except SystemExit:
+            return
+
+        params = {key: value for key, value in vars(args).items() if value is not None and key not in ("all", "page_size")}
+        params["page_size"] = args.page_size
+        pause = not args.all and sys.stdin.isatty()
+        while True:
+            response = session.get(f"{BASE_URL}/list_numbers", params=params)
+            if response.status_code != 200:
+                print(response.json().get("error", "An error occurred."))
+                return
+            page = response.json()
+            for item in page["items"]:
+                name = f" - {item['model_name']}" if item["model_name"] else ""
+                print(f"{item['model_type']}-{item['model_number']:04}: {item['status']}{name}")
+            if not page["next_cursor"]:
+                return
+            params["cursor"] = page["next_cursor"]
+            if pause and input("Press Enter for the next page or q to stop: ").strip().lower() == "q":
+                return
+
+    def do_find(self, arg):
+        """Search model names and notes. Usage: find <words> [--type T] [--status S] [--page-size N]"""
+        parser = argparse.ArgumentParser(prog="find", description="Search model names and notes.")
+        parser.add_argument("words", nargs="+", help="Words to search for")
+        parser.add_argument("--type", dest="model_type", help="Only search this model type")
+        parser.add_argument("--status", choices=["pulled", "confirmed", "released"], help="Only numbers in this state")
+        parser.add_argument("--page-size", type=int, default=20, help="Results per page")
+        try:
+            args = parser.parse_args(shlex.split(arg))
+        except (SystemExit, ValueError):
+            return
+
+        params = {"q": " ".join(args.words), "page_size": args.page_size, "page": 1}
+        for key in ("model_type", "status"):
+            if getattr(args, key):
+                params[key] = getattr(args, key)
+        while True:
+            response = session.get(f"{BASE_URL}/find", params=params)
+            if response.status_code != 200:
+                print(response.json().get("error", "An error occurred."))
+                return
+            data = response.json()
+            if not data["results"] and params["page"] == 1:
+                print("No matches found.")
+            for result in data["results"]:
+                print(f"{result['model_type']}-{result['model_number']:04} ({result['status']}): {result['snippet']}")
+            if not data["next_page"]:
+                return
+            params["page"] = data["next_page"]
+            if not sys.stdin.isatty() or input("Press Enter for more results or q to stop: ").strip().lower() == "q":
+                return
+
+    def do_watch(self, arg):
+        """Print number changes as they happen. Usage: watch [model_type] [--since ID] [--no-follow]"""
+        parser = argparse.ArgumentParser(prog="watch", description="Print number changes as they happen.")
+        parser.add_argument("model_type", nargs="?", help="Only watch this model type")
+        parser.add_argument("--since", type=int, help="Start after this event id (default: only new changes)")
+        parser.add_argument("--no-follow", action="store_true", help="Print the changes so far and stop")
+        try:
+            args = parser.parse_args(arg.split())
+        except SystemExit:
+            return
+
+        params = {"since": args.since if args.since is not None else "latest", "limit": 1000}
+        if args.model_type:
+            params["model_type"] = args.model_type
+        if not args.no_follow:
+            params["wait"] = 30
+            print("Watching for changes, press Ctrl+C to stop.")
+        try:
+            while True:
+                response = session.get(f"{BASE_URL}/events", params=params)
+                if response.status_code != 200:
+                    print(response.json().get("error", "An error occurred."))
+                    return
+                data = response.json()
+                for event in data["events"]:
+                    changed_at = datetime.fromtimestamp(event["timestamp"]).strftime("%Y-%m-%d %H:%M:%S")
+                    print(f"[{changed_at}] {event['model_type']}-{event['model_number']:04}: {event['event']}")
+                params["since"] = data["last_id"]
+                if args.no_follow and not data["events"]:
+                    return
+        except KeyboardInterrupt:
+            print()
+
+    def do_export(self, arg):
+        """Download the whole registry to a file. Usage: export <file> [--format ndjson|csv]"""
+        parser = argparse.ArgumentParser(prog="export", description="Download the whole registry to a file.")
+        parser.add_argument("file", help="File to write")
+        parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson", help="Export format")
+        try:
+            args = parser.parse_args(arg.split())
+        except SystemExit:
+            return
+
+        with session.get(f"{BASE_URL}/export", params={"format": args.format}, stream=True) as response:
+            if response.status_code != 200:
+                print(response.json().get("error", "An error occurred."))
+                return
+            with open(args.file, "wb") as export_file:
+                for chunk in response.iter_content(chunk_size=1 << 16):
+                    export_file.write(chunk)
+        print(f"Registry exported to {args.file}")
+
+    def do_import(self, arg):
+        """Load a registry export into the server. Usage: import <file> [--format ndjson|csv]"""
+        parser = argparse.ArgumentParser(prog="import", description="Load a registry export into the server.")
+        parser.add_argument("file", help="NDJSON or CSV file produced by export")
+        parser.add_argument("--format", choices=["ndjson", "csv"], help="Defaults to csv for .csv files, otherwise ndjson")
+        try:
+            args = parser.parse_args(arg.split())
+        except SystemExit:
+            return
+
+        import_format = args.format or ("csv" if args.file.lower().endswith(".csv") else "ndjson")
+        # Passing the open file streams it instead of reading it into memory
+        with open(args.file, "rb") as import_file:
+            response = session.post(f"{BASE_URL}/import", params={"format": import_format}, data=import_file)
+        data = response.json()
+        if response.status_code == 200:
+            print(f"Imported {data['rows']['model_numbers']} model types and "
+                  f"{data['rows']['model_details']} numbers in {data['seconds']}s")
+        else:
+            print(data.get("error", "An error occurred."))
+
     def do_edit_model_details(self, args):
         """Edit details for a specific model number. Usage: edit_model_details <model_number> "<model_name>" "<model_notes>" """
         try:
@@ -282,7 +542,6 @@ class NumberingCLI(cmd.Cmd):
             model_number = parts[0]
 
             # Now, let's find model_name and model_notes enclosed in double quotes
-            import shlex
             model_name, model_notes = shlex.split(parts[1])
 
             # Make the request to edit the model details
@@ -290,7 +549,7 @@ class NumberingCLI(cmd.Cmd):
                 "model_name": model_name,
                 "model_notes": model_notes
             }
-            response = requests.post(f"{BASE_URL}/edit_model_details/{model_number}", json=payload)
+            response = session.post(f"{BASE_URL}/edit_model_details/{model_number}", json=payload)
 
             # Print the server response or an error message
             print(response.json().get("status", "An error occurred."))
@@ -298,6 +557,66 @@ class NumberingCLI(cmd.Cmd):
         except Exception as e:
             print(f"Error processing the command: {e}. Ensure the correct format is used.")
 
+    def do_check_free_numbers(self, arg):
+        """Check the server's free-number index against the database. Usage: check_free_numbers [--rebuild]"""
+        parser = argparse.ArgumentParser(prog="check_free_numbers", description="Check or rebuild the free-number index.")
+        parser.add_argument("--rebuild", action="store_true", help="Rebuild the index from the database")
+        try:
+            args = parser.parse_args(arg.split())
+        except SystemExit:
+            return
+
+        if args.rebuild:
+            response = session.post(f"{BASE_URL}/rebuild_free_numbers")
+            print(response.json().get("status", "An error occurred."))
+            return
+
+        response = session.get(f"{BASE_URL}/verify_free_numbers")
+        data = response.json()
+        if data.get("consistent"):
+            print("Free-number index is consistent with the database.")
+            return
+        if data.get("missing"):
+            print("Released in the database but missing from the index:", ", ".join(data["missing"]))
+        if data.get("stale"):
+            print("In the index but no longer released:", ", ".join(data["stale"]))
+        print("Run 'check_free_numbers --rebuild' to reload the index.")
+
+    def do_stats(self, arg):
+        """Show number usage per model type. Usage: stats [model_type] [--verify] [--rebuild]"""
+        parser = argparse.ArgumentParser(prog="stats", description="Show number usage per model type.")
+        parser.add_argument("model_type", nargs="?", help="Only show this model type")
+        parser.add_argument("--verify", action="store_true", help="Check the server's counters against a full count")
+        parser.add_argument("--rebuild", action="store_true", help="Recount the server's counters")
+        try:
+            args = parser.parse_args(arg.split())
+        except SystemExit:
+            return
+
+        if args.rebuild:
+            response = session.post(f"{BASE_URL}/rebuild_stats")
+            print(response.json().get("status", "An error occurred."))
+            return
+        if args.verify:
+            data = session.get(f"{BASE_URL}/verify_stats").json()
+            if data.get("consistent"):
+                print("Status counters are consistent with the database.")
+                return
+            for drift in data.get("drift", []):
+                print(f"{drift['model_type']} {drift['status']}: counted {drift['counted']}, actually {drift['actual']}")
+            print("Run 'stats --rebuild' to recount.")
+            return
+
+        params = {"model_type": args.model_type} if args.model_type else {}
+        response = session.get(f"{BASE_URL}/stats", params=params)
+        if response.status_code != 200:
+            print(response.json().get("error", "An error occurred."))
+            return
+        print(f"{'Type':<10}{'Pulled':>10}{'Confirmed':>12}{'Released':>10}{'Total':>10}{'Available':>12}")
+        for entry in response.json()["model_types"]:
+            print(f"{entry['type']:<10}{entry['pulled']:>10}{entry['confirmed']:>12}{entry['released']:>10}"
+                  f"{entry['total']:>10}{entry['available']:>12}")
+
     def do_set_base_url(self, url):
         """Set the base URL for the CLI."""
         try:
@@ -313,12 +632,96 @@ class NumberingCLI(cmd.Cmd):
         print("Exiting the CLI...")
         sys.exit(0)
 
+# ---------------------------------------------------------------
+# Batch mode
+#
+# Reads one command per line (same syntax as the interactive commands),
+# runs them over the shared session and prints one JSON object per line,
+# in input order. With --concurrency above 1, lines are sent in parallel
+# and may reach the server out of order.
+# ---------------------------------------------------------------
+
+def split_model_number(model_number):
+    model_type, number = model_number.split('-')
+    return model_type, int(number)
+
+def batch_request(command, args):
+    """Map a command line to (method, path, keyword arguments for the request)."""
+    if command == "add_model_type" and len(args) >= 2:
+        return "POST", f"/add_model_type/{args[0]}/{' '.join(args[1:])}", {}
+    if command == "list_model_types" and not args:
+        return "GET", "/list_model_types", {}
+    if command == "pull" and len(args) in (1, 2):
+        return "GET", f"/pull/{args[0]}", {"params": {"count": args[1]}} if len(args) == 2 else {}
+    if command in ("confirm", "release") and len(args) == 1:
+        model_type, number = split_model_number(args[0])
+        return "POST", f"/{command}/{model_type}/{number}", {}
+    if command in ("confirm", "release") and len(args) > 1:
+        items = [dict(zip(("model_type", "number"), split_model_number(arg))) for arg in args]
+        return "POST", f"/bulk_{command}", {"json": items}
+    if command == "search" and len(args) == 1:
+        model_type, number = split_model_number(args[0])
+        return "GET", f"/search/{model_type}/{number}", {}
+    if command == "edit_model_details" and len(args) == 3:
+        split_model_number(args[0])
+        return "POST", f"/edit_model_details/{args[0]}", {"json": {"model_name": args[1], "model_notes": args[2]}}
+    if command == "stats" and len(args) <= 1:
+        return "GET", "/stats", {"params": {"model_type": args[0]}} if args else {}
+    if command == "find" and args:
+        return "GET", "/find", {"params": {"q": " ".join(args)}}
+    raise ValueError(f"Unsupported command or arguments: {command} {' '.join(args)}".strip())
+
+def run_batch_line(line_number, line):
+    result = {"line": line_number, "command": line}
+    try:
+        command, *args = shlex.split(line)
+        method, path, kwargs = batch_request(command, args)
+        response = session.request(method, f"{BASE_URL}{path}", **kwargs)
+        result.update(status=response.status_code, ok=response.ok, response=response.json())
+    except ValueError as e:
+        result.update(ok=False, error=str(e))
+    except requests.RequestException as e:
+        result.update(ok=False, error=f"Request failed: {e}")
+    return result
+
+def run_batch(lines, concurrency=1, output=sys.stdout):
+    """Run batch commands and write JSON-line results. Returns True if every command succeeded."""
+    commands = ((number, line.strip()) for number, line in enumerate(lines, 1))
+    commands = ((number, line) for number, line in commands if line and not line.startswith("#"))
+    succeeded = True
+    set_pool_size(concurrency)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        # Keep a bounded window of requests in flight, emitting results in input order
+        pending = deque()
+        for number, line in commands:
+            pending.append(pool.submit(run_batch_line, number, line))
+            if len(pending) >= concurrency * 2:
+                result = pending.popleft().result()
+                succeeded &= result["ok"]
+                output.write(json.dumps(result) + "\n")
+        while pending:
+            result = pending.popleft().result()
+            succeeded &= result["ok"]
+            output.write(json.dumps(result) + "\n")
+    return succeeded
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Model Numbering CLI")
-    parser.add_argument("--non-interactive", action="store_true", help="Run in non-interactive mode")
+    parser.add_argument("--non-interactive", action="store_true",
+                        help="Run commands from --file (or stdin) and print JSON-line results")
+    parser.add_argument("--file", default="-", help="Batch command file, - for stdin (default)")
+    parser.add_argument("--concurrency", type=int, default=1, help="Batch commands to run in parallel")
     args = parser.parse_args()
     
     if args.non_interactive:
-        print("Running in non-interactive mode. Use without --non-interactive to enter interactive mode.")
+        if args.concurrency < 1:
+            parser.error("--concurrency must be at least 1")
+        if args.file == "-":
+            ok = run_batch(sys.stdin, args.concurrency)
+        else:
+            with open(args.file) as batch_file:
+                ok = run_batch(batch_file, args.concurrency)
+        sys.exit(0 if ok else 1)
     else:
         NumberingCLI().cmdloop()
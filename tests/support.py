@@ -0,0 +1,22 @@
+import os
+import tempfile
+import unittest
+
+import model_numbering_service as service
+
+
+class TemporaryDatabaseTestCase(unittest.TestCase):
+    """Points the service at a throwaway database file for each test."""
+
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self._saved_database = service.DATABASE
+        service.DATABASE = self.db_path
+
+    def tearDown(self):
+        service.close_db()
+        service.DATABASE = self._saved_database
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + suffix):
+                os.remove(self.db_path + suffix)
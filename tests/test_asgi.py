@@ -0,0 +1,131 @@
+import asyncio
+import json
+import unittest
+from unittest import mock
+
+import model_numbering_asgi as asgi
+import model_numbering_service as service
+from tests.support import TemporaryDatabaseTestCase
+
+
+async def call(app, method, path, body=b"", chunk_size=None):
+    """Send one request through the ASGI app and return (status, headers, body)."""
+    path, _, query = path.partition("?")
+    scope = {"type": "http", "method": method, "path": path, "query_string": query.encode(),
+             "http_version": "1.1", "headers": [(b"content-type", b"application/json")], "client": ("127.0.0.1", 5000)}
+    chunk_size = chunk_size or max(len(body), 1)
+    chunks = [body[start:start + chunk_size] for start in range(0, len(body), chunk_size)] or [b""]
+    messages = [{"type": "http.request", "body": chunk, "more_body": index < len(chunks) - 1}
+                for index, chunk in enumerate(chunks)]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.Event().wait()  # Like a client that stays connected
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    headers = dict(sent[0]["headers"])
+    return sent[0]["status"], headers, b"".join(message.get("body", b"") for message in sent[1:])
+
+
+class TestASGI(TemporaryDatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.app = asgi.ModelNumberingASGI()
+
+    def tearDown(self):
+        super().tearDown()
+        service._reaper_wake = None
+
+    def run_app(self, scenario):
+        async def main():
+            await self.app.startup()
+            try:
+                return await scenario()
+            finally:
+                await self.app.shutdown()
+        return asyncio.run(main())
+
+    def test_same_routes_and_json_as_flask(self):
+        async def scenario():
+            self.assertEqual((await call(self.app, "POST", "/add_model_type/SYS/Systems"))[0], 200)
+            status, headers, body = await call(self.app, "GET", "/pull/SYS?count=2")
+            self.assertEqual((status, json.loads(body)), (200, {"numbers": [1, 2]}))
+            self.assertEqual(headers[b"content-type"], b"application/json")
+
+            # A request body delivered in several ASGI messages is buffered on the loop...
+            payload = json.dumps({"model_name": "Radar", "model_notes": "x" * 100}).encode()
+            with mock.patch.object(asgi.asyncio, "run_coroutine_threadsafe") as read_from_thread:
+                status, _, _ = await call(self.app, "POST", "/edit_model_details/SYS-1", payload, chunk_size=16)
+            self.assertEqual(status, 200)
+            read_from_thread.assert_not_called()
+            # ...unless it is too large, when the view reads the rest from its stream thread
+            with mock.patch.object(asgi, "MAX_BUFFERED_BODY", 32):
+                status, _, _ = await call(self.app, "POST", "/edit_model_details/SYS-2", payload, chunk_size=16)
+            self.assertEqual(status, 200)
+            self.assertEqual(json.loads((await call(self.app, "GET", "/search/SYS/2"))[2])["model_name"], "Radar")
+            status, _, body = await call(self.app, "GET", "/search/SYS/1")
+            self.assertEqual(json.loads(body), service.app.test_client().get("/search/SYS/1").json)
+            self.assertEqual((await call(self.app, "GET", "/search/SYS/99"))[0], 404)
+
+            # Streamed responses arrive in full
+            _, _, body = await call(self.app, "GET", "/export?format=ndjson")
+            self.assertEqual(body, service.app.test_client().get("/export?format=ndjson").data)
+        self.run_app(scenario)
+
+    def test_reaper_runs_as_asyncio_task(self):
+        with mock.patch.object(service, "RELEASE_TIME", 0.3), mock.patch.object(service, "LEASE_TTL", 0.3):
+            async def scenario():
+                await call(self.app, "POST", "/add_model_type/SYS/Systems")
+                await call(self.app, "GET", "/pull/SYS")
+                await asyncio.sleep(0.8)
+                return json.loads((await call(self.app, "GET", "/search/SYS/1"))[2])["status"]
+            self.assertEqual(self.run_app(scenario), "released")
+        self.assertIsNone(service.scheduler)
+
+    def test_event_stream_disconnect(self):
+        async def scenario():
+            await call(self.app, "POST", "/add_model_type/SYS/Systems")
+            scope = {"type": "http", "method": "GET", "path": "/events", "query_string": b"since=latest",
+                     "http_version": "1.1", "headers": [(b"accept", b"text/event-stream")], "client": ("127.0.0.1", 5000)}
+            loop_errors = []
+            asyncio.get_running_loop().set_exception_handler(lambda loop, context: loop_errors.append(context))
+
+            async def listen(hang_up_after):
+                chunks = []
+                gone = asyncio.Event()
+                messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+                async def receive():
+                    if messages:
+                        return messages.pop(0)
+                    await gone.wait()
+                    return {"type": "http.disconnect"}
+
+                async def send(message):
+                    if message["type"] == "http.response.body":
+                        chunks.append(message["body"])
+                        if len(chunks) == hang_up_after:
+                            gone.set()
+
+                await asyncio.wait_for(self.app(scope, receive, send), 5)
+                return chunks
+
+            with mock.patch.object(service.app.logger, "error") as logged_error, \
+                    mock.patch.object(service.app.logger, "exception") as logged_exception:
+                # Several streams at once, so their steps land on different executor threads
+                streams = await asyncio.gather(*(listen(3 + index) for index in range(4)))
+            self.assertTrue(all(b": keep-alive\n\n" in chunks for chunks in streams))
+            self.assertFalse(logged_error.called or logged_exception.called)
+            self.assertEqual(loop_errors, [])
+        with mock.patch.object(service, "EVENTS_HEARTBEAT", 0.05), mock.patch.object(service, "EVENTS_POLL_INTERVAL", 0.05):
+            self.run_app(scenario)
+
+
+if __name__ == "__main__":
+    unittest.main()
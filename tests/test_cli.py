@@ -0,0 +1,71 @@
+import io
+import json
+import logging
+import threading
+import unittest
+from unittest import mock
+
+from werkzeug.serving import make_server
+
+import model_numbering_service as service
+import numbCLI
+from tests.support import TemporaryDatabaseTestCase
+
+
+class BatchModeTestCase(TemporaryDatabaseTestCase):
+    """Runs batch commands against the service on a local port."""
+
+    def setUp(self):
+        super().setUp()
+        service.init_db()
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        self.server = make_server("127.0.0.1", 0, service.app, threaded=True)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        patcher = mock.patch.object(numbCLI, "BASE_URL", f"http://127.0.0.1:{self.server.server_port}")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.server.shutdown()
+        super().tearDown()
+
+    def run_batch(self, text, concurrency=1):
+        output = io.StringIO()
+        ok = numbCLI.run_batch(io.StringIO(text), concurrency, output)
+        return ok, [json.loads(line) for line in output.getvalue().splitlines()]
+
+    def test_commands_emit_json_lines(self):
+        ok, results = self.run_batch("""
+            # Set up a type and walk one number through its life
+            add_model_type SYS "Systems models"
+            pull SYS 3
+            confirm SYS-0001
+            confirm SYS-0002 SYS-0003
+            release SYS-0002
+            edit_model_details SYS-0001 "Radar" "Long range"
+            search SYS-0001
+        """)
+        self.assertTrue(ok)
+        self.assertEqual([result["line"] for result in results], [3, 4, 5, 6, 7, 8, 9])
+        self.assertEqual(results[1]["response"], {"numbers": [1, 2, 3]})
+        self.assertEqual(results[3]["response"]["results"][1]["status"], "confirmed")
+        self.assertEqual(results[-1]["response"]["model_name"], "Radar")
+
+    def test_failures_are_reported_per_line(self):
+        ok, results = self.run_batch("pull NOPE\nfrobnicate\nsearch SYS-x\n")
+        self.assertFalse(ok)
+        self.assertEqual(results[0]["status"], 400)
+        self.assertFalse(results[0]["ok"])
+        self.assertIn("Unsupported command", results[1]["error"])
+        self.assertIn("error", results[2])
+
+    def test_concurrent_batch_keeps_input_order(self):
+        self.run_batch('add_model_type SYS "Systems"')
+        ok, results = self.run_batch("pull SYS\n" * 40, concurrency=8)
+        self.assertTrue(ok)
+        self.assertEqual([result["line"] for result in results], list(range(1, 41)))
+        self.assertEqual(sorted(result["response"]["number"] for result in results), list(range(1, 41)))
+
+
+if __name__ == "__main__":
+    unittest.main()
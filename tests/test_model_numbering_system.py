@@ -1,48 +1,54 @@
 import unittest
-import requests
-import sqlite3
-from model_numbering_service import DATABASE, app  # Replace 'your_server_file' with the actual name of your server script
+from unittest import mock
+
+import model_numbering_service as service
 
-BASE_URL = "http://localhost:5001"  # Change if your server is running on a different address
 
 class TestModelNumberingSystem(unittest.TestCase):
+    """End-to-end walk through the API, in-process on the memory backend so model_numbers.db is never touched."""
+
+    def setUp(self):
+        patcher = mock.patch.object(service, "storage", service.MemoryStorage())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = service.app.test_client()
+        self.client.post("/add_model_type/XYZ/Test models")
 
-    @classmethod
-    def setUpClass(cls):
-        # Ensure the database is clean before tests
-        with sqlite3.connect(DATABASE) as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM model_details")  # Caution: This will remove all records
-            conn.commit()
+    def pull_and_confirm(self):
+        model_number = self.client.get("/pull/XYZ").json["number"]
+        self.client.post(f"/confirm/XYZ/{model_number}")
+        return model_number
 
     def test_add_model_type(self):
-        response = requests.post(f"{BASE_URL}/add_model_type/XYX")
+        response = self.client.post("/add_model_type/XYX/Other test models")
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.json()["status"], "Model type added successfully.")
+        self.assertEqual(response.json["status"], "Model type XYX added with description: Other test models")
 
     def test_pull_and_confirm(self):
         # Pull a model number
-        response = requests.get(f"{BASE_URL}/pull/XYZ")
+        response = self.client.get("/pull/XYZ")
         self.assertEqual(response.status_code, 200)
-        model_number = response.json()["number"]
-        
+        model_number = response.json["number"]
+
         # Confirm the pulled number
-        response = requests.post(f"{BASE_URL}/confirm/XYZ/{model_number}")
+        response = self.client.post(f"/confirm/XYZ/{model_number}")
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.json()["status"], f"confirmed: SYS-{model_number:04}")
+        self.assertEqual(response.json["status"], "confirmed")
 
     def test_search(self):
         # Search for the confirmed number
-        response = requests.get(f"{BASE_URL}/search/XYZ/0001")
+        self.pull_and_confirm()
+        response = self.client.get("/search/XYZ/0001")
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.json()["status"], "confirmed")
+        self.assertEqual(response.json["status"], "confirmed")
 
     def test_release(self):
         # Release the confirmed number
-        response = requests.post(f"{BASE_URL}/release/XYZ/0001")
+        self.pull_and_confirm()
+        response = self.client.post("/release/XYZ/0001")
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.json()["status"], "released")
-        
+        self.assertEqual(response.json["status"], "released")
+
     # ... add more tests for other functionalities as required ...
 
 if __name__ == "__main__":
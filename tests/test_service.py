@@ -0,0 +1,1105 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+import io
+import json
+import os
+import pstats
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import model_numbering_backup
+import model_numbering_service as service
+from tests.support import TemporaryDatabaseTestCase
+
+
+class ServiceTestCase(TemporaryDatabaseTestCase):
+    """Runs the Flask app in-process against a throwaway database."""
+
+    def setUp(self):
+        super().setUp()
+        service.init_db()
+        self.client = service.app.test_client()
+        self.client.post("/add_model_type/SYS/Systems")
+
+
+class TestPull(ServiceTestCase):
+
+    def test_single_pull_keeps_response_shape(self):
+        response = self.client.get("/pull/SYS")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, {"number": 1})
+
+    def test_batch_pull_reuses_released_numbers_first(self):
+        numbers = self.client.get("/pull/SYS?count=5").json["numbers"]
+        self.assertEqual(numbers, [1, 2, 3, 4, 5])
+        for number in (4, 2):
+            self.client.post(f"/confirm/SYS/{number}")
+            self.client.post(f"/release/SYS/{number}")
+
+        response = self.client.post("/pull/SYS", json={"count": 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["numbers"], [2, 4, 6])
+
+    def test_batch_pull_rejects_bad_count(self):
+        self.assertEqual(self.client.get("/pull/SYS?count=0").status_code, 400)
+        self.assertEqual(self.client.get("/pull/SYS?count=abc").status_code, 400)
+        for body in ([1], {"count": True}, {"count": 2.7}, {"count": "3"}):
+            self.assertEqual(self.client.post("/pull/SYS", json=body).status_code, 400, body)
+        self.assertEqual(self.client.post("/pull/SYS", json={}).json, {"number": 1})
+
+    def test_pull_unknown_model_type(self):
+        response = self.client.get("/pull/NOPE?count=2")
+        self.assertEqual(response.status_code, 400)
+
+
+class TestConnectionPool(ServiceTestCase):
+
+    def test_connections_use_wal(self):
+        with service.get_db() as conn:
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+
+    def test_connections_are_reused(self):
+        with service.get_db() as first:
+            pass
+        with service.get_db() as second:
+            pass
+        self.assertIs(first, second)
+
+    def test_failed_block_rolls_back(self):
+        with self.assertRaises(RuntimeError):
+            with service.get_db() as conn:
+                conn.execute("UPDATE model_numbers SET latest_number=99")
+                raise RuntimeError
+        with service.get_db() as conn:
+            self.assertEqual(conn.execute("SELECT latest_number FROM model_numbers").fetchone()[0], 0)
+
+
+class TestMigrations(ServiceTestCase):
+
+    def test_new_database_is_at_latest_version(self):
+        with service.get_db() as conn:
+            self.assertEqual(service.schema_version(conn.cursor()), service.MIGRATIONS[-1][0])
+
+    def test_legacy_database_upgrades_in_place(self):
+        service.close_db()
+        os.remove(self.db_path)
+        with sqlite3.connect(self.db_path) as conn:
+            # Schema as created before migrations existed
+            conn.execute("CREATE TABLE model_numbers (id INTEGER PRIMARY KEY, model_type TEXT NOT NULL UNIQUE, "
+                         "description TEXT, latest_number INTEGER NOT NULL DEFAULT 0, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)")
+            conn.execute("CREATE TABLE model_details (id INTEGER PRIMARY KEY, model_type TEXT NOT NULL, model_number INTEGER NOT NULL, "
+                         "model_name TEXT, model_notes TEXT, status TEXT NOT NULL DEFAULT 'pulled', timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)")
+            conn.executemany("INSERT INTO model_details (model_type, model_number, model_name, status, timestamp) VALUES (?, ?, ?, ?, ?)",
+                             [("SYS", 1, "Radar", "pulled", "2023-08-10 12:00:00"), ("SYS", 1, None, "confirmed", "2023-08-10 12:00:00"),
+                              ("SYS", 2, None, "released", "2023-08-10 12:00:00"), ("SYS", 3, None, "pulled", "2023-08-10 12:00:00.500000")])
+
+        with self.assertLogs(service.app.logger, "WARNING") as logs:
+            service.init_db()
+        self.assertIn("Moved 1 duplicate model_details rows", logs.output[0])
+
+        with service.get_db() as conn:
+            rows = conn.execute("SELECT model_number, status FROM model_details ORDER BY model_number").fetchall()
+            self.assertEqual(rows, [(1, "confirmed"), (2, "released"), (3, "pulled")])
+            # The losing row is set aside, not deleted
+            self.assertEqual(conn.execute("SELECT id, model_number, model_name, status FROM model_details_duplicates").fetchall(),
+                             [(1, 1, "Radar", "pulled")])
+            with self.assertRaises(sqlite3.IntegrityError):
+                conn.execute("INSERT INTO model_details (model_type, model_number) VALUES ('SYS', 2)")
+            expires_at = conn.execute("SELECT expires_at FROM model_details WHERE model_number=3").fetchone()[0]
+            self.assertAlmostEqual(expires_at, 1691668800.5 + service.RELEASE_TIME, places=2)
+
+    def test_free_number_lookup_uses_index(self):
+        with service.get_db() as conn:
+            plan = conn.execute("EXPLAIN QUERY PLAN SELECT model_number FROM model_details "
+                                "WHERE model_type='SYS' AND status='released' ORDER BY model_number LIMIT 1").fetchall()
+        self.assertIn("USING COVERING INDEX", " ".join(row[-1] for row in plan))
+
+
+class TestFreeNumberIndex(ServiceTestCase):
+
+    def release_numbers(self, *numbers):
+        for number in numbers:
+            self.client.post(f"/confirm/SYS/{number}")
+            self.client.post(f"/release/SYS/{number}")
+
+    def test_released_numbers_are_served_from_memory(self):
+        self.client.get("/pull/SYS?count=4")
+        self.release_numbers(3, 1)
+        self.assertEqual(self.client.get("/verify_free_numbers").json["consistent"], True)
+        self.assertEqual(self.client.get("/pull/SYS").json["number"], 1)
+        self.assertEqual(self.client.get("/pull/SYS").json["number"], 3)
+        self.assertEqual(self.client.get("/pull/SYS").json["number"], 5)
+
+    def test_stale_entries_are_skipped_and_rebuild_recovers(self):
+        self.client.get("/pull/SYS?count=3")
+        self.release_numbers(1, 2)
+        # Simulate a change made behind the service's back
+        with service.get_db() as conn:
+            conn.execute("UPDATE model_details SET status='confirmed' WHERE model_number=1")
+            conn.execute("UPDATE model_details SET status='released' WHERE model_number=3")
+
+        report = self.client.get("/verify_free_numbers").json
+        self.assertEqual((report["missing"], report["stale"]), (["SYS-0003"], ["SYS-0001"]))
+        self.assertEqual(self.client.get("/pull/SYS").json["number"], 2)
+
+        self.client.post("/rebuild_free_numbers")
+        self.assertEqual(self.client.get("/pull/SYS").json["number"], 3)
+
+    def test_rolled_back_pull_returns_numbers_to_index(self):
+        self.client.get("/pull/SYS?count=2")
+        self.release_numbers(1)
+        with self.assertRaises(RuntimeError):
+            with service.get_db() as conn, service.write_transaction(conn) as cursor:
+                self.assertEqual(service.allocate_numbers(cursor, "SYS"), [1])
+                raise RuntimeError
+        self.assertEqual(self.client.get("/pull/SYS").json["number"], 1)
+
+
+class TestReaper(ServiceTestCase):
+
+    def status_of(self, number):
+        return self.client.get(f"/search/SYS/{number}").json["status"]
+
+    def test_releases_only_expired_numbers(self):
+        self.client.get("/pull/SYS?count=3")
+        self.client.post("/confirm/SYS/2")
+        deadline = time.time() + service.RELEASE_TIME
+
+        self.assertEqual(service.release_unconfirmed_numbers(now=deadline - 1)["released"], 0)
+        summary = service.release_unconfirmed_numbers(now=deadline + 1)
+
+        self.assertEqual(summary["released"], 2)
+        self.assertIsNone(summary["next_deadline"])
+        self.assertEqual([self.status_of(n) for n in (1, 2, 3)], ["released", "confirmed", "released"])
+        self.assertEqual(self.client.get("/pull/SYS").json["number"], 1)
+
+    def test_releases_in_bounded_batches(self):
+        self.client.get("/pull/SYS?count=5")
+        with mock.patch.object(service, "REAPER_BATCH_SIZE", 2):
+            summary = service.release_unconfirmed_numbers(now=time.time() + service.RELEASE_TIME + 1)
+        self.assertEqual((summary["released"], summary["batches"]), (5, 3))
+
+    def test_reports_next_deadline(self):
+        before = time.time()
+        self.client.get("/pull/SYS")
+        summary = service.release_unconfirmed_numbers()
+        self.assertEqual(summary["released"], 0)
+        self.assertGreaterEqual(summary["next_deadline"], before + service.RELEASE_TIME)
+
+
+class TestMetrics(ServiceTestCase):
+
+    def test_metrics_expose_routes_queries_and_gauges(self):
+        self.client.get("/pull/SYS?count=2")
+        self.client.post("/confirm/SYS/1")
+        service.release_unconfirmed_numbers()
+
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        body = response.get_data(as_text=True)
+        self.assertIn('modelnum_http_requests_total{route="/pull/<model_type>",method="GET",status="200"}', body)
+        self.assertIn('modelnum_http_request_duration_seconds_bucket{route="/confirm/<model_type>/<number>",le="+Inf"}', body)
+        self.assertIn('modelnum_db_query_duration_seconds_count{query="SELECT latest_number FROM model_numbers WHERE model_type=?"}', body)
+        self.assertIn("modelnum_reaper_run_duration_seconds_count", body)
+        self.assertIn('modelnum_model_numbers{model_type="SYS",status="confirmed"} 1', body)
+        self.assertIn('modelnum_model_numbers{model_type="SYS",status="pulled"} 1', body)
+
+
+class TestBulkEndpoints(ServiceTestCase):
+
+    def test_bulk_confirm_reports_each_item(self):
+        self.client.get("/pull/SYS?count=3")
+        self.client.post("/confirm/SYS/2")
+        items = [{"model_type": "SYS", "number": "0001"}, {"model_type": "SYS", "number": 2},
+                 {"model_type": "SYS", "number": 9}, {"model_type": "SYS", "number": 1}, {"number": 3}]
+
+        response = self.client.post("/bulk_confirm", json=items)
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json["results"]
+        self.assertEqual(results[0]["status"], "confirmed")
+        self.assertEqual(results[1]["error"], "Model SYS-2 is already confirmed.")
+        self.assertEqual(results[2]["code"], 404)
+        self.assertEqual(results[3]["code"], 400)  # Duplicate of the first item
+        self.assertEqual(results[4]["code"], 400)
+        self.assertEqual((response.json["succeeded"], response.json["failed"]), (1, 4))
+        self.assertEqual(self.client.get("/search/SYS/3").json["status"], "pulled")
+
+    def test_bulk_release_feeds_free_numbers(self):
+        self.client.get("/pull/SYS?count=3")
+        self.client.post("/bulk_confirm", json={"items": [{"model_type": "SYS", "number": n} for n in (1, 2, 3)]})
+        response = self.client.post("/bulk_release", json=[{"model_type": "SYS", "number": n} for n in (3, 1)])
+        self.assertEqual([r["status"] for r in response.json["results"]], ["released", "released"])
+        self.assertEqual(self.client.get("/pull/SYS?count=2").json["numbers"], [1, 3])
+
+    def test_bulk_edit(self):
+        self.client.get("/pull/SYS")
+        response = self.client.post("/bulk_edit_model_details", json=[
+            {"model_type": "SYS", "number": 1, "model_name": "Widget", "model_notes": "v1"},
+            {"model_type": "SYS", "number": 2, "model_name": "Gadget", "model_notes": "v1"},
+            {"model_type": "SYS", "number": 1, "model_name": "Widget"},
+        ])
+        self.assertEqual([r.get("code") for r in response.json["results"]], [None, 404, 400])
+        self.assertEqual(self.client.get("/search/SYS/1").json["model_name"], "Widget")
+
+    def test_bulk_rejects_non_list_body(self):
+        self.assertEqual(self.client.post("/bulk_confirm", json={"model_type": "SYS"}).status_code, 400)
+
+
+class TestListNumbers(ServiceTestCase):
+
+    def test_keyset_pagination_visits_every_row_once(self):
+        self.client.post("/add_model_type/ABC/Other")
+        self.client.get("/pull/SYS?count=5")
+        self.client.get("/pull/ABC?count=2")
+
+        seen = []
+        cursor = None
+        while True:
+            params = {"page_size": 3, **({"cursor": cursor} if cursor else {})}
+            page = self.client.get("/list_numbers", query_string=params).json
+            seen.extend((item["model_type"], item["model_number"]) for item in page["items"])
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(seen, [("ABC", 1), ("ABC", 2)] + [("SYS", n) for n in range(1, 6)])
+
+    def test_filters(self):
+        self.client.get("/pull/SYS?count=6")
+        self.client.post("/bulk_confirm", json=[{"model_type": "SYS", "number": n} for n in (2, 4, 5)])
+        page = self.client.get("/list_numbers?model_type=SYS&status=confirmed&min_number=3&page_size=1").json
+        self.assertEqual([item["model_number"] for item in page["items"]], [4])
+        page = self.client.get(f"/list_numbers?model_type=SYS&status=confirmed&cursor={page['next_cursor']}").json
+        self.assertEqual([item["model_number"] for item in page["items"]], [5])
+        self.assertIsNone(page["next_cursor"])
+
+        self.assertEqual(self.client.get("/list_numbers?since=2999-01-01T00:00:00").json["items"], [])
+        self.assertEqual(len(self.client.get("/list_numbers?until=2999-01-01T00:00:00Z").json["items"]), 6)
+
+    def test_time_filters_convert_offsets_to_utc(self):
+        self.client.get("/pull/SYS?count=2")
+        with service.get_db() as conn:
+            conn.execute("UPDATE model_details SET timestamp = '2024-01-01 00:30:00' WHERE model_number = 1")
+            conn.execute("UPDATE model_details SET timestamp = '2024-01-01 01:30:00' WHERE model_number = 2")
+        # 02:00+02:00 is 00:00 UTC and 03:00+02:00 is 01:00 UTC
+        items = self.client.get("/list_numbers", query_string={"since": "2024-01-01T02:00:00+02:00",
+                                                               "until": "2024-01-01T03:00:00+02:00"}).json["items"]
+        self.assertEqual([item["model_number"] for item in items], [1])
+
+    def test_rejects_bad_arguments(self):
+        self.assertEqual(self.client.get("/list_numbers?page_size=0").status_code, 400)
+        self.assertEqual(self.client.get("/list_numbers?cursor=nonsense").status_code, 400)
+        self.assertEqual(self.client.get("/list_numbers?since=yesterday").status_code, 400)
+
+
+class TestExportImport(ServiceTestCase):
+
+    def populate(self):
+        self.client.get("/pull/SYS?count=3")
+        self.client.post("/bulk_confirm", json=[{"model_type": "SYS", "number": n} for n in (1, 2)])
+        self.client.post("/release/SYS/2")
+        self.client.post("/edit_model_details/SYS-1", json={"model_name": "Widget, large", "model_notes": "line 1\nline 2"})
+
+    def round_trip(self, export_format):
+        self.populate()
+        exported = self.client.get(f"/export?format={export_format}").get_data()
+
+        # Load the export into an empty registry
+        service.close_db()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + suffix):
+                os.remove(self.db_path + suffix)
+        service.init_db()
+        response = self.client.post(f"/import?format={export_format}", data=exported)
+        self.assertEqual(response.status_code, 200, response.json)
+        self.assertEqual(response.json["rows"], {"model_numbers": 1, "model_details": 3})
+
+        self.assertEqual(self.client.get("/search/SYS/1").json["model_notes"], "line 1\nline 2")
+        self.assertEqual(self.client.get("/search/SYS/2").json["status"], "released")
+        self.assertEqual(self.client.get("/pull/SYS?count=2").json["numbers"], [2, 4])
+
+    def test_ndjson_round_trip(self):
+        self.round_trip("ndjson")
+
+    def test_csv_round_trip(self):
+        self.round_trip("csv")
+
+    def test_import_creates_types_and_advances_latest_number(self):
+        body = "\n".join([
+            '{"table": "model_details", "model_type": "NEW", "model_number": 7, "status": "confirmed"}',
+            '{"table": "model_details", "model_type": "SYS", "model_number": 40, "status": "released"}',
+        ])
+        response = self.client.post("/import", data=body)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get("/pull/NEW").json["number"], 8)
+        self.assertEqual(self.client.get("/pull/SYS").json["number"], 40)
+
+    def test_import_rejects_unknown_table(self):
+        response = self.client.post("/import", data='{"table": "users"}\n')
+        self.assertEqual(response.status_code, 400)
+        for body in ('"x"\n', '[1, 2]\n'):
+            response = self.client.post("/import", data=body)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("Record 1: expected a JSON object", response.json["error"])
+
+    def test_import_wakes_reaper_for_expired_numbers(self):
+        scheduler = mock.Mock()
+        body = '{"table": "model_details", "model_type": "SYS", "model_number": 3, "status": "pulled", "expires_at": 100}\n'
+        with mock.patch.object(service, "scheduler", scheduler), mock.patch.object(service, "_reaper_wake", None):
+            self.assertEqual(self.client.post("/import", data=body).status_code, 200)
+        self.assertEqual(scheduler.modify_job.call_args.kwargs["next_run_time"].timestamp(), 100)
+
+    def test_failed_import_keeps_committed_chunks_consistent(self):
+        good = [json.dumps({"table": "model_details", "model_type": "SYS", "model_number": n, "status": "confirmed"})
+                for n in range(1, 5)]
+        bad = json.dumps({"table": "model_details", "model_type": "SYS", "model_number": 9, "status": "lost"})
+        with mock.patch.object(service, "IMPORT_BATCH_SIZE", 2):
+            response = self.client.post("/import", data="\n".join(good + [bad]))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("status must be one of", response.json["error"])
+        self.assertEqual(self.client.get("/search/SYS/4").json["status"], "confirmed")
+        self.assertEqual(self.client.get("/search/SYS/9").status_code, 404)
+        self.assertEqual(self.client.get("/pull/SYS").json["number"], 5)
+
+
+class TestFind(ServiceTestCase):
+
+    def edit(self, number, name, notes):
+        self.client.post(f"/edit_model_details/SYS-{number}", json={"model_name": name, "model_notes": notes})
+
+    def test_ranked_filtered_search(self):
+        self.client.get("/pull/SYS?count=4")
+        self.edit(1, "Hydraulic pump", "Main landing gear")
+        self.edit(2, "Fuel valve", "Feeds the hydraulic pump")
+        self.edit(3, "Pump housing", "Cast aluminium")
+        self.client.post("/confirm/SYS/3")
+
+        results = self.client.get("/find?q=hydraulic pump").json["results"]
+        self.assertEqual([r["model_number"] for r in results], [1, 2])
+
+        results = self.client.get("/find?q=pum&status=confirmed").json["results"]
+        self.assertEqual([r["model_number"] for r in results], [3])
+        self.assertIn("[Pump]", results[0]["snippet"])
+
+    def test_index_follows_edits_and_pagination(self):
+        self.client.get("/pull/SYS?count=3")
+        for number in (1, 2, 3):
+            self.edit(number, f"Bracket {number}", "steel")
+        self.edit(2, "Bolt", "titanium")
+
+        self.assertEqual(self.client.get("/find?q=steel&page_size=5").json["next_page"], None)
+        page = self.client.get("/find?q=steel&page_size=1").json
+        self.assertEqual((len(page["results"]), page["next_page"]), (1, 2))
+        self.assertEqual(len(self.client.get("/find?q=steel&page=2&page_size=1").json["results"]), 1)
+        self.assertEqual(self.client.get("/find?q=steel&page=3&page_size=1").json["results"], [])
+        self.assertEqual([r["model_number"] for r in self.client.get("/find?q=titanium").json["results"]], [2])
+        with service.get_db() as conn:
+            # Raises if the index has drifted from model_details
+            conn.execute("INSERT INTO model_details_fts (model_details_fts, rank) VALUES ('integrity-check', 1)")
+
+    def test_archived_matches_ranked_after_live_ones(self):
+        self.client.get("/pull/SYS?count=2")
+        self.edit(1, "Pump", "Pump pump pump")
+        self.edit(2, "Valve", "Next to the pump")
+        self.client.post("/confirm/SYS/1")
+        service.archive_confirmed_numbers(older_than=-60)
+        results = self.client.get("/find?q=pump").json["results"]
+        self.assertEqual([r["model_number"] for r in results], [2, 1])
+
+    def test_requires_query(self):
+        self.assertEqual(self.client.get("/find?q=").status_code, 400)
+
+
+class TestReaperLease(ServiceTestCase):
+
+    def test_only_one_holder_until_expiry(self):
+        now = time.time()
+        with service.get_db() as conn:
+            conn.execute("INSERT INTO service_leases VALUES ('reaper', 'other-host:1', ?)", (now + 30,))
+        self.assertIsNone(service.acquire_lease("reaper", ttl=30, now=now))
+        # Failover once the other holder stops renewing
+        self.assertEqual(service.acquire_lease("reaper", ttl=30, now=now + 31), now + 61)
+        self.assertEqual(service.acquire_lease("reaper", ttl=30, now=now + 40), now + 70)
+
+        service.release_lease("reaper")
+        with service.get_db() as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM service_leases").fetchone()[0], 0)
+
+    def test_reaper_job_runs_only_on_leader(self):
+        self.client.get("/pull/SYS")
+        with service.get_db() as conn:
+            conn.execute("UPDATE model_details SET expires_at = 0")
+            conn.execute("INSERT INTO service_leases VALUES ('reaper', 'other-host:1', ?)", (time.time() + 30,))
+
+        service.reaper_lease_job()
+        service.reaper_job()
+        self.assertEqual(self.client.get("/search/SYS/1").json["status"], "pulled")
+
+        with service.get_db() as conn:
+            conn.execute("UPDATE service_leases SET expires_at = 0")
+        try:
+            service.reaper_lease_job()
+            self.assertTrue(service.is_reaper_leader())
+            service.reaper_job()
+        finally:
+            service._reaper_lease_until = 0.0
+        self.assertEqual(self.client.get("/search/SYS/1").json["status"], "released")
+
+    def test_new_leader_wakes_for_expired_numbers(self):
+        self.client.get("/pull/SYS")
+        with service.get_db() as conn:
+            conn.execute("UPDATE model_details SET expires_at = 0")
+            conn.execute("INSERT INTO service_leases VALUES ('reaper', 'other-host:1', ?)", (time.time() + 30,))
+        scheduler = mock.Mock()
+        with mock.patch.object(service, "scheduler", scheduler), mock.patch.object(service, "_reaper_wake", None):
+            # A wake-up that came due while another process held the lease
+            service.wake_reaper_at(time.time() - 1)
+            service.reaper_lease_job()
+            service.reaper_job()
+            scheduler.modify_job.reset_mock()
+
+            with service.get_db() as conn:
+                conn.execute("UPDATE service_leases SET expires_at = 0")
+            try:
+                service.reaper_lease_job()
+                scheduler.modify_job.assert_called_once()
+            finally:
+                service._reaper_lease_until = 0.0
+
+
+class TestBlockAllocation(ServiceTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(service, "BLOCK_SIZE", 10)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        super().setUp()
+
+    def tearDown(self):
+        service.block_allocator._blocks = {}
+        super().tearDown()
+
+    def blocks(self):
+        with service.get_db() as conn:
+            return conn.execute("SELECT holder, start_number, end_number FROM number_blocks ORDER BY id").fetchall()
+
+    def test_pulls_come_from_a_leased_block(self):
+        self.assertEqual(self.client.get("/pull/SYS?count=3").json["numbers"], [1, 2, 3])
+        self.assertEqual(self.client.get("/pull/SYS").json, {"number": 4})
+        with service.get_db() as conn:
+            self.assertEqual(conn.execute("SELECT latest_number FROM model_numbers").fetchone()[0], 10)
+        self.assertEqual(self.blocks(), [(service.node_id(), 1, 10)])
+
+        # A pull larger than what is left leases a second block
+        self.assertEqual(self.client.get("/pull/SYS?count=8").json["numbers"], list(range(5, 13)))
+        self.assertEqual(self.blocks(), [(service.node_id(), 11, 20)])
+        self.assertEqual(self.client.get("/search/SYS/12").json["status"], "pulled")
+        self.assertEqual(self.client.get("/pull/NOPE").status_code, 400)
+
+    def test_unused_numbers_are_returned(self):
+        self.client.get("/pull/SYS?count=3")
+        service.block_allocator.return_unused()
+        self.assertEqual(self.blocks(), [])
+        self.assertEqual(self.client.get("/search/SYS/10").json["status"], "released")
+        self.assertEqual(self.client.get("/pull/SYS?count=2").json["numbers"], [4, 5])
+
+    def test_reaper_reclaims_expired_blocks(self):
+        self.client.get("/pull/SYS?count=3")
+        with service.get_db() as conn:
+            conn.execute("UPDATE number_blocks SET expires_at = 0")
+        summary = service.release_unconfirmed_numbers(now=time.time())
+        self.assertEqual(summary["reclaimed_blocks"], 1)
+        self.assertEqual(self.client.get("/search/SYS/3").json["status"], "pulled")
+        self.assertEqual(self.client.get("/search/SYS/4").json["status"], "released")
+
+        # The reclaimed block is not handed out again; released numbers come first
+        self.assertEqual(self.client.get("/pull/SYS?count=8").json["numbers"], list(range(4, 12)))
+        self.assertEqual(self.blocks(), [(service.node_id(), 11, 20)])
+
+    def test_rolled_back_pull_keeps_block_state(self):
+        self.client.get("/pull/SYS")
+        with service.get_db() as conn:
+            with self.assertRaises(RuntimeError):
+                with service.write_transaction(conn) as cursor:
+                    service.allocate_numbers(cursor, "SYS", 20)
+                    raise RuntimeError("abort")
+        self.assertEqual(self.blocks(), [(service.node_id(), 1, 10)])
+        self.assertEqual(self.client.get("/pull/SYS").json, {"number": 2})
+
+
+class TestGroupCommit(ServiceTestCase):
+
+    def setUp(self):
+        for name, value in (("GROUP_COMMIT", True), ("GROUP_COMMIT_WINDOW", 0.05)):
+            patcher = mock.patch.object(service, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        super().setUp()
+
+    def tearDown(self):
+        service.group_writer.stop()
+        super().tearDown()
+
+    def test_concurrent_writes_share_a_commit(self):
+        batches_before = service.GROUP_COMMIT_BATCH_SIZE._series.get((), [None, 0, 0])[2]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            responses = list(pool.map(lambda _: service.app.test_client().get("/pull/SYS"), range(8)))
+        self.assertEqual(sorted(response.json["number"] for response in responses), list(range(1, 9)))
+        batches = service.GROUP_COMMIT_BATCH_SIZE._series[()][2] - batches_before
+        self.assertLess(batches, 8)
+
+        self.assertEqual(self.client.post("/confirm/SYS/3").json, {"status": "confirmed"})
+        self.assertEqual(self.client.post("/confirm/SYS/3").status_code, 400)
+        self.assertEqual(self.client.post("/release/SYS/3").json, {"status": "released"})
+        self.assertEqual(self.client.post("/release/SYS/99").status_code, 404)
+        self.assertEqual(self.client.get("/pull/SYS").json, {"number": 3})
+
+    def test_failed_write_does_not_affect_its_batch(self):
+        def failing(cursor):
+            cursor.execute("UPDATE model_numbers SET description='changed'")
+            raise ValueError("bad write")
+
+        failed = service.group_writer.submit(failing)
+        pulled = service.group_writer.submit(lambda cursor: service.allocate_numbers(cursor, "SYS", 2))
+        self.assertEqual(pulled.result(), [1, 2])
+        with self.assertRaises(ValueError):
+            failed.result()
+        self.assertEqual(self.client.get("/list_model_types").json["model_types"],
+                         [{"type": "SYS", "description": "Systems"}])
+
+
+class TestEvents(ServiceTestCase):
+
+    def events(self, query=""):
+        return self.client.get(f"/events{query}").json
+
+    def test_transitions_are_logged(self):
+        self.client.get("/pull/SYS?count=2")
+        self.client.post("/confirm/SYS/1")
+        self.client.post("/release/SYS/1")
+        self.client.post("/edit_model_details/SYS-2", json={"model_name": "Radar", "model_notes": "Bench"})
+        with service.get_db() as conn:
+            conn.execute("UPDATE model_details SET expires_at = 0 WHERE model_number = 2")
+        service.release_unconfirmed_numbers()
+
+        page = self.events()
+        self.assertEqual([(event["model_number"], event["event"], event["previous_status"]) for event in page["events"]], [
+            (1, "pulled", None), (2, "pulled", None), (1, "confirmed", "pulled"),
+            (1, "released", "confirmed"), (2, "edited", "pulled"), (2, "released", "pulled")])
+        self.assertEqual(page["last_id"], page["events"][-1]["id"])
+
+        # Resume after the last event seen, filtered by model type
+        self.client.post("/add_model_type/HW/Hardware")
+        self.client.get("/pull/HW")
+        self.client.get("/pull/SYS")
+        resumed = self.events(f"?since={page['last_id']}&model_type=SYS")
+        self.assertEqual([(event["model_number"], event["event"]) for event in resumed["events"]], [(1, "pulled")])
+        self.assertEqual(self.events(f"?since={resumed['last_id']}&model_type=SYS"),
+                         {"events": [], "last_id": resumed["last_id"]})
+        self.assertEqual(self.events("?since=latest"), {"events": [], "last_id": resumed["last_id"]})
+        self.assertEqual(self.client.get("/events?limit=0").status_code, 400)
+
+    def test_long_poll_wakes_on_commit(self):
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            waiting = pool.submit(lambda: service.app.test_client().get("/events?wait=5").json)
+            time.sleep(0.2)
+            started = time.monotonic()
+            self.client.get("/pull/SYS")
+            page = waiting.result()
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual([event["event"] for event in page["events"]], ["pulled"])
+
+    def test_event_stream(self):
+        self.client.get("/pull/SYS")
+        response = self.client.get("/events", headers={"Accept": "text/event-stream", "Last-Event-ID": "0"})
+        self.assertEqual(response.mimetype, "text/event-stream")
+        chunks = response.response
+        self.assertEqual(next(chunks), b"retry: 3000\n\n")
+        self.assertTrue(next(chunks).startswith(b"id: 1\nevent: pulled\ndata: {"))
+        response.close()
+
+
+class TestStats(ServiceTestCase):
+
+    def sys_stats(self):
+        return self.client.get("/stats?model_type=SYS").json["model_types"][0]
+
+    def test_counters_follow_every_transition(self):
+        self.client.get("/pull/SYS?count=5")
+        self.client.post("/bulk_confirm", json=[{"model_type": "SYS", "number": n} for n in (1, 2, 3)])
+        self.client.post("/release/SYS/3")
+        with service.get_db() as conn:
+            conn.execute("UPDATE model_details SET expires_at = 0 WHERE model_number = 5")
+        service.release_unconfirmed_numbers()
+        self.client.get("/pull/SYS")
+
+        stats = self.sys_stats()
+        self.assertEqual({key: stats[key] for key in ("pulled", "confirmed", "released", "total", "latest_number")},
+                         {"pulled": 2, "confirmed": 2, "released": 1, "total": 5, "latest_number": 5})
+        self.assertEqual(stats["available"], 1 + service.NUMBER_SPACE - 5)
+        self.assertEqual(self.client.get("/verify_stats").json, {"consistent": True, "drift": []})
+
+        self.client.post("/add_model_type/HW/Hardware")
+        self.assertEqual([entry["type"] for entry in self.client.get("/stats").json["model_types"]], ["HW", "SYS"])
+        self.assertEqual(self.client.get("/stats?model_type=NOPE").status_code, 404)
+
+    def test_verify_and_rebuild_drift(self):
+        self.client.get("/pull/SYS?count=3")
+        with service.get_db() as conn:
+            conn.execute("UPDATE status_counts SET count = 7 WHERE status = 'pulled'")
+        self.assertEqual(self.client.get("/verify_stats").json["drift"],
+                         [{"model_type": "SYS", "status": "pulled", "counted": 7, "actual": 3}])
+        self.client.post("/rebuild_stats")
+        self.assertTrue(self.client.get("/verify_stats").json["consistent"])
+        self.assertEqual(self.sys_stats()["pulled"], 3)
+
+
+class TestReadCache(ServiceTestCase):
+
+    def hits(self, namespace):
+        return service.READ_CACHE_REQUESTS._values.get((namespace, "hit"), 0)
+
+    def test_search_served_from_cache_until_a_write(self):
+        self.client.get("/pull/SYS")
+        first = self.client.get("/search/SYS/1")
+        hits = self.hits("numbers")
+        second = self.client.get("/search/SYS/1")
+        self.assertEqual(self.hits("numbers"), hits + 1)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second.headers["ETag"], first.headers["ETag"])
+
+        self.client.post("/confirm/SYS/1")
+        third = self.client.get("/search/SYS/1")
+        self.assertEqual(third.json["status"], "confirmed")
+        self.assertNotEqual(third.headers["ETag"], first.headers["ETag"])
+
+    def test_conditional_requests(self):
+        response = self.client.get("/list_model_types")
+        etag = response.headers["ETag"]
+        self.assertTrue(etag.startswith('"'))  # Strong validator
+        not_modified = self.client.get("/list_model_types", headers={"If-None-Match": etag})
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.data, b"")
+
+        self.client.post("/add_model_type/HW/Hardware")
+        changed = self.client.get("/list_model_types", headers={"If-None-Match": etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(len(changed.json["model_types"]), 2)
+
+        # Misses are cached but carry no validator
+        self.assertNotIn("ETag", self.client.get("/search/SYS/9").headers)
+
+    def test_lru_eviction_and_stale_fill(self):
+        cache = service.ReadCache(2)
+        cache.get("numbers", "warm")  # Binds the cache to the current database
+        for key in ("a", "b", "c"):
+            cache.put("numbers", key, cache.version("numbers"), key)
+        self.assertEqual([cache.get("numbers", key) for key in ("a", "b", "c")], [None, "b", "c"])
+
+        version = cache.version("numbers")
+        cache.invalidate("numbers")
+        cache.put("numbers", "d", version, "d")
+        self.assertIsNone(cache.get("numbers", "d"))
+        self.assertIsNone(cache.get("numbers", "b"))
+
+    def test_undeclared_worker_processes_turn_off_per_process_state(self):
+        with mock.patch.object(service, "read_cache", service.ReadCache(8)), \
+                mock.patch.object(service, "FREE_NUMBER_INDEX", True):
+            with mock.patch.dict(os.environ, {"WEB_CONCURRENCY": "4"}), self.assertLogs(service.app.logger, "WARNING"):
+                service.initialize()
+            self.assertEqual(service.read_cache.size, 0)
+            self.assertFalse(service.FREE_NUMBER_INDEX)
+
+        with mock.patch.object(service, "read_cache", service.ReadCache(8)), \
+                mock.patch.object(service, "FREE_NUMBER_INDEX", True):
+            self.client.get("/search/SYS/1")
+            self.assertTrue(service.read_cache._entries)
+            self.client.get("/search/SYS/1", environ_overrides={"wsgi.multiprocess": True})
+            self.assertEqual((service.read_cache.size, service.read_cache._entries), (0, {}))
+            self.assertFalse(service.FREE_NUMBER_INDEX)
+
+
+class TestAdmissionControl(ServiceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(service, "rate_limiter", service.TokenBuckets())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_token_bucket_refills_at_rate(self):
+        buckets = service.TokenBuckets()
+        self.assertEqual([buckets.take("a", 2, 2, now=0) for _ in range(3)], [0, 0, 0.5])
+        self.assertEqual(buckets.take("a", 2, 2, now=0.5), 0)
+        self.assertEqual(buckets.take("b", 2, 2, now=0.5), 0)  # Buckets are per key
+
+    def search_from(self, address, **headers):
+        return self.client.get("/search/SYS/1", headers=headers, environ_base={"REMOTE_ADDR": address})
+
+    def test_clients_are_limited_separately(self):
+        rejected = service.REJECTED_REQUESTS._values.get(("/search/<model_type>/<number>", "rate_limit"), 0)
+        with mock.patch.object(service, "RATE_LIMIT", 0.5), mock.patch.object(service, "RATE_LIMIT_BURST", 2):
+            statuses = [self.search_from("10.0.0.1").status_code for _ in range(3)]
+            self.assertEqual(statuses, [404, 404, 429])
+            response = self.search_from("10.0.0.1")
+            self.assertEqual(response.headers["Retry-After"], "2")
+            self.assertIn("Rate limit exceeded", response.json["error"])
+            self.assertEqual(self.search_from("10.0.0.2").status_code, 404)
+        self.assertEqual(service.REJECTED_REQUESTS._values[("/search/<model_type>/<number>", "rate_limit")], rejected + 2)
+
+    def test_client_headers_are_trusted_only_when_configured(self):
+        with mock.patch.object(service, "RATE_LIMIT", 0.5), mock.patch.object(service, "RATE_LIMIT_BURST", 1):
+            self.assertEqual(self.search_from("10.0.0.1", **{"X-Client-ID": "a"}).status_code, 404)
+            # A new header value does not buy a new bucket
+            self.assertEqual(self.search_from("10.0.0.1", **{"X-Client-ID": "b"}).status_code, 429)
+            with mock.patch.object(service, "RATE_LIMIT_CLIENT_HEADER", "X-Real-IP"):
+                self.assertEqual(self.search_from("10.0.0.9", **{"X-Real-IP": "192.0.2.1"}).status_code, 404)
+                self.assertEqual(self.search_from("10.0.0.9", **{"X-Real-IP": "192.0.2.1"}).status_code, 429)
+                self.assertEqual(self.search_from("10.0.0.9", **{"X-Real-IP": "192.0.2.2"}).status_code, 404)
+
+    def test_route_limits(self):
+        with mock.patch.object(service, "ROUTE_RATE_LIMITS", {"/pull/<model_type>": (1, 1)}):
+            self.assertEqual(self.client.get("/pull/SYS").status_code, 200)
+            self.assertEqual(self.client.get("/pull/SYS").status_code, 429)
+            # Other routes keep the default, which is no limit
+            self.assertEqual(self.client.post("/confirm/SYS/1").status_code, 200)
+
+    def test_writes_beyond_the_cap_are_turned_away(self):
+        with mock.patch.object(service, "write_gate", service.WriteGate(1, 1, 0.3)):
+            self.client.get("/pull/SYS")
+            self.assertTrue(service.write_gate.enter())  # Another write holds the only slot
+            response = self.client.post("/confirm/SYS/1")
+            self.assertEqual((response.status_code, response.headers["Retry-After"]), (429, "1"))
+            self.assertEqual(self.client.get("/search/SYS/1").status_code, 200)  # Reads are not gated
+
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                queued = pool.submit(self.client.post, "/confirm/SYS/1")
+                while not service.write_gate.waiting:
+                    time.sleep(0.005)
+                self.assertFalse(service.write_gate.enter())  # The queue is full
+                self.assertEqual(queued.result().status_code, 429)  # Timed out waiting
+
+            service.write_gate.exit()
+            self.assertEqual(self.client.post("/confirm/SYS/1").status_code, 200)
+            self.assertEqual(service.write_gate.in_flight, 0)
+
+
+class TestBackups(ServiceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.backup_dir = tempfile.mkdtemp()
+        for name, value in (("BACKUP_DIR", self.backup_dir), ("BACKUP_KEEP", 2), ("BACKUP_STEP_PAGES", 4)):
+            patcher = mock.patch.object(service, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(self.backup_dir)
+        if os.path.exists(self.db_path + ".pre-restore"):
+            os.remove(self.db_path + ".pre-restore")
+
+    def test_backup_verify_and_restore(self):
+        self.client.get("/pull/SYS?count=3")
+        self.client.post("/confirm/SYS/1")
+        response = self.client.post("/backup")
+        self.assertEqual(response.status_code, 200)
+        snapshot = response.json["file"]
+        self.assertGreater(response.json["pages"], 0)
+        self.assertLess(response.json["compressed_bytes"], response.json["bytes"])
+        self.assertEqual(self.client.get("/backups").json["backups"][0]["file"], snapshot)
+        verified = service.verify_backup(snapshot)
+        self.assertEqual((verified["ok"], verified["numbers"], verified["model_types"]), (True, 3, 1))
+
+        self.client.get("/pull/SYS?count=5")
+        service.close_db()
+        output = io.StringIO()
+        with redirect_stdout(output):
+            self.assertEqual(model_numbering_backup.main(["--database", self.db_path, "restore", snapshot]), 0)
+        self.assertEqual(json.loads(output.getvalue())["restored"], self.db_path)
+        self.assertTrue(os.path.exists(self.db_path + ".pre-restore"))
+        self.assertEqual(self.client.get("/search/SYS/1").json["status"], "confirmed")
+        self.assertEqual(self.client.get("/search/SYS/4").status_code, 404)
+
+    def test_rotation_and_damaged_snapshots(self):
+        for _ in range(3):
+            service.run_backup()
+        snapshots = service.backup_files()
+        self.assertEqual(len(snapshots), 2)
+        with open(snapshots[0], "r+b") as damaged:
+            damaged.seek(20)
+            damaged.write(b"\0" * 64)
+        self.assertFalse(service.verify_backup(snapshots[0])["ok"])
+        with self.assertRaises(ValueError):
+            service.restore_backup(snapshots[0])
+        self.assertTrue(service.verify_backup(snapshots[1])["ok"])
+
+    def test_copy_falls_back_to_one_step_under_constant_writes(self):
+        self.client.get("/pull/SYS?count=2000")
+        pause = time.sleep
+
+        def write_between_steps(seconds):
+            # Another connection writes during every pause, so each step restarts the copy
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute("UPDATE model_details SET model_notes = ? WHERE model_number = 1", (str(time.time()),))
+            pause(seconds)
+
+        with mock.patch.object(service, "BACKUP_MAX_RESTARTS", 2), \
+                mock.patch.object(service.time, "sleep", side_effect=write_between_steps):
+            summary = service.run_backup()
+        self.assertEqual(summary["restarts"], 2)
+        self.assertTrue(service.verify_backup(summary["file"])["ok"])
+
+    def test_one_backup_at_a_time(self):
+        with service._backup_lock:
+            self.assertEqual(self.client.post("/backup").status_code, 409)
+
+
+class TestArchive(ServiceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.get("/pull/SYS?count=5")
+        self.client.post("/bulk_confirm", json=[{"model_type": "SYS", "number": n} for n in (1, 2, 3, 4)])
+        self.client.post("/edit_model_details/SYS-2", json={"model_name": "Radar", "model_notes": "Long range"})
+        with service.get_db() as conn:
+            # 1-3 are confirmed and old, 4 is recent and 5 is old but only pulled
+            conn.execute("UPDATE model_details SET timestamp = '2020-01-01 00:00:00' WHERE model_number IN (1, 2, 3, 5)")
+
+    def hot_numbers(self):
+        with service.get_db() as conn:
+            return [row[0] for row in conn.execute("SELECT model_number FROM model_details ORDER BY model_number")]
+
+    def test_old_confirmed_numbers_move_but_stay_readable(self):
+        self.assertEqual(self.client.post("/archive").status_code, 400)
+        response = self.client.post("/archive?older_than=86400")
+        self.assertEqual(response.json["archived"], 3)
+        self.assertEqual(self.hot_numbers(), [4, 5])
+
+        self.assertEqual(self.client.get("/search/SYS/2").json["model_name"], "Radar")
+        numbers, cursor = [], None
+        while True:
+            page = self.client.get("/list_numbers", query_string={"page_size": 2, **({"cursor": cursor} if cursor else {})}).json
+            numbers += [item["model_number"] for item in page["items"]]
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(numbers, [1, 2, 3, 4, 5])
+        confirmed = self.client.get("/list_numbers?status=confirmed&min_number=2").json["items"]
+        self.assertEqual([item["model_number"] for item in confirmed], [2, 3, 4])
+        self.assertEqual(self.client.get("/stats?model_type=SYS").json["model_types"][0]["confirmed"], 4)
+        self.assertTrue(self.client.get("/verify_stats").json["consistent"])
+        self.assertEqual([result["model_number"] for result in self.client.get("/find?q=radar").json["results"]], [2])
+
+    def test_export_import_round_trip(self):
+        service.archive_confirmed_numbers(86400)
+        exported = self.client.get("/export").get_data()
+        self.assertEqual(exported.count(b'"table":"model_details"'), 5)
+        self.assertEqual(self.client.post("/import", data=exported).status_code, 200)
+        with service.get_db() as conn:
+            total = conn.execute("SELECT (SELECT COUNT(*) FROM model_details) + (SELECT COUNT(*) FROM model_details_archive)").fetchone()[0]
+        self.assertEqual(total, 5)
+        self.assertEqual(self.client.get("/search/SYS/2").json["status"], "confirmed")
+        self.assertTrue(self.client.get("/verify_stats").json["consistent"])
+
+    def test_changes_move_numbers_back(self):
+        service.archive_confirmed_numbers(86400)
+        self.assertEqual(self.client.post("/confirm/SYS/1").status_code, 400)
+        self.assertEqual(self.client.post("/release/SYS/1").json["status"], "released")
+        self.assertEqual(self.client.get("/pull/SYS").json["number"], 1)
+        self.client.post("/edit_model_details/SYS-3", json={"model_name": "Sonar", "model_notes": "Short range"})
+        self.assertEqual(self.client.get("/search/SYS/3").json["model_name"], "Sonar")
+        results = self.client.post("/bulk_release", json=[{"model_type": "SYS", "number": 2}]).json["results"]
+        self.assertEqual(results[0]["status"], "released")
+        self.assertEqual(self.hot_numbers(), [1, 2, 3, 4, 5])
+        self.assertTrue(self.client.get("/verify_stats").json["consistent"])
+
+    def test_bulk_confirm_leaves_archived_numbers_alone(self):
+        service.archive_confirmed_numbers(86400)
+        response = self.client.post("/bulk_confirm", json=[{"model_type": "SYS", "number": n} for n in (1, 5)])
+        self.assertEqual([result.get("code") for result in response.json["results"]], [400, None])
+        self.assertIn("already confirmed", response.json["results"][0]["error"])
+        self.assertEqual(self.hot_numbers(), [4, 5])
+
+    def test_returned_blocks_skip_archived_numbers(self):
+        service.archive_confirmed_numbers(86400)
+        with service.get_db() as conn, service.write_transaction(conn) as cursor:
+            service._release_block_range(cursor, 0, "SYS", 1, 7)
+        self.assertEqual(self.hot_numbers(), [4, 5, 6, 7])
+        self.assertEqual(self.client.get("/search/SYS/1").json["status"], "confirmed")
+
+    def test_archive_job_runs_only_on_leader(self):
+        with mock.patch.object(service, "ARCHIVE_AFTER", 86400), \
+                mock.patch.object(service, "is_reaper_leader", return_value=False):
+            service.archive_job()
+        self.assertEqual(self.hot_numbers(), [1, 2, 3, 4, 5])
+        with mock.patch.object(service, "ARCHIVE_AFTER", 86400), \
+                mock.patch.object(service, "is_reaper_leader", return_value=True):
+            service.archive_job()
+        self.assertEqual(self.hot_numbers(), [4, 5])
+
+
+class TestProfiling(ServiceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.profile_dir = tempfile.mkdtemp()
+        for name, value in (("PROFILE_DIR", self.profile_dir), ("PROFILE_ALLOW_CLIENT", True)):
+            patcher = mock.patch.object(service, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client.get("/pull/SYS")
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(self.profile_dir)
+
+    def test_profiled_request_can_be_downloaded(self):
+        self.assertNotIn("X-Profile-ID", self.client.get("/list_numbers").headers)
+        self.assertEqual(service.profile_files(), [])
+
+        profile_id = self.client.get("/search/SYS/1", headers={"X-Profile": "1"}).headers["X-Profile-ID"]
+        summary = self.client.get("/profiles").json["profiles"][0]
+        self.assertEqual((summary["id"], summary["route"], summary["status"]), (profile_id, "/search/<model_type>/<number>", 200))
+        self.assertTrue(summary["cprofile"])
+        self.assertIn("sql", summary["breakdown_ms"])
+        self.assertTrue(any("model_details" in statement["sql"] for statement in summary["statements"]))
+
+        response = self.client.get(f"/profiles/{profile_id}")
+        with tempfile.NamedTemporaryFile(suffix=".prof", delete=False) as prof_file:
+            prof_file.write(response.get_data())
+        self.addCleanup(os.remove, prof_file.name)
+        self.assertGreater(pstats.Stats(prof_file.name).total_calls, 0)
+        self.assertIn("function calls", self.client.get(f"/profiles/{profile_id}?format=text").get_data(as_text=True))
+        self.assertEqual(self.client.get(f"/profiles/{profile_id}?format=json").json["id"], profile_id)
+        self.assertEqual(self.client.get("/profiles/..").status_code, 404)
+        self.assertEqual(self.client.get("/profiles/nope").status_code, 404)
+
+    def test_client_profiling_is_off_by_default(self):
+        with mock.patch.object(service, "PROFILE_ALLOW_CLIENT", False):
+            response = self.client.get("/search/SYS/1?profile=1", headers={"X-Profile": "1"})
+            self.assertNotIn("X-Profile-ID", response.headers)
+            self.assertEqual(self.client.get("/profiles").status_code, 403)
+            self.assertEqual(self.client.get("/profiles/anything").status_code, 403)
+            # Sampling is the operator's choice and still applies
+            with mock.patch.object(service, "PROFILE_SAMPLE_RATE", 1.0):
+                self.assertIn("X-Profile-ID", self.client.get("/search/SYS/1").headers)
+        self.assertEqual(len(service.profile_files()), 1)
+
+    def test_sampling_and_rotation(self):
+        with mock.patch.object(service, "PROFILE_SAMPLE_RATE", 1.0), mock.patch.object(service, "PROFILE_KEEP", 2):
+            ids = [self.client.get("/search/SYS/1").headers["X-Profile-ID"] for _ in range(3)]
+            ids.append(self.client.get("/list_numbers?profile=1").headers["X-Profile-ID"])
+        self.assertEqual([summary["id"] for summary in self.client.get("/profiles").json["profiles"]], ids[:1:-1])
+        self.assertEqual(len(os.listdir(self.profile_dir)), 4)
+
+    def test_only_one_request_holds_the_profiler(self):
+        with service._profiler_lock:
+            profile_id = self.client.get("/search/SYS/1?profile=1").headers["X-Profile-ID"]
+        self.assertFalse(self.client.get(f"/profiles/{profile_id}?format=json").json["cprofile"])
+        self.assertEqual(self.client.get(f"/profiles/{profile_id}").status_code, 404)
+        self.assertFalse(service._profiler_lock.locked())
+
+    def test_slow_requests_are_logged(self):
+        with mock.patch.object(service, "SLOW_REQUEST_THRESHOLD", 1e-9), \
+                self.assertLogs(service.app.logger, "WARNING") as logs:
+            self.client.post("/confirm/SYS/1")
+        self.assertIn("Slow request POST /confirm/SYS/1", logs.output[0])
+        self.assertIn("slowest SQL", logs.output[0])
+        self.assertEqual(service.profile_files(), [])
+
+
+class TestMemoryStorage(unittest.TestCase):
+    """The memory backend, checked against the SQLite one through the same requests."""
+
+    SCRIPT = [
+        ("post", "/add_model_type/HW/Hardware"),
+        ("post", "/add_model_type/HW/Hardware"),
+        ("get", "/pull/SYS?count=4"),
+        ("get", "/pull/HW"),
+        ("get", "/pull/NOPE"),
+        ("post", "/confirm/SYS/1"),
+        ("post", "/confirm/SYS/1"),
+        ("post", "/confirm/SYS/2"),
+        ("post", "/release/SYS/2"),
+        ("post", "/release/SYS/3"),
+        ("post", "/release/SYS/9"),
+        ("get", "/pull/SYS?count=2"),
+        ("get", "/search/SYS/2"),
+        ("get", "/search/SYS/9"),
+        ("get", "/list_model_types"),
+        ("get", "/list_numbers?page_size=2"),
+        ("get", "/list_numbers?page_size=2&cursor=HW:1"),
+        ("get", "/list_numbers?model_type=SYS&status=pulled&min_number=2"),
+        ("get", "/list_numbers?since=2000-01-01T00:00:00Z&until=2999-01-01T00:00:00Z"),
+        ("get", "/stats"),
+    ]
+
+    def run_script(self, backend):
+        with mock.patch.object(service, "storage", backend):
+            client = service.app.test_client()
+            client.post("/add_model_type/SYS/Systems")
+            client.post("/edit_model_details/SYS-1", json={"model_name": "Radar", "model_notes": "Long range"})
+            responses = []
+            for method, path in self.SCRIPT:
+                response = getattr(client, method)(path)
+                body = response.json
+                for item in body.get("items", []):
+                    del item["timestamp"]
+                responses.append((path, response.status_code, body))
+            return responses
+
+    def test_matches_sqlite_backend(self):
+        fd, db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        saved_database = service.DATABASE
+        service.DATABASE = db_path
+        try:
+            sqlite_storage = service.SQLiteStorage()
+            sqlite_storage.initialize()
+            expected = self.run_script(sqlite_storage)
+        finally:
+            service.close_db()
+            service.DATABASE = saved_database
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+        self.assertEqual(self.run_script(service.MemoryStorage()), expected)
+
+    def test_expiry_and_leases(self):
+        storage = service.MemoryStorage()
+        storage.add_model_type("SYS", "Systems")
+        with mock.patch.object(service, "storage", storage):
+            storage.allocate("SYS", 3)
+            storage.transition("SYS", 2, "pulled", "confirmed")
+            deadline = storage.next_deadline()
+            self.assertEqual(service.release_unconfirmed_numbers(now=deadline - 1)["released"], 0)
+            summary = service.release_unconfirmed_numbers(now=deadline + 1)
+            self.assertEqual((summary["released"], summary["next_deadline"]), (2, None))
+            self.assertEqual(storage.allocate("SYS", 3), [1, 3, 4])
+            self.assertGreater(storage.next_deadline(), deadline)
+
+            now = time.time()
+            self.assertEqual(service.acquire_lease("reaper", ttl=30, now=now), now + 30)
+            with mock.patch.object(service, "node_id", return_value="other:1"):
+                self.assertIsNone(service.acquire_lease("reaper", ttl=30, now=now))
+                self.assertEqual(service.acquire_lease("reaper", ttl=30, now=now + 31), now + 61)
+
+    def test_sqlite_only_endpoints(self):
+        with mock.patch.object(service, "storage", service.MemoryStorage()):
+            client = service.app.test_client()
+            response = client.get("/find?q=radar")
+            self.assertEqual(response.status_code, 501)
+            self.assertIn("memory", response.json["error"])
+            self.assertEqual(client.post("/bulk_confirm", json=[]).status_code, 501)
+            with mock.patch.object(service, "WORKERS", 2), self.assertRaises(RuntimeError):
+                service.initialize()
+
+
+if __name__ == "__main__":
+    unittest.main()